@@ -5,7 +5,8 @@ Base = declarative_base()
 from .tf_user import TFUser
 from .tf_window_state import TFWindowState
 from .tf_system_state import TFSystemState
+from .tf_dice_roll import TFDiceRoll
 
 __all__ = [
-    "TFUser", "TFWindowState", "TFSystemState"
+    "TFUser", "TFWindowState", "TFSystemState", "TFDiceRoll"
 ]
\ No newline at end of file
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, String, Float, Boolean, Text, Index, UniqueConstraint
+from . import Base
+
+class TFDiceRoll(Base):
+    __tablename__ = 'tf_dice_roll'
+
+    id = Column(Integer, primary_key=True)
+    room = Column(String, nullable=False)
+    seq = Column(Integer, nullable=True)
+    position = Column(Integer, nullable=False, default=0)
+    roll_key = Column(String, nullable=False)
+    sid = Column(String, nullable=True)
+    name = Column(String, nullable=True)
+    ts = Column(Float, nullable=False)
+    command = Column(String, nullable=False)
+    info = Column(String, nullable=True)
+    success = Column(Boolean, nullable=False)
+    roll_type = Column(String, nullable=True)
+    skill = Column(String, nullable=True)
+    skill_level = Column(Integer, nullable=True)
+    results = Column(Text, nullable=True)
+    total = Column(Integer, nullable=True)
+    check_level = Column(String, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('room', 'roll_key', name='uq_tf_dice_roll_room_key'),
+        Index('ix_tf_dice_roll_room_ts', 'room', 'ts'),
+        Index('ix_tf_dice_roll_room_sid_ts', 'room', 'sid', 'ts'),
+        Index('ix_tf_dice_roll_name_ts', 'name', 'ts'),
+        Index('ix_tf_dice_roll_skill_ts', 'skill', 'ts'),
+        Index('ix_tf_dice_roll_ts', 'ts'),
+    )
@@ -6,6 +6,8 @@ from .models import Base
 from .models.tf_system_state import TFSystemState
 
 class TFDatabase:
+    _instance = None
+
     def __init__(self, db_url, db_path):
         self.engine = create_engine(db_url, echo=False)
 
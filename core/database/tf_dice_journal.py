@@ -0,0 +1,225 @@
+import atexit
+import csv
+import hashlib
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, or_, select
+
+from .models.tf_dice_roll import TFDiceRoll
+from .tf_database import TFDatabase
+
+
+class TFDiceJournal:
+    """
+    Append-only journal of dice rolls, stored in the TFDiceRoll table.
+
+    record() only queues rows; a background thread writes them in batches of
+    up to batch_size, or whatever has arrived after flush_interval seconds,
+    with one INSERT per batch. Every row has a roll_key, unique per room:
+    "seq:position" for rolls from a sequenced frame, and a digest of the
+    roll itself (sid, ts, command, info and result) for the rest, i.e.
+    hidden rolls, which the server sends without a seq, and the KP's local
+    rolls. So a roll seen by both the KP and a PL window in the same
+    process, or replayed after a reconnect, is stored once.
+
+    Queries flush pending rows first and return plain dicts, newest first.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    COLUMNS = ("room", "seq", "position", "sid", "name", "ts", "command", "info", "success",
+               "roll_type", "skill", "skill_level", "results", "total", "check_level")
+
+    def __init__(self, database: TFDatabase, batch_size: int = 200, flush_interval: float = 0.5):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="tf-journal", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def instance(cls) -> Optional['TFDiceJournal']:
+        """ The journal over TFDatabase.get_instance(), or None when the app has no database """
+        with cls._instance_lock:
+            if cls._instance is None and TFDatabase.get_instance() is not None:
+                cls._instance = TFDiceJournal(TFDatabase.get_instance())
+            return cls._instance
+
+    def record(self, room: str, rolls: List[Dict], seq: Optional[int] = None) -> None:
+        """ Queue structured rolls (as in a 'roll_result' frame) for writing """
+        for position, roll in enumerate(rolls):
+            self.pending.put(self.to_row(room, roll, seq or None, position))
+
+    @staticmethod
+    def to_row(room: str, roll: Dict, seq: Optional[int], position: int) -> Dict:
+        result = roll.get("result") or {}
+        roll_type = result.get("type")
+        info = roll.get("info") or None
+        row = {
+            "room": room, "seq": seq, "position": position, "roll_key": TFDiceJournal.roll_key(roll, seq, position),
+            "sid": roll.get("sid"), "name": roll.get("name"), "ts": roll.get("ts", 0),
+            "command": roll.get("command", ""), "info": info,
+            "success": bool(result.get("success")), "roll_type": roll_type,
+            "skill": None, "skill_level": None, "results": None, "total": None, "check_level": None
+        }
+        if not row["success"]:
+            row["results"] = json.dumps({"error": result.get("error")}, ensure_ascii=False)
+        elif roll_type == "normal_roll":
+            row["results"] = json.dumps(result.get("results"))
+            row["total"] = result.get("total")
+        elif roll_type == "multi_roll":
+            row["results"] = json.dumps(result.get("totals"))
+            row["total"] = sum(result.get("totals") or ())
+        elif roll_type == "skill_check":
+            row["skill"] = info
+            row["skill_level"] = result.get("skill")
+            row["results"] = json.dumps(result.get("all_results"))
+            row["total"] = result.get("final_result")
+            row["check_level"] = result.get("check_level")
+        elif roll_type == "versus_check":
+            row["skill"] = info
+            row["skill_level"] = (result.get("skills") or [None])[0]
+            row["results"] = json.dumps({key: result.get(key) for key in ("skills", "final_results", "all_results", "skill1_wins")})
+            row["check_level"] = "/".join(str(level) for level in result.get("check_levels") or ())
+        return row
+
+    @staticmethod
+    def roll_key(roll: Dict, seq: Optional[int], position: int) -> str:
+        if seq is not None:
+            return f"{seq}:{position}"
+        identity = [roll.get(key) for key in ("sid", "name", "ts", "command", "info", "result")] + [position]
+        digest = hashlib.sha1(json.dumps(identity, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        return f"local:{digest.hexdigest()}"
+
+    def _run(self):
+        running = True
+        while running:
+            batch = []
+            waiters = []
+            item = self.pending.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    running = False
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                try:
+                    # a flush() is waiting: write what is already queued instead of waiting for more
+                    if waiters:
+                        item = self.pending.get_nowait()
+                    else:
+                        item = self.pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, rows: List[Dict]) -> None:
+        try:
+            with self.database.get_session() as session:
+                session.execute(insert(TFDiceRoll).prefix_with("OR IGNORE"), rows)
+        except Exception as e:
+            print(f"Error writing dice journal: {str(e)}")
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """ Block until everything recorded so far is written """
+        if not self.thread.is_alive():
+            return True
+        done = threading.Event()
+        self.pending.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.pending.put(None)
+            self.thread.join(5.0)
+
+    def query(
+        self,
+        room: Optional[str] = None,
+        sid: Optional[str] = None,
+        name: Optional[str] = None,
+        skill: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """ Rolls matching every given filter; start/end are epoch seconds, end exclusive """
+        conditions = []
+        if room is not None:
+            conditions.append(TFDiceRoll.room == room)
+        if sid is not None:
+            conditions.append(TFDiceRoll.sid == sid)
+        if name is not None:
+            conditions.append(TFDiceRoll.name == name)
+        if skill is not None:
+            conditions.append(TFDiceRoll.skill == skill)
+        return self._fetch(conditions, start, end, limit)
+
+    def _fetch(self, conditions: list, start: Optional[float], end: Optional[float], limit: Optional[int]) -> List[Dict]:
+        self.flush()
+        if start is not None:
+            conditions.append(TFDiceRoll.ts >= start)
+        if end is not None:
+            conditions.append(TFDiceRoll.ts < end)
+        statement = (
+            select(*(getattr(TFDiceRoll, column) for column in self.COLUMNS))
+            .where(*conditions)
+            .order_by(TFDiceRoll.ts.desc(), TFDiceRoll.id.desc())
+        )
+        if limit is not None:
+            statement = statement.limit(limit)
+
+        with self.database.get_session() as session:
+            return [dict(row._mapping) for row in session.execute(statement)]
+
+    def by_player(
+        self,
+        player: str,
+        room: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """ Rolls by display name; inside a room the sid matches as well """
+        if room is None:
+            return self._fetch([TFDiceRoll.name == player], start, end, limit)
+        return self._fetch(
+            [TFDiceRoll.room == room, or_(TFDiceRoll.sid == player, TFDiceRoll.name == player)],
+            start, end, limit
+        )
+
+    def by_skill(self, skill: str, **filters) -> List[Dict]:
+        return self.query(skill=skill, **filters)
+
+    def by_time_range(self, start: float, end: float, **filters) -> List[Dict]:
+        return self.query(start=start, end=end, **filters)
+
+    def export(self, path: str, **filters) -> int:
+        """ Write matching rolls, oldest first, as CSV or JSON (by extension); returns the row count """
+        rows = list(reversed(self.query(**filters)))
+        if path.lower().endswith(".json"):
+            for row in rows:
+                row["results"] = json.loads(row["results"]) if row["results"] else None
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False, indent=2)
+        else:
+            with open(path, "w", encoding="utf-8-sig", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self.COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+        return len(rows)
@@ -1,85 +1,223 @@
+import hashlib
 import json
-from typing import List
+import os
+import pickle
+import re
+import threading
+from dataclasses import replace
+from typing import Any, Callable, Dict, List, Tuple, Union
 
 from implements.coc_components.data_enum import Category, Penetration
-from implements.coc_components.data_type import CombatSkill, Spell, WeaponType, Range, Damage, WeaponSkill, Skill, Occupation
-from utils.helper import resource_path
-
-
-def load_occupations_from_json() -> List[Occupation]:
-    with open(resource_path("implements/coc_data/occupations.json"), "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return [Occupation.from_json(entry) for entry in data]
-
-def load_spells_from_json() -> List[Spell]:
-    return []
-
-def load_skills_from_json( dex: int, edu: int) -> List[Skill]:
-    skills = []
-
-    with open(resource_path("implements/coc_data/default_skills.json"), 'r', encoding='utf-8') as file:
-        data = json.load(file)
-
-        for skill_key, default_point in data.items():
-            name = skill_key.split(":")[1] if ":" in skill_key else skill_key
-            super_name = skill_key.split(":")[0] if ":" in skill_key else None
-
+from implements.coc_components.data_type import CombatSkill, Spell, WeaponType, Range, Damage, WeaponSkill, Skill, OccupationSkill, SkillCombination, Occupation
+from utils.helper import app_path, resource_path
+
+
+class GameDataRepository:
+    """
+    Process-wide cache of the coc_data JSON files.
+
+    Each dataset is parsed on first use and kept until its file changes
+    (mtime or size), so walking back and forth between phases never re-reads
+    JSON, while edits to the data files still show up without a restart.
+
+    Occupations, weapon types and combat skills are shared by every caller,
+    so they are frozen dataclasses; each call returns a new list, so a
+    phase can still append its own custom entries. Skills are per-character
+    state (points and occupation flags change while the sheet is edited), so
+    skills() builds fresh Skill objects from the cached defaults, filling in
+    闪避 and 母语 from dex and edu.
+
+    Parsed datasets are also snapshotted as pickles in cache_dir (relative
+    paths are taken from the app directory), named
+    after the SHA-256 of the JSON source and VERSION. A later run that finds
+    the snapshot for the current source unpickles the finished objects in
+    one call, skipping json decoding and the dataclass/skill-entry parsing;
+    any edit to the JSON changes the hash and rebuilds the snapshot. Bump
+    VERSION whenever the parsing or the data classes change.
+    """
+
+    VERSION = 4
+
+    FILES = {
+        "occupations": "implements/coc_data/occupations.json",
+        "skills": "implements/coc_data/default_skills.json",
+        "weapon_types": "implements/coc_data/weapon_types.json",
+        "combat_skills": "implements/coc_data/combat_skills.json",
+    }
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, cache_dir: str = "cache"):
+        self.cache_dir = app_path(cache_dir)
+        self._entries: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> 'GameDataRepository':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = GameDataRepository()
+            return cls._instance
+
+    def occupations(self) -> List[Occupation]:
+        return list(self._get("occupations", _parse_occupations))
+
+    def skills(self, dex: int, edu: int) -> List[Skill]:
+        skills = []
+        for name, super_name, default_point in self._get("skills", _parse_skills):
             if name == '闪避':
                 default_point = dex // 2
             elif name == '母语':
                 default_point = edu
+            skills.append(Skill(name=name, super_name=super_name, default_point=default_point))
+        return skills
+
+    def weapon_types(self) -> List[WeaponType]:
+        return list(self._get("weapon_types", _parse_weapon_types))
+
+    def combat_skills(self) -> List[CombatSkill]:
+        return list(self._get("combat_skills", _parse_combat_skills))
+
+    def invalidate(self, name: str = None) -> None:
+        """ Drop one cached dataset, or all of them, so the next call re-reads the file """
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def _get(self, name: str, parse: Callable[[Any], tuple]) -> tuple:
+        path = resource_path(self.FILES[name])
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] != version:
+                entry = self._entries[name] = (version, self._load(name, path, parse))
+            return entry[1]
+
+    def build_snapshots(self) -> None:
+        """ Parse every dataset and write any missing snapshot, e.g. before packaging """
+        self.occupations()
+        self.skills(0, 0)
+        self.weapon_types()
+        self.combat_skills()
+
+    def _snapshot_path(self, name: str, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"coc_data_v{self.VERSION}_{name}_{digest}.pickle")
+
+    def _load(self, name: str, path: str, parse: Callable[[Any], tuple]) -> tuple:
+        with open(path, "rb") as f:
+            source = f.read()
+        snapshot_path = self._snapshot_path(name, hashlib.sha256(source).hexdigest()[:16])
+        try:
+            with open(snapshot_path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            pass
+
+        value = parse(json.loads(source.decode("utf-8")))
+        self._save_snapshot(name, snapshot_path, value)
+        return value
+
+    def _save_snapshot(self, name: str, snapshot_path: str, value: tuple) -> None:
+        try:
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            stale_pattern = re.compile(rf"coc_data_v\d+_{name}_[0-9a-f]+\.pickle")
+            for stale in os.listdir(self.cache_dir):
+                if stale_pattern.fullmatch(stale):
+                    os.remove(os.path.join(self.cache_dir, stale))
+            temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, snapshot_path)
+        except OSError as e:
+            # a read-only install still works, it just parses the JSON every start
+            print(f"Error writing game data snapshot: {str(e)}")
+
+
+def _parse_occupations(data: list) -> Tuple[Occupation, ...]:
+    # occupation skills are frozen, so equal entries can be one object; that leaves
+    # ~90 distinct OccupationSkills instead of ~1100, which is what makes the
+    # pickled snapshot cheap to load
+    shared = {}
+    occupations = []
+    for entry in data:
+        occupation = Occupation.from_json(entry)
+        skills = tuple(_share_skill(skill, shared) for skill in occupation.occupation_skills)
+        occupations.append(replace(occupation, occupation_skills=skills))
+    return tuple(occupations)
+
+def _share_skill(skill: Union[OccupationSkill, SkillCombination], shared: Dict) -> Union[OccupationSkill, SkillCombination]:
+    if isinstance(skill, SkillCombination):
+        return SkillCombination(skills=tuple(_share_skill(s, shared) for s in skill.skills))
+    return shared.setdefault((skill.name, skill.super_name, skill.is_abstract), skill)
+
+def _parse_skills(data: dict) -> Tuple[Tuple[str, str, int], ...]:
+    skills = []
+    for skill_key, default_point in data.items():
+        name = skill_key.split(":")[1] if ":" in skill_key else skill_key
+        super_name = skill_key.split(":")[0] if ":" in skill_key else None
+        skills.append((name, super_name, default_point))
+    return tuple(skills)
 
-            skill = Skill(
-                name=name,
-                super_name=super_name,
-                default_point=default_point
-            )
-            skills.append(skill)
+def _parse_weapon_types(data: list) -> Tuple[WeaponType, ...]:
+    weapon_types = []
+    for item in data:
+        weapon_skill = WeaponSkill(item["skill"])
+        penetration = Penetration.YES if item["penetration"].lower() == "yes" else Penetration.NO
+        damage = Damage(item["damage"])
+        weapon_range = Range(item["range"])
+        category = Category(item["category"])
+        weapon_type = WeaponType(
+            name=item["name"],
+            skill=weapon_skill,
+            damage=damage,
+            range=weapon_range,
+            penetration=penetration,
+            rate_of_fire=item["rate_of_fire"],
+            ammo=item.get("ammo"),
+            malfunction=item.get("malfunction"),
+            category=category
+        )
+        weapon_types.append(weapon_type)
+    return tuple(weapon_types)
+
+def _parse_combat_skills(data: dict) -> Tuple[CombatSkill, ...]:
+    combat_skills = []
+    for name, details in data.items():
+        damage = details.get("damage", "1D3 + DB")
+        techniques = details.get("techniques", {})
 
-    return skills
+        combat_skill = CombatSkill(
+            name=name,
+            damage=damage,
+            techniques=techniques
+        )
 
+        combat_skills.append(combat_skill)
+    return tuple(combat_skills)
 
-def load_weapon_types_from_json() -> List[WeaponType]:
-    weapon_types = []
-    with open(resource_path("implements/coc_data/weapon_types.json"), 'r', encoding='utf-8') as file:
-        data = json.load(file)
-        for item in data:
-            weapon_skill = WeaponSkill(item["skill"])
-            penetration = Penetration.YES if item["penetration"].lower() == "yes" else Penetration.NO
-            damage = Damage(item["damage"])
-            weapon_range = Range(item["range"])
-            category = Category(item["category"])
-            weapon_type = WeaponType(
-                name=item["name"],
-                skill=weapon_skill,
-                damage=damage,
-                range=weapon_range,
-                penetration=penetration,
-                rate_of_fire=item["rate_of_fire"],
-                ammo=item.get("ammo"),
-                malfunction=item.get("malfunction"),
-                category=category
-            )
-            weapon_types.append(weapon_type)
-    return weapon_types
 
+def load_occupations_from_json() -> List[Occupation]:
+    return GameDataRepository.instance().occupations()
 
-def load_combat_skills_from_json() -> List[CombatSkill]:
-    combat_skills = []
+def load_spells_from_json() -> List[Spell]:
+    return []
 
-    with open(resource_path("implements/coc_data/combat_skills.json"), 'r', encoding='utf-8') as file:
-        data = json.load(file)
+def load_skills_from_json( dex: int, edu: int) -> List[Skill]:
+    return GameDataRepository.instance().skills(dex, edu)
 
-        for name, details in data.items():
-            damage = details.get("damage", "1D3 + DB")
-            techniques = details.get("techniques", {})
 
-            combat_skill = CombatSkill(
-                name=name,
-                damage=damage,
-                techniques=techniques
-            )
+def load_weapon_types_from_json() -> List[WeaponType]:
+    return GameDataRepository.instance().weapon_types()
 
-            combat_skills.append(combat_skill)
 
-    return combat_skills
+def load_combat_skills_from_json() -> List[CombatSkill]:
+    return GameDataRepository.instance().combat_skills()
@@ -1,6 +1,9 @@
 import re
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Union
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional, Dict, Sequence, Tuple, Union
+
+import numpy as np
 
 from implements.coc_components.data_enum import Penetration, Category
 
@@ -20,15 +23,7 @@ class Skill:
 
     @property
     def display_name(self) -> str:
-        if self.name == '任意技能' and self.super_name is None:
-            return "任意技能"
-        if self.super_name and not self.is_abstract:
-            if self.name == '交涉技能':
-                return "交涉技能"
-            return f"{self.super_name} - {self.name}"
-        if self.is_abstract:
-            return f"{self.super_name} - 任意"
-        return self.name
+        return _skill_display_name(self.name, self.super_name, self.is_abstract)
     
     @classmethod
     def create_abstract(cls, name: str, super_name: str = "") -> 'Skill':
@@ -46,23 +41,65 @@ class Skill:
         return self.name
     
     def __eq__(self, other):
-        if not isinstance(other, Skill):
+        if not isinstance(other, (Skill, OccupationSkill)):
             return False
         return self.name == other.name and self.super_name == other.super_name
     
 
-@dataclass
+def _skill_display_name(name: str, super_name: Optional[str], is_abstract: bool) -> str:
+    if name == '任意技能' and super_name is None:
+        return "任意技能"
+    if super_name and not is_abstract:
+        if name == '交涉技能':
+            return "交涉技能"
+        return f"{super_name} - {name}"
+    if is_abstract:
+        return f"{super_name} - 任意"
+    return name
+
+
+@dataclass(frozen=True, slots=True)
+class OccupationSkill:
+    """
+    A skill named by an occupation. Occupations are cached and shared by
+    every caller, so unlike Skill (a character's editable sheet entry) this
+    is immutable; it compares equal to the Skill of the same name.
+    """
+    name: str
+    super_name: Optional[str]
+    is_abstract: bool = False
+
+    @property
+    def display_name(self) -> str:
+        return _skill_display_name(self.name, self.super_name, self.is_abstract)
+
+    @property
+    def full_name(self) -> str:
+        if self.super_name:
+            return f"{self.super_name}:{self.name}"
+        return self.name
+
+    def __eq__(self, other):
+        if not isinstance(other, (Skill, OccupationSkill)):
+            return False
+        return self.name == other.name and self.super_name == other.super_name
+
+    def __hash__(self):
+        return hash((self.name, self.super_name))
+
+
+@dataclass(frozen=True, slots=True)
 class SkillCombination:
-    skills: List[Union[Skill, 'SkillCombination']]
+    skills: Tuple[Union[OccupationSkill, 'SkillCombination'], ...]
     
     @property
     def is_simple_choice(self) -> bool:
-        return all(isinstance(s, Skill) and not s.is_abstract for s in self.skills)
+        return all(isinstance(s, OccupationSkill) and not s.is_abstract for s in self.skills)
 
     def format_display(self) -> str:
         skill_displays = []
         for skill in self.skills:
-            if isinstance(skill, Skill):
+            if isinstance(skill, OccupationSkill):
                 skill_displays.append(skill.display_name)
             elif isinstance(skill, SkillCombination):
                 skill_displays.append(skill.format_display())
@@ -70,85 +107,92 @@ class SkillCombination:
     
 
 
-@dataclass
-class Damage:
-    dmg_text: str
-
-    @property
-    def damage_type(self) -> str:
-        slash_count = self.dmg_text.count('/')
-        if slash_count == 1:
-            return "ranged"
-        elif slash_count > 1:
-            return "attenuated"
-        return "normal"
-
-    @property
-    def range_modifier(self) -> str:
-        if self.damage_type == "normal":
-            return "N/A"
-
-        # For ranged damage
-        if self.damage_type == "ranged":
-            parts = self.dmg_text.split('/')
-            if len(parts) == 2:
-                match = re.search(r'(\d+)\s*(?:yards?|feet)', parts[1])
-                if match:
-                    number = float(match.group(1))
-                    if 'yard' in parts[1]:
-                        return f"x{self._convert_yards_to_meters(number)}"
-                    else:
-                        return f"x{self._convert_feet_to_meters(number)}"
-
-        elif self.damage_type == "attenuated":
-            return "9, 18, 45"
+_RANGED_DISTANCE_PATTERN = re.compile(r'(\d+)\s*(?:yards?|feet)')
+_DICE_PATTERN = re.compile(r'\d+D\d+')
+_STATIC_PATTERN = re.compile(r'(?<!\d)\+\s*(\d+)(?!\s*D)')
+_RANGE_PATTERN = re.compile(r"(\d+)\s?(yards?|feet?)", re.IGNORECASE)
 
-        return "N/A"
 
-    @property
-    def dice_part(self) -> str:
-        if self.dmg_text.lower() == "stun":
-            return "N/A"
+def _yards_to_meters(yards: float) -> int:
+    return round(yards * 0.9144)
 
-        if self.damage_type == "attenuated":
-            return self.dmg_text
+def _feet_to_meters(feet: float) -> int:
+    return round(feet * 0.3048)
 
-        dice_pattern = re.findall(r'\d+D\d+', self.dmg_text)
-        if not dice_pattern:
-            return "N/A"
-        return "+".join(dice_pattern)
 
-    @property
-    def static_part(self) -> int:
-        if self.damage_type == "attenuated":
-            return 0
-
-        match = re.search(r'(?<!\d)\+\s*(\d+)(?!\s*D)', self.dmg_text)
-        if match:
-            return int(match.group(1))
-        return 0
-
-    @property
-    def db_modifier(self) -> float:
-        if self.damage_type == "attenuated":
-            return 0
-
-        if "halfDB" in self.dmg_text.replace(" ", "").lower():
-            return 0.5
-        elif "+DB" in self.dmg_text.replace(" ", "").upper():
-            return 1.0
-        return 0
+@dataclass(frozen=True, slots=True)
+class Damage:
+    """
+    A weapon damage string, parsed once: every derived field below is
+    filled in by __post_init__, so reading them (e.g. rendering a weapon
+    list) is a plain attribute access.
+    """
+    dmg_text: str
+    damage_type: str = field(init=False, repr=False, compare=False)
+    range_modifier: str = field(init=False, repr=False, compare=False)
+    dice_part: str = field(init=False, repr=False, compare=False)
+    static_part: int = field(init=False, repr=False, compare=False)
+    db_modifier: float = field(init=False, repr=False, compare=False)
+    special_effect: str = field(init=False, repr=False, compare=False)
+    standard_text: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        text = self.dmg_text
+        lower_text = text.lower()
+
+        slash_count = text.count('/')
+        if slash_count == 1:
+            damage_type = "ranged"
+        elif slash_count > 1:
+            damage_type = "attenuated"
+        else:
+            damage_type = "normal"
 
-    @property
-    def special_effect(self) -> str | None:
-        special_effects = ["burn", "stun"]
-        for effect in special_effects:
-            if effect in self.dmg_text.lower():
-                return effect
-        return "N/A"
+        range_modifier = "N/A"
+        if damage_type == "ranged":
+            far_part = text.split('/')[1]
+            match = _RANGED_DISTANCE_PATTERN.search(far_part)
+            if match:
+                number = float(match.group(1))
+                if 'yard' in far_part:
+                    range_modifier = f"x{_yards_to_meters(number)}"
+                else:
+                    range_modifier = f"x{_feet_to_meters(number)}"
+        elif damage_type == "attenuated":
+            range_modifier = "9, 18, 45"
+
+        if lower_text == "stun":
+            dice_part = "N/A"
+        elif damage_type == "attenuated":
+            dice_part = text
+        else:
+            dice_part = "+".join(_DICE_PATTERN.findall(text)) or "N/A"
 
-    @property
-    def standard_text(self) -> str | None:
+        static_part = 0
+        db_modifier = 0
+        if damage_type != "attenuated":
+            match = _STATIC_PATTERN.search(text)
+            if match:
+                static_part = int(match.group(1))
+
+            compact_text = text.replace(" ", "")
+            if "halfdb" in compact_text.lower():
+                db_modifier = 0.5
+            elif "+DB" in compact_text.upper():
+                db_modifier = 1.0
+
+        special_effect = next((effect for effect in ("burn", "stun") if effect in lower_text), "N/A")
+
+        set_field = object.__setattr__
+        set_field(self, "damage_type", damage_type)
+        set_field(self, "range_modifier", range_modifier)
+        set_field(self, "dice_part", dice_part)
+        set_field(self, "static_part", static_part)
+        set_field(self, "db_modifier", db_modifier)
+        set_field(self, "special_effect", special_effect)
+        set_field(self, "standard_text", self._standard_text())
+
+    def _standard_text(self) -> str:
         if self.dmg_text.lower() == "stun":
             return "Stun"
 
@@ -175,85 +219,60 @@ class Damage:
 
         return "+".join(parts)
 
-    def _convert_yards_to_meters(self, yards: float) -> int:
-        meters = yards * 0.9144
-        return round(meters)
-
-    def _convert_feet_to_meters(self, feet: float) -> int:
-        meters = feet * 0.3048
-        return round(meters)
-
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Range:
     range_text: str
+    standard_text: str = field(init=False, repr=False, compare=False)
 
-    @property
-    def standard_text(self) -> str:
-        if self.range_text.lower() == "melee":
-            return "0"
+    def __post_init__(self):
+        object.__setattr__(self, "standard_text", self._standard_text(self.range_text))
 
-        if "STR" in self.range_text:
-            return self._convert_str_range(self.range_text)
-
-        if "/" in self.range_text:
-            return self._convert_multiple_ranges(self.range_text)
+    @staticmethod
+    def _standard_text(text: str) -> str:
+        if text.lower() == "melee":
+            return "0"
 
-        return self._convert_single_range(self.range_text)
+        if "STR" in text:
+            return Range._convert_str_range(text)
 
-    def _convert_yards_to_meters(self, yards: float) -> int:
-        meters = yards * 0.9144
-        return round(meters)
+        if "/" in text:
+            return "/".join(filter(None, (Range._convert_distance(r) for r in text.split("/"))))
 
-    def _convert_feet_to_meters(self, feet: float) -> int:
-        meters = feet * 0.3048
-        return round(meters)
+        return Range._convert_distance(text) or text
 
-    def _convert_str_range(self, text: str) -> str:
+    @staticmethod
+    def _convert_str_range(text: str) -> str:
         if "feet" in text.lower():
-            conversion_factor = round(0.3048, 2)
-            return f"STR*{conversion_factor}"
+            return f"STR*{round(0.3048, 2)}"
         elif "yards" in text.lower():
-            conversion_factor = round(0.9144, 2)
-            return f"STR*{conversion_factor}"
+            return f"STR*{round(0.9144, 2)}"
         return text
 
-    def _convert_multiple_ranges(self, text: str) -> str:
-        ranges = text.split("/")
-        converted_ranges = []
-        for r in ranges:
-            match = re.search(r"(\d+)\s?(yards?|feet?)", r, re.IGNORECASE)
-            if match:
-                distance = int(match.group(1))
-                unit = match.group(2).lower()
-                if "yards" in unit:
-                    converted_ranges.append(str(self._convert_yards_to_meters(distance)))
-                elif "feet" in unit:
-                    converted_ranges.append(str(self._convert_feet_to_meters(distance)))
-        return "/".join(converted_ranges)
-
-    def _convert_single_range(self, text: str) -> str:
-        match = re.search(r"(\d+)\s?(yards?|feet?)", text, re.IGNORECASE)
+    @staticmethod
+    def _convert_distance(text: str) -> Optional[str]:
+        """ Metres for the first "<n> yards/feet" in text, or None when there is none """
+        match = _RANGE_PATTERN.search(text)
         if match:
             distance = int(match.group(1))
             unit = match.group(2).lower()
             if "yards" in unit:
-                return str(self._convert_yards_to_meters(distance))
+                return str(_yards_to_meters(distance))
             elif "feet" in unit:
-                return str(self._convert_feet_to_meters(distance))
-        return text
+                return str(_feet_to_meters(distance))
+        return None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class WeaponSkill:
     skill_text: str
+    standard_text: str = field(init=False, repr=False, compare=False)
 
-    @property
-    def standard_text(self):
-        return self.skill_text.split(":")[-1].strip().title()
+    def __post_init__(self):
+        object.__setattr__(self, "standard_text", self.skill_text.split(":")[-1].strip().title())
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class WeaponType:
     name: str
     skill: WeaponSkill
@@ -279,7 +298,7 @@ class WeaponType:
                 f"Category: {self.category.value}\n")
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CombatSkill:
     name: str
     damage: str
@@ -295,13 +314,136 @@ class Spell:
     casting_time: str
     description: str
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class SkillPointFormula:
+    """
+    An occupation skill-point formula such as EDU*2+MAX(DEX*2,STR*2),
+    compiled once into groups of (multiplier, ((stat, factor), ...)): each
+    group contributes multiplier * max(stat * factor) over its choices, so a
+    plain term is a group with a single choice. Stats missing from the
+    stats dict count as 0, as before.
+    """
+    text: str
+    groups: Tuple[Tuple[int, Tuple[Tuple[str, int], ...]], ...]
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def compile(text: str) -> 'SkillPointFormula':
+        """ Compiled formula for text; raises ValueError when it does not parse """
+        groups = []
+        for part in text.replace(" ", "").upper().split('+'):
+            if part.startswith('MAX('):
+                close = part.find(')')
+                if close < 0:
+                    raise ValueError(f"missing ')' in skill point formula '{text}'")
+                choices = tuple(SkillPointFormula._term(term, text) for term in part[4:close].split(','))
+                rest = part[close + 1:]
+                if rest and not rest.startswith('*'):
+                    raise ValueError(f"unexpected '{rest}' in skill point formula '{text}'")
+                multiplier = SkillPointFormula._int(rest[1:], text) if rest else 1
+            else:
+                choices = (SkillPointFormula._term(part, text),)
+                multiplier = 1
+            groups.append((multiplier, choices))
+        return SkillPointFormula(text, tuple(groups))
+
+    @staticmethod
+    def _term(term: str, text: str) -> Tuple[str, int]:
+        stat, _, factor = term.partition('*')
+        if not stat.isalpha():
+            raise ValueError(f"invalid term '{term}' in skill point formula '{text}'")
+        return stat, SkillPointFormula._int(factor, text) if factor else 1
+
+    @staticmethod
+    def _int(value: str, text: str) -> int:
+        if not value.isdigit():
+            raise ValueError(f"invalid multiplier '{value}' in skill point formula '{text}'")
+        return int(value)
+
+    def evaluate(self, stats: Dict[str, int]) -> int:
+        get = stats.get
+        total = 0
+        for multiplier, choices in self.groups:
+            if len(choices) == 1:
+                stat, factor = choices[0]
+                total += multiplier * factor * get(stat, 0)
+            else:
+                total += multiplier * max([get(stat, 0) * factor for stat, factor in choices])
+        return total
+
+
+class SkillPointTable:
+    """
+    Skill points of many occupations for one or many investigators in a
+    single NumPy pass.
+
+    coefficients[o, g, s] is occupation o's weight for stat s in its group g
+    (0 when s is not a choice of that group). Stats and weights are
+    non-negative, so a group's value is max_s(coefficients * stats) and an
+    occupation's points are the sum over its groups.
+    """
+
+    STATS = ("STR", "CON", "SIZ", "DEX", "APP", "INT", "POW", "EDU", "LUK")
+
+    def __init__(self, occupations: Sequence['Occupation']):
+        self.occupations = list(occupations)
+        formulas = [occupation.formula for occupation in self.occupations]
+        stat_index = {stat: i for i, stat in enumerate(self.STATS)}
+        group_count = max((len(formula.groups) for formula in formulas), default=0)
+
+        self.coefficients = np.zeros((len(formulas), group_count, len(self.STATS)), dtype=np.int64)
+        for o, formula in enumerate(formulas):
+            for g, (multiplier, choices) in enumerate(formula.groups):
+                for stat, factor in choices:
+                    if stat in stat_index:
+                        # MAX(EDU*4,EDU*2) names a stat twice; the larger weight is the one max() picks
+                        s = stat_index[stat]
+                        self.coefficients[o, g, s] = max(self.coefficients[o, g, s], multiplier * factor)
+
+    def stats_vector(self, stats: Dict[str, int]) -> np.ndarray:
+        return np.array([int(stats.get(stat, 0)) for stat in self.STATS], dtype=np.int64)
+
+    def points(self, stats: Union[Dict[str, int], np.ndarray]) -> np.ndarray:
+        """
+        Skill points of every occupation.
+
+        Args:
+            stats: A stats dict, or an array of shape (9,) or (n, 9) in STATS order.
+
+        Returns:
+            np.ndarray: Shape (occupations,), or (n, occupations) for n investigators.
+        """
+        if isinstance(stats, dict):
+            stats = self.stats_vector(stats)
+        stats = np.asarray(stats, dtype=np.int64)
+        return (self.coefficients * stats[..., None, None, :]).max(axis=-1).sum(axis=-1)
+
+    def rank(self, stats: Dict[str, int], top: Optional[int] = None) -> List[Tuple['Occupation', int]]:
+        """ (occupation, points), most points first; ties keep the list order """
+        points = self.points(stats)
+        order = np.argsort(-points, kind='stable')[:top]
+        return [(self.occupations[i], int(points[i])) for i in order]
+
+
+@dataclass(frozen=True, slots=True)
 class Occupation:
+    """
+    Frozen: loaded occupations are cached and shared by every caller (see
+    GameDataRepository). occupation_skills and category are stored as
+    tuples, and the skill-point formula is compiled once on construction,
+    so a malformed formula fails at load time rather than in the UI.
+    """
     name: str
     skill_points_formula: str
-    occupation_skills: List[Union[Skill, SkillCombination]]
-    category: List[str]
+    occupation_skills: Tuple[Union[OccupationSkill, Skill, SkillCombination], ...]
+    category: Tuple[str, ...]
     credit_rating: str
+    formula: SkillPointFormula = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "occupation_skills", tuple(self.occupation_skills))
+        object.__setattr__(self, "category", tuple(self.category))
+        object.__setattr__(self, "formula", SkillPointFormula.compile(self.skill_points_formula))
 
     def __str__(self):
         return f"{self.name} ({self.category[0]})" 
@@ -309,41 +451,8 @@ class Occupation:
     def format_formula_for_display(self) -> str:
         return self.skill_points_formula.replace('*', ' × ').replace('+', ' + ').replace(',', ', ')
     
-    def _calculate_max_stats(self, formula_part: str, stats: Dict[str, int]) -> int:
-        parts = [part.strip() for part in formula_part.split(',')]
-        results = []
-        
-        for part in parts:
-            if '*' in part:
-                stat, multiplier = part.split('*')
-                stat_value = stats.get(stat.strip(), 0)
-                results.append(stat_value * int(multiplier))
-            else:
-                results.append(stats.get(part.strip(), 0))
-                
-        return max(results)
-
     def calculate_skill_points(self, stats: Dict[str, int]) -> int:
-        formula = self.skill_points_formula
-        parts = [p.strip() for p in formula.split('+')]
-        total = 0
-        for part in parts:
-            if 'MAX(' in part:
-                max_content = part[part.find('(') + 1:part.find(')')].strip()
-                max_value = self._calculate_max_stats(max_content, stats)
-                if '*' in part:
-                    multiplier = int(part.split('*')[-1])
-                    max_value *= multiplier
-                total += max_value
-            else:
-                if '*' in part:
-                    stat, multiplier = part.split('*')
-                    stat_value = stats.get(stat.strip(), 0)
-                    total += stat_value * int(multiplier)
-                else:
-                    total += stats.get(part.strip(), 0)
-
-        return total
+        return self.formula.evaluate(stats)
 
     def get_skills(self) -> str:
         return self.occupation_skills
@@ -361,7 +470,7 @@ class Occupation:
         formatted_skills = []
 
         for skill_item in self.occupation_skills:
-            if isinstance(skill_item, Skill):
+            if isinstance(skill_item, (Skill, OccupationSkill)):
                 formatted_skills.append(skill_item.display_name)
             elif isinstance(skill_item, SkillCombination):
                 formatted_skills.append(skill_item.format_display())
@@ -369,29 +478,29 @@ class Occupation:
         return '，'.join(formatted_skills)
         
     @classmethod
-    def parse_skill_entry(cls, skill_text: str) -> Union[Skill, SkillCombination]:
+    def parse_skill_entry(cls, skill_text: str) -> Union[OccupationSkill, SkillCombination]:
         skill_text = skill_text.strip()
         
         if '|' in skill_text:
-            sub_skills = [cls.parse_skill_entry(s.strip()) for s in skill_text.split('|')]
+            sub_skills = tuple(cls.parse_skill_entry(s.strip()) for s in skill_text.split('|'))
             return SkillCombination(skills=sub_skills)
         
         if skill_text == '任意技能':
-            return Skill.create_abstract(name='任意技能', super_name=None)
+            return OccupationSkill(name='任意技能', super_name=None, is_abstract=True)
         elif ':' in skill_text:
             super_name, name = skill_text.split(':')
             if name == '任意':
-                return Skill.create_abstract(name='任意', super_name=super_name)
+                return OccupationSkill(name='任意', super_name=super_name, is_abstract=True)
             else:
-                return Skill(name=name, super_name=super_name, default_point=0)
+                return OccupationSkill(name=name, super_name=super_name)
         else:
-            return Skill(name=skill_text, super_name=None, default_point=0)
+            return OccupationSkill(name=skill_text, super_name=None)
 
     @classmethod
     def from_json(cls, data: Dict) -> 'Occupation':
         skill_texts = data["occupation_skills"].split(',')
         occupation_skills = [cls.parse_skill_entry(skill_text) for skill_text in skill_texts]
-        
+
         categories = data["category"]
         if not isinstance(categories, list):
             categories = [categories]
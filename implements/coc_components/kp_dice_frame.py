@@ -1,13 +1,20 @@
+import threading
+import time
+
 from PyQt6.QtWidgets import QHBoxLayout, QVBoxLayout, QPushButton
 from PyQt6.QtCore import Qt, QMimeData, QPoint
 from PyQt6.QtGui import QDrag, QPixmap, QPainter, QDragEnterEvent, QDropEvent
 
+from core.database.tf_dice_journal import TFDiceJournal
 from ui.components.tf_base_frame import TFBaseFrame
+from ui.components.tf_log_view import TFLogView
 from ui.components.tf_option_entry import TFOptionEntry
 from ui.tf_application import TFApplication
+from implements.coc_components.roll_text import format_roll_text
 from implements.coc_components.websocket_client import WebSocketClient
 from utils.helper import get_current_datetime
-from utils.tf_dice import TFDice
+from utils.tf_coc_odds import TFCocOdds
+from utils.tf_dice import CheckResult, TFDice
 
 
 class DraggableButton(QPushButton):
@@ -79,6 +86,7 @@ class KPFrame(TFBaseFrame):
 
         self.pl_frames = {}
         self.pc_data = {}
+        self.journal = TFDiceJournal.instance()
 
         super().__init__(layout_type=QHBoxLayout, parent=parent)
 
@@ -90,6 +98,9 @@ class KPFrame(TFBaseFrame):
         self.ws_client.admin_closed.connect(self._on_admin_closed)
         self.ws_client.disconnected.connect(self._on_disconnected)
         self.ws_client.name_update_received.connect(self._handle_name_update)
+        self.ws_client.roll_result_received.connect(self._on_roll_result)
+        self.ws_client.reconnecting.connect(self._on_reconnecting)
+        self.ws_client.reconnected.connect(self._on_reconnected)
         self.ws_client.start()
 
     def _setup_content(self):
@@ -132,24 +143,40 @@ class KPFrame(TFBaseFrame):
         self.dice_panel = DicePanelFrame(parent=self)
         self.right_panel.main_layout.addWidget(self.dice_panel)
 
-        self.dice_result_text_edit = self.create_text_edit(
+        self.dice_result_text_edit = self.create_log_view(
             name="dice_result_text_edit",
-            text="",
             width=400,
             height=250,
             placeholder_text="掷骰结果和信息会出现在这里...",
-            read_only=True,
-            scroll_policy=(Qt.ScrollBarPolicy.ScrollBarAlwaysOff, Qt.ScrollBarPolicy.ScrollBarAlwaysOn),
-            enable_rich_text=True
+            spill_path=TFLogView.default_spill_path("kp_dice"),
+            scroll_policy=(Qt.ScrollBarPolicy.ScrollBarAlwaysOff, Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
         )
         self.right_panel.main_layout.addWidget(self.dice_result_text_edit)
 
     def _add_dice_result(self, text: str) -> None:
-        current_text = self.dice_result_text_edit.toHtml()
-        new_text = text + "<br><br>" + (current_text if current_text else "")
-        self.dice_result_text_edit.setHtml(new_text)
+        self.dice_result_text_edit.add_entry(text)
+
+    def request_roll(self, dice_command: str, dice_info: str) -> None:
+        if self.ws_client and self.ws_client.sid:
+            self.ws_client.request_roll([dice_command], dice_info)
+        else:
+            self.handle_dice_result(dice_command, dice_info, TFDice.command_entry(dice_command))
+
+    def _on_roll_result(self, rolls: list, seq: int) -> None:
+        if self.journal:
+            self.journal.record(self.room_id, rolls, seq)
+        for roll in rolls:
+            self._add_dice_result(format_roll_text(roll))
 
     def handle_dice_result(self, dice_command: str, dice_info: str, result: dict) -> None:
+        if self.journal:
+            self.journal.record(self.room_id, [{
+                "name": "KP",
+                "command": dice_command,
+                "info": dice_info,
+                "ts": round(time.time(), 3),
+                "result": TFDice.serializable_result(result)
+            }])
         if not result["success"]:
             time_str = get_current_datetime(show_time=True, show_seconds=True)
             error_text = f'<span style="color: #B58B00">[{time_str}]</span> - 掷骰出错：{result["error"]}'
@@ -188,9 +215,7 @@ class KPFrame(TFBaseFrame):
             TFApplication.instance().show_message(f"房间号已复制到剪贴板：{room_id}", 5000)
 
     def _on_placeholder_clicked(self):
-        old_text = self.get_component_value("dice_result_text_edit") or ""
-        new_text = old_text + "\n[Placeholder Button] Action triggered!"
-        self.update_component_value("dice_result_text_edit", new_text)
+        self._add_dice_result("[Placeholder Button] Action triggered!")
 
     def _on_connection_error(self, err_msg: str):
         TFApplication.instance().show_message(f"KP Error: {err_msg}", 5000, 'red')
@@ -199,6 +224,10 @@ class KPFrame(TFBaseFrame):
         pass
 
     def _on_user_joined(self, user_sid: str, display_name: str):
+        if user_sid in self.pl_frames:
+            # re-announced after this client resumed its seat
+            return
+
         self.current_pl_count += 1
         self.update_component_value("current_pl", str(self.current_pl_count))
 
@@ -250,6 +279,13 @@ class KPFrame(TFBaseFrame):
     def _on_admin_closed(self):
         TFApplication.instance().show_message("KP关闭了房间", 3000, 'yellow')
 
+    def _on_reconnecting(self, attempt: int):
+        if attempt == 1:
+            TFApplication.instance().show_message("与服务器的连接中断，正在重连...", 3000, 'yellow')
+
+    def _on_reconnected(self, sid: str):
+        TFApplication.instance().show_message("已重新连接到服务器", 3000, 'green')
+
     def _on_disconnected(self):
         time_str = get_current_datetime(show_time=True, show_seconds=True)
         disconnect_text = f'<span style="color: #FF0000">[{time_str}] - 与服务器的连接已断开</span>'
@@ -298,19 +334,19 @@ class KPFrame(TFBaseFrame):
         try:
             if hasattr(self, 'dice_panel'):
                 if hasattr(self.dice_panel, 'ws_client') and self.dice_panel.ws_client:
-                    if self.dice_panel.ws_client.isRunning():
+                    if self.dice_panel.ws_client.is_running():
                         self.dice_panel.ws_client.stop()
-                        self.dice_panel.ws_client.quit()
                         self.dice_panel.ws_client.wait(1000)
                         self.dice_panel.ws_client = None
 
             if hasattr(self, 'ws_client') and self.ws_client:
-                if self.ws_client.isRunning():
-                    self.ws_client.send_message({"type": "admin_close"})
+                if self.ws_client.is_running():
+                    # stop() closes the socket cleanly, which is what makes the server close the room
                     self.ws_client.stop()
-                    self.ws_client.quit()
                     self.ws_client.wait(1000)
                     self.ws_client = None
+
+            self.dice_result_text_edit.close_spill()
         except Exception as e:
             print(f"Error during cleanup: {str(e)}")
         finally:
@@ -321,6 +357,8 @@ class DicePanelFrame(TFBaseFrame):
     def __init__(self, parent=None):
         self.parent = parent
         super().__init__(layout_type=QVBoxLayout, parent=parent)
+        # the odds tables are built once per install; load them before the KP opens a skill panel
+        threading.Thread(target=lambda: TFCocOdds.instance().levels, name="tf-odds", daemon=True).start()
 
     def create_droppable_option_entry(
             self,
@@ -503,6 +541,17 @@ class DicePanelFrame(TFBaseFrame):
         )
         self.content_panel.main_layout.addWidget(self.skill_advantage)
 
+        self.skill_odds = self.create_value_entry(
+            name="skill_odds",
+            label_text="成功率",
+            label_size=80,
+            value_size=240,
+            enable=False
+        )
+        self.content_panel.main_layout.addWidget(self.skill_odds)
+        self.skill_level.value_changed.connect(self._update_skill_odds)
+        self.skill_advantage.value_changed.connect(self._update_skill_odds)
+
         self.roll_info = self.create_value_entry(
             name="roll_info",
             label_text="掷骰信息",
@@ -620,9 +669,58 @@ class DicePanelFrame(TFBaseFrame):
         )
         self.content_panel.main_layout.addWidget(self.strict_vs)
 
+        self.vs_odds = self.create_value_entry(
+            name="vs_odds",
+            label_text="对象1胜率",
+            label_size=80,
+            value_size=240,
+            enable=False
+        )
+        self.content_panel.main_layout.addWidget(self.vs_odds)
+        for entry in (self.vs_skill_level1, self.vs_skill_level2, self.vs_advantage1, self.vs_advantage2, self.strict_vs):
+            entry.value_changed.connect(self._update_vs_odds)
+
     def _setup_hidden_dice_panel(self):
         pass
 
+    @staticmethod
+    def _int_value(entry, default=None):
+        try:
+            return int(entry.get_value())
+        except ValueError:
+            return default
+
+    def _update_skill_odds(self):
+        odds = TFCocOdds.instance()
+        try:
+            probabilities = odds.level_probabilities(
+                self._int_value(self.skill_level, 0), self._int_value(self.skill_advantage, 0)
+            )
+        except ValueError:
+            self.skill_odds.set_value("")
+            return
+
+        def at_least(level):
+            return sum(p for result, p in probabilities.items() if result.value >= level.value)
+
+        self.skill_odds.set_value(
+            f"成功{at_least(CheckResult.SUCCESS):.0%} 困难{at_least(CheckResult.HARD_SUCCESS):.0%} "
+            f"极难{at_least(CheckResult.EXTREME_SUCCESS):.0%} 大成功{probabilities[CheckResult.CRITICAL_SUCCESS]:.0%} "
+            f"大失败{probabilities[CheckResult.CRITICAL_FAILURE]:.0%}"
+        )
+
+    def _update_vs_odds(self):
+        try:
+            chance = TFCocOdds.instance().versus_win_chance(
+                self._int_value(self.vs_skill_level1, 0), self._int_value(self.vs_skill_level2, 0),
+                self._int_value(self.vs_advantage1, 0), self._int_value(self.vs_advantage2, 0),
+                higher_level_required=self.strict_vs.get_value()
+            )
+        except ValueError:
+            self.vs_odds.set_value("")
+            return
+        self.vs_odds.set_value(f"{chance:.1%}")
+
     def _clear_content_panel(self):
         for i in reversed(range(self.content_panel.main_layout.count())): 
             widget = self.content_panel.main_layout.itemAt(i).widget()
@@ -679,10 +777,8 @@ class DicePanelFrame(TFBaseFrame):
             if not dice_command.startswith('r'):
                 dice_command = 'r ' + dice_command
                 
-            result = TFDice.command_entry(dice_command)
-            
             if isinstance(self.parent, KPFrame):
-                self.parent.handle_dice_result(dice_command, dice_info, result)
+                self.parent.request_roll(dice_command, dice_info)
 
     def update_player_list(self, player_list):
         try:
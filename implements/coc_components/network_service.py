@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from collections import deque
+
+
+class NetworkService:
+    """
+    One background thread running one asyncio loop for every WebSocketClient
+    in the process.
+
+    Clients emit their pyqtSignals from this thread and Qt queues them to
+    the receivers' thread. Outgoing messages from the GUI thread go into a
+    single deque; the loop is woken at most once per burst instead of once
+    per message.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.pending = deque()
+        self._wakeup_lock = threading.Lock()
+        self._wakeup_scheduled = False
+        self.thread = threading.Thread(target=self._run, name="tf-network", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def instance(cls) -> 'NetworkService':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = NetworkService()
+            return cls._instance
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """ Run a coroutine on the network loop; returns a concurrent.futures.Future """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def post(self, client, data: dict):
+        """ Queue an outgoing message from any thread """
+        self.pending.append((client, data))
+        with self._wakeup_lock:
+            if self._wakeup_scheduled:
+                return
+            self._wakeup_scheduled = True
+        self.loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        with self._wakeup_lock:
+            self._wakeup_scheduled = False
+        while self.pending:
+            client, data = self.pending.popleft()
+            client.enqueue(data)
@@ -16,6 +16,7 @@ from ui.components.tf_base_frame import TFBaseFrame
 from ui.components.tf_font import NotoSerifNormal
 from ui.tf_application import TFApplication
 from utils.helper import resource_path
+from utils.tf_dice import TFDice
 
 
 class Phase1(BasePhase):
@@ -1120,15 +1121,8 @@ class DiceResultFrame(TFBaseFrame):
         
     def _generate_additional_rolls(self, count: int) -> List[Dict[str, int]]:
         stats = ['STR', 'CON', 'SIZ', 'DEX', 'APP', 'INT', 'POW', 'EDU', 'LUK']
-        rolls = []
-        
-        for _ in range(count):
-            roll = {}
-            for stat in stats:
-                roll[stat] = self._roll_stat(stat)
-            rolls.append(roll)
-            
-        return rolls
+        totals = {stat: self._roll_stat(stat, count) for stat in stats}
+        return [{stat: int(totals[stat][i]) for stat in stats} for i in range(count)]
 
     def _on_selection_changed(self, checked: bool) -> None:
         if checked:
@@ -1139,23 +1133,12 @@ class DiceResultFrame(TFBaseFrame):
             self.values_changed.emit({"selected_stats": selected_stats})
 
     def _generate_rolls(self) -> List[Dict[str, int]]:
-        stats = ['STR', 'CON', 'SIZ', 'DEX', 'APP', 'INT', 'POW', 'EDU', 'LUK']
-        rolls = []
-        
-        for _ in range(self.dice_count):
-            roll = {}
-            for stat in stats:
-                roll[stat] = self._roll_stat(stat)
-            rolls.append(roll)
-            
-        return rolls
+        return self._generate_additional_rolls(self.dice_count)
 
-    def _roll_stat(self, stat_type: str) -> int:
+    def _roll_stat(self, stat_type: str, count: int):
         if stat_type in ['SIZ', 'INT', 'EDU']:
-            result = (sum(random.randint(1, 6) for _ in range(2)) + 6) * 5
-        else:
-            result = sum(random.randint(1, 6) for _ in range(3)) * 5
-        return result
+            return TFDice.roll_many("(2d6+6)*5", count).totals
+        return TFDice.roll_many("3d6*5", count).totals
         
     def _on_confirm_clicked(self) -> None:
         selected_index = self.radio_group.radio_buttons.index(
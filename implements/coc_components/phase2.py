@@ -6,7 +6,7 @@ from PyQt6.QtGui import QFont, QColor
 
 from implements.coc_components.base_phase import BasePhase
 from implements.coc_components.data_reader import load_skills_from_json, load_occupations_from_json
-from implements.coc_components.data_type import Occupation, Skill
+from implements.coc_components.data_type import Occupation, OccupationSkill, Skill, SkillPointTable
 from ui.components.tf_base_button import TFBaseButton
 from ui.components.tf_base_dialog import TFBaseDialog
 from ui.components.tf_base_frame import TFBaseFrame
@@ -124,7 +124,7 @@ class Phase2(BasePhase):
                     str(occupation.calculate_skill_points(self.basic_stats))
                 )
                 
-                concrete_skills = {s.name for s in occupation.occupation_skills if isinstance(s, Skill) and not s.is_abstract}
+                concrete_skills = {s.name for s in occupation.occupation_skills if isinstance(s, (Skill, OccupationSkill)) and not s.is_abstract}
                 
                 for s in self.skills:
                     if s.occupation_point > 0 and s.name not in concrete_skills and s.name != '信誉':
@@ -134,7 +134,7 @@ class Phase2(BasePhase):
                         s.is_occupation = True
 
                 for s1 in occupation.occupation_skills:
-                    if isinstance(s1, Skill):
+                    if isinstance(s1, (Skill, OccupationSkill)):
                         for s2 in self.skills:
                             if s1 == s2:
                                 s2.is_occupation = True
@@ -406,7 +406,7 @@ class BasicInformationFrame(TFBaseFrame):
                     s.is_occupation = True
 
             for s1 in selected_occupation.occupation_skills:
-                if isinstance(s1, Skill):
+                if isinstance(s1, (Skill, OccupationSkill)):
                     if not s1.is_abstract:
                         for s2 in self.parent.parent.skills:
                             if s1 == s2:
@@ -449,7 +449,7 @@ class OccupationSkillsFrame(TFBaseFrame):
             row = i // 3
             col = i % 3
             
-            if isinstance(skill_item, Skill):
+            if isinstance(skill_item, (Skill, OccupationSkill)):
                 entry = OccupationSkillEntry(
                     skill_text=skill_item.display_name,
                     is_abstract=skill_item.is_abstract,
@@ -891,8 +891,9 @@ class OccupationListDialog(TFBaseDialog):
         self.scroll_content = TFBaseFrame(QVBoxLayout, parent=scroll)
         scroll.setWidget(self.scroll_content)
         
-        for occupation in self.occupations:
-            entry = OccupationEntry(occupation, self.basic_stats, parent=self.scroll_content)
+        points = SkillPointTable(self.occupations).points(self.basic_stats)
+        for occupation, occupation_points in zip(self.occupations, points):
+            entry = OccupationEntry(occupation, self.basic_stats, points=int(occupation_points), parent=self.scroll_content)
             self.scroll_content.main_layout.addWidget(entry)
             self._entry_widgets.append(entry)
             
@@ -941,9 +942,10 @@ class OccupationListDialog(TFBaseDialog):
 
 class OccupationEntry(TFBaseFrame):
 
-    def __init__(self, occupation: Occupation, basic_stats: Dict[str, int], parent=None):
+    def __init__(self, occupation: Occupation, basic_stats: Dict[str, int], points: Optional[int] = None, parent=None):
         self.occupation = occupation
         self.basic_stats = basic_stats
+        self.points = points
 
         super().__init__(QVBoxLayout, level=1, radius=10, parent=parent)
         self.setObjectName("occupationEntry")
@@ -981,7 +983,7 @@ class OccupationEntry(TFBaseFrame):
         formula_label.setFont(font)
         self.main_layout.addWidget(formula_label)
 
-        calculated_points = self.occupation.calculate_skill_points(self.basic_stats)
+        calculated_points = self.points if self.points is not None else self.occupation.calculate_skill_points(self.basic_stats)
         points_entry = self.create_value_entry(
             name="points",
             label_text="可用职业点:",
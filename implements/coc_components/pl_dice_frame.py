@@ -1,8 +1,11 @@
 from PyQt6.QtWidgets import QHBoxLayout, QVBoxLayout
 from PyQt6.QtCore import Qt
 
+from core.database.tf_dice_journal import TFDiceJournal
 from ui.components.tf_base_frame import TFBaseFrame
+from ui.components.tf_log_view import TFLogView
 from ui.tf_application import TFApplication
+from implements.coc_components.roll_text import format_roll_text
 from implements.coc_components.websocket_client import WebSocketClient
 from utils.helper import get_current_datetime
 
@@ -72,15 +75,13 @@ class PLFrame(TFBaseFrame):
         )
         self.right_panel.layout().addWidget(self.placeholder_button)
 
-        self.dice_result_text_edit = self.create_text_edit(
+        self.dice_result_text_edit = self.create_log_view(
             name="dice_result_text_edit",
-            text="",
             width=400,
             height=250,
             placeholder_text="掷骰结果和信息会出现在这里...",
-            read_only=True,
-            scroll_policy=(Qt.ScrollBarPolicy.ScrollBarAlwaysOff, Qt.ScrollBarPolicy.ScrollBarAlwaysOn),
-            enable_rich_text=True
+            spill_path=TFLogView.default_spill_path("pl_dice"),
+            scroll_policy=(Qt.ScrollBarPolicy.ScrollBarAlwaysOff, Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
         )
         self.right_panel.layout().addWidget(self.dice_result_text_edit)
 
@@ -122,10 +123,9 @@ class PLFrame(TFBaseFrame):
         self.enter_room_entry.entry_field.setEnabled(False)
 
         if self.ws_client:
-            if self.ws_client.isRunning():
+            if self.ws_client.is_running():
                 self._add_debug_message("关闭现有连接...", 'warning')
                 self.ws_client.stop()
-                self.ws_client.quit()
                 self.ws_client.wait()
             self.ws_client = None
 
@@ -144,12 +144,22 @@ class PLFrame(TFBaseFrame):
         self.ws_client.disconnected.connect(self._on_disconnected)
         self.ws_client.name_update_confirmed.connect(self.handle_name_update_confirm)
         self.ws_client.dice_result_received.connect(self._on_dice_result_received)
+        self.ws_client.roll_result_received.connect(self._on_roll_result)
+        self.ws_client.reconnecting.connect(self._on_reconnecting)
+        self.ws_client.reconnected.connect(self._on_reconnected)
         self.ws_client.start()
 
         self.my_name = display_name
 
     def _on_dice_result_received(self, dice_text: str):
         self._add_dice_result(dice_text)
+
+    def _on_roll_result(self, rolls: list, seq: int):
+        journal = TFDiceJournal.instance()
+        if journal:
+            journal.record(self.ws_client.room_id, rolls, seq)
+        for roll in rolls:
+            self._add_dice_result(format_roll_text(roll))
     
     def _on_pc_data_upload(self):
         pass
@@ -167,9 +177,7 @@ class PLFrame(TFBaseFrame):
         return self.my_name
 
     def _on_placeholder_clicked(self):
-        old_text = self.get_component_value("dice_result_text_edit") or ""
-        new_text = old_text + "\n[Placeholder Button] Action triggered!"
-        self.update_component_value("dice_result_text_edit", new_text)
+        self._add_dice_result("[Placeholder Button] Action triggered!")
 
     def _on_connection_error(self, err_msg: str):
         self._add_debug_message(f"连接错误: {err_msg}", 'error')
@@ -178,9 +186,8 @@ class PLFrame(TFBaseFrame):
         self._enable_input_fields()
         
         if self.ws_client:
-            if self.ws_client.isRunning():
+            if self.ws_client.is_running():
                 self.ws_client.stop()
-                self.ws_client.quit()
                 self.ws_client.wait()
             self.ws_client = None
 
@@ -213,6 +220,12 @@ class PLFrame(TFBaseFrame):
     def _on_admin_closed(self):
         TFApplication.instance().show_message("KP离开了房间，链接断开", 5000, 'yellow')
 
+    def _on_reconnecting(self, attempt: int):
+        self._add_debug_message(f"连接中断，正在重连（第{attempt}次）", 'warning')
+
+    def _on_reconnected(self, sid: str):
+        self._add_debug_message(f"已恢复连接 (SID: {sid})")
+
     def _on_disconnected(self):
         self._add_debug_message("与服务器断开连接", 'warning')
         TFApplication.instance().show_message("与服务器断开连接", 3000, 'yellow')
@@ -233,11 +246,8 @@ class PLFrame(TFBaseFrame):
         else:
             color = '#000000'
             
-        message = f'<div style="color: {color}">[{timestamp}] {message}</div>'
-        
-        old_text = self.dice_result_text_edit.toHtml()
-        new_text = message + (old_text if old_text else "")
-        self.dice_result_text_edit.setHtml(new_text)
+        message = f'<span style="color: {color}">[{timestamp}] {message}</span>'
+        self.dice_result_text_edit.add_entry(message)
 
     def _enable_input_fields(self):
         self.enter_room_entry.button.setEnabled(True)
@@ -251,18 +261,16 @@ class PLFrame(TFBaseFrame):
         self._add_dice_result(update_text)
 
     def _add_dice_result(self, text: str):
-        current_text = self.dice_result_text_edit.toHtml()
-        new_text = text + "<br><br>" + (current_text if current_text else "")
-        self.dice_result_text_edit.setHtml(new_text)
+        self.dice_result_text_edit.add_entry(text)
 
     def closeEvent(self, event):
         try:
-            if self.ws_client and self.ws_client.isRunning():
+            if self.ws_client and self.ws_client.is_running():
                 self.ws_client.send_message({"type": "leave"})
                 self.ws_client.wait(100)
                 self.ws_client.stop()
-                self.ws_client.quit()
                 self.ws_client.wait()
         except:
             pass
+        self.dice_result_text_edit.close_spill()
         event.accept()
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+CHECK_LEVEL_TEXT = {
+    "CRITICAL_FAILURE": "大失败",
+    "FAILURE": "失败",
+    "SUCCESS": "成功",
+    "HARD_SUCCESS": "困难成功",
+    "EXTREME_SUCCESS": "极难成功",
+    "CRITICAL_SUCCESS": "大成功",
+}
+
+
+def _advantage_text(advantage_dice: int) -> str:
+    if advantage_dice > 0:
+        return f" 奖励骰{advantage_dice}"
+    if advantage_dice < 0:
+        return f" 惩罚骰{-advantage_dice}"
+    return ""
+
+def format_roll_text(roll: dict) -> str:
+    """ Render a structured roll from a 'roll_result' frame as a dice log line """
+    time_str = datetime.fromtimestamp(roll.get("ts", 0)).strftime("%Y-%m-%d %H:%M:%S")
+    timestamp = f'<span style="color: #B58B00">[{time_str}]</span>'
+    name = roll.get("name", "")
+    info = roll.get("info", "")
+    prefix = f"{timestamp} - {info} - {name}" if info else f"{timestamp} - {name}"
+    result = roll.get("result", {})
+
+    if not result.get("success"):
+        return f"{prefix} 掷骰出错：{result.get('error', '未知错误')}"
+
+    roll_type = result.get("type")
+    args = ' '.join(roll.get("command", "").split(' ')[1:])
+
+    if roll_type == "normal_roll":
+        results = result["results"]
+        if len(results) == 1:
+            return f"{prefix}进行了掷骰 | {args} - {results[0]}"
+        return f"{prefix}进行了掷骰 | {args} - 结果为{results}，最终点数:{result['total']}"
+
+    if roll_type == "multi_roll":
+        return f"{prefix}进行了多次掷骰 | {args} - 结果为{result['totals']}"
+
+    if roll_type == "probability":
+        p5, p25, p50, p75, p95 = result["percentiles"]
+        text = (f"{prefix}查询了概率 | {result['formula']} - 平均{result['mean']}，标准差{result['std']}，"
+                f"范围{result['min']}~{result['max']}，中位数{p50}，90%落在{p5}~{p95}")
+        if result.get("target") is not None:
+            text += f"，≥{result['target']}的概率为{result['chance']:.2%}"
+        return text
+
+    if roll_type == "skill_check":
+        level = CHECK_LEVEL_TEXT.get(result["check_level"], result["check_level"])
+        return (f"{prefix}进行了技能检定 | {result['skill']}{_advantage_text(result['advantage_dice'])}"
+                f" - {result['final_result']} {level}")
+
+    if roll_type == "versus_check":
+        skill1, skill2 = result["skills"]
+        final1, final2 = result["final_results"]
+        level1, level2 = (CHECK_LEVEL_TEXT.get(level, level) for level in result["check_levels"])
+        winner = "前者胜" if result["skill1_wins"] else "后者胜"
+        strict = " (严格)" if result["strict_mode"] else ""
+        return (f"{prefix}进行了对抗检定{strict} | {skill1} vs {skill2}"
+                f" - {final1} {level1} / {final2} {level2}，{winner}")
+
+    if roll_type == "hidden_roll":
+        return f"{prefix}进行了暗骰"
+
+    return f"{prefix} - 未知的掷骰类型：{roll_type}"
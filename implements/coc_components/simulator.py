@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from implements.coc_components.data_type import Damage
+from utils.tf_coc_odds import TFCocOdds
+from utils.tf_dice import CheckResult
+from utils.tf_dice_expression import TFDiceExpression
+
+SUCCESS = TFCocOdds.LEVELS.index(CheckResult.SUCCESS)
+EXTREME_SUCCESS = TFCocOdds.LEVELS.index(CheckResult.EXTREME_SUCCESS)
+
+
+class CheckSampler:
+    """
+    Draws CoC d100 checks in bulk.
+
+    With k tens dice and one ones die every d100 outcome has a probability
+    that is a multiple of 1 / 10^(k + 1), so the exact bonus/penalty law of
+    TFCocOdds.d100_pmf fits in a table of 10^(k + 1) results (100 entries
+    with no bonus dice, 100000 with three). A check is then one integer
+    draw indexing a per-skill table that already holds the success level
+    from TFCocOdds.check_levels, so sampled levels follow TFDice.skill_check
+    exactly at the cost of a single gather.
+    """
+
+    def __init__(self, rule_type: int = 1):
+        self.levels = TFCocOdds.check_levels()[TFCocOdds._rule_index(rule_type)]
+        self.value_tables = {}
+        self.level_tables = {}
+
+    def _value_table(self, advantage: int) -> np.ndarray:
+        table = self.value_tables.get(advantage)
+        if table is None:
+            if not -TFCocOdds.MAX_ADVANTAGE <= advantage <= TFCocOdds.MAX_ADVANTAGE:
+                raise ValueError(f"advantage dice must be between -{TFCocOdds.MAX_ADVANTAGE} and {TFCocOdds.MAX_ADVANTAGE}, got {advantage}")
+            size = 10 ** (2 + abs(advantage))
+            counts = np.rint(TFCocOdds.d100_pmf(advantage) * size).astype(np.int64)
+            table = self.value_tables[advantage] = np.repeat(np.arange(1, 101, dtype=np.int16), counts)
+        return table
+
+    def _level_table(self, skill: int, advantage: int) -> np.ndarray:
+        table = self.level_tables.get((skill, advantage))
+        if table is None:
+            if not 1 <= skill <= TFCocOdds.SKILLS:
+                raise ValueError(f"skill must be between 1 and {TFCocOdds.SKILLS}, got {skill}")
+            table = self.level_tables[(skill, advantage)] = self.levels[skill - 1][self._value_table(advantage) - 1]
+        return table
+
+    def roll(self, advantage: int, n: int, rng: np.random.Generator) -> np.ndarray:
+        """ n d100 results, 1-100 """
+        table = self._value_table(advantage)
+        return table[rng.integers(0, len(table), n, dtype=np.int32)]
+
+    def check(self, skill: int, advantage: int, n: int, rng: np.random.Generator) -> np.ndarray:
+        """ Level indices into TFCocOdds.LEVELS for n skill checks """
+        table = self._level_table(skill, advantage)
+        return table[rng.integers(0, len(table), n, dtype=np.int32)]
+
+
+@dataclass
+class Combatant:
+    name: str
+    hp: int
+    skill: int
+    damage: str
+    bonus: int = 0
+    damage_bonus: str = "0"
+    dodge: Optional[int] = None
+    dodge_bonus: int = 0
+    penetration: bool = False
+
+    def damage_expressions(self):
+        """ (weapon dice expression, DB multiplier, DB expression, static damage) parsed through Damage """
+        weapon = Damage(self.damage)
+        dice_part = weapon.dice_part
+        if weapon.damage_type == "attenuated":
+            # point-blank band of e.g. 4D6/2D6/1D6
+            dice_part = dice_part.split('/')[0]
+        dice = TFDiceExpression.compile(dice_part if dice_part != "N/A" else "0")
+        return dice, weapon.db_modifier, TFDiceExpression.compile(self.damage_bonus or "0"), weapon.static_part
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Combatant':
+        return Combatant(**data)
+
+
+@dataclass
+class Scenario:
+    """
+    What to simulate, usually loaded from JSON.
+
+    "combat": investigator and opponent trade attacks, investigator first,
+    for up to max_rounds rounds or until one side's HP reaches 0. An attack
+    hits on a SUCCESS or better; against a defender with a dodge value it is
+    opposed and must also beat the dodge's level (dodge wins ties). Extreme
+    successes deal maximum weapon damage and DB, plus a second weapon roll
+    for penetrating weapons.
+
+    "chase": a run of skill checks; the investigator escapes unless more
+    than failures_allowed of them fail.
+    """
+    kind: str
+    investigator: Optional[Combatant] = None
+    opponent: Optional[Combatant] = None
+    max_rounds: int = 10
+    checks: List[Dict] = field(default_factory=list)
+    failures_allowed: int = 0
+    rule_type: int = 1
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Scenario':
+        kind = data.get("type", "combat")
+        if kind == "combat":
+            return Scenario(
+                kind=kind,
+                investigator=Combatant.from_dict(data["investigator"]),
+                opponent=Combatant.from_dict(data["opponent"]),
+                max_rounds=data.get("max_rounds", 10),
+                rule_type=data.get("rule_type", 1)
+            )
+        if kind == "chase":
+            return Scenario(
+                kind=kind,
+                checks=data["checks"],
+                failures_allowed=data.get("failures_allowed", 0),
+                rule_type=data.get("rule_type", 1)
+            )
+        raise ValueError(f"unknown scenario type: {kind}")
+
+
+def _attack(sampler, attacker: Combatant, defender: Combatant, weapon, n, rng) -> np.ndarray:
+    """ Damage dealt by n attacks (0 on a miss) """
+    level = sampler.check(attacker.skill, attacker.bonus, n, rng)
+    hit = level >= SUCCESS
+    if defender.dodge is not None:
+        dodge_level = sampler.check(defender.dodge, defender.dodge_bonus, n, rng)
+        hit &= level > dodge_level
+
+    dice, db_modifier, db, static = weapon
+    damage = dice.roll_many(n, rng).totals + static
+    bonus = db.roll_many(n, rng).totals
+    extreme = level >= EXTREME_SUCCESS
+    if extreme.any():
+        damage = np.where(extreme, dice.distribution().max + static, damage)
+        bonus = np.where(extreme, db.distribution().max, bonus)
+        if attacker.penetration:
+            damage = damage + np.where(extreme, dice.roll_many(n, rng).totals, 0)
+    if db_modifier:
+        damage = damage + np.ceil(bonus * db_modifier).astype(np.int64)
+    return np.where(hit, np.maximum(damage, 0), 0)
+
+def _run_combat(scenario: Scenario, n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    sampler = CheckSampler(scenario.rule_type)
+    investigator, opponent = scenario.investigator, scenario.opponent
+    investigator_weapon, opponent_weapon = investigator.damage_expressions(), opponent.damage_expressions()
+
+    investigator_hp = np.full(n, investigator.hp, dtype=np.int64)
+    opponent_hp = np.full(n, opponent.hp, dtype=np.int64)
+    rounds = np.full(n, scenario.max_rounds, dtype=np.int64)
+    active = np.arange(n)
+    for round_number in range(1, scenario.max_rounds + 1):
+        if not len(active):
+            break
+        # only still-running fights draw dice, so late rounds get cheap
+        opponent_hp[active] -= _attack(sampler, investigator, opponent, investigator_weapon, len(active), rng)
+        standing = active[opponent_hp[active] > 0]
+        investigator_hp[standing] -= _attack(sampler, opponent, investigator, opponent_weapon, len(standing), rng)
+        ended = (opponent_hp[active] <= 0) | (investigator_hp[active] <= 0)
+        rounds[active[ended]] = round_number
+        active = active[~ended]
+
+    outcome = np.where(opponent_hp <= 0, 0, np.where(investigator_hp <= 0, 1, 2))
+    return {
+        "outcomes": np.bincount(outcome, minlength=3),
+        "rounds": np.bincount(rounds, minlength=scenario.max_rounds + 1),
+        "investigator_hp": np.bincount(np.clip(investigator_hp, 0, None), minlength=investigator.hp + 1),
+        "opponent_hp": np.bincount(np.clip(opponent_hp, 0, None), minlength=opponent.hp + 1),
+    }
+
+def _run_chase(scenario: Scenario, n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    sampler = CheckSampler(scenario.rule_type)
+    failures = np.zeros(n, dtype=np.int64)
+    for check in scenario.checks:
+        level = sampler.check(check["skill"], check.get("bonus", 0), n, rng)
+        failures += level < SUCCESS
+    escaped = failures <= scenario.failures_allowed
+    return {
+        "outcomes": np.bincount(np.where(escaped, 0, 1), minlength=2),
+        "failures": np.bincount(failures, minlength=len(scenario.checks) + 1),
+    }
+
+def run_chunk(scenario_data: dict, n: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """ One chunk of trials; histograms so chunks merge exactly """
+    scenario = Scenario.from_dict(scenario_data)
+    rng = np.random.default_rng(seed)
+    if scenario.kind == "combat":
+        return _run_combat(scenario, n, rng)
+    return _run_chase(scenario, n, rng)
+
+def simulate(
+    scenario_data: dict,
+    trials: int,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 1_000_000
+) -> dict:
+    """
+    Run trials of a scenario and summarize the outcomes.
+
+    Trials are cut into chunks of chunk_size, and chunk i always gets the
+    i-th child of SeedSequence(seed), so a given (seed, trials, chunk_size)
+    reproduces the same report whatever the number of workers. Chunks run
+    in a process pool when workers > 1.
+    """
+    Scenario.from_dict(scenario_data)  # validate before starting workers
+    chunks = [min(chunk_size, trials - start) for start in range(0, trials, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    if workers <= 1:
+        results = [run_chunk(scenario_data, n, s) for n, s in zip(chunks, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_chunk, [scenario_data] * len(chunks), chunks, seeds))
+
+    totals = {key: sum(result[key] for result in results) for key in results[0]}
+    return summarize(scenario_data, trials, totals)
+
+def _histogram_stats(histogram: np.ndarray) -> dict:
+    values = np.arange(len(histogram))
+    count = histogram.sum()
+    cdf = np.cumsum(histogram) / count
+    return {
+        "mean": round(float(np.dot(values, histogram) / count), 3),
+        "p5": int(np.searchsorted(cdf, 0.05)),
+        "p50": int(np.searchsorted(cdf, 0.5)),
+        "p95": int(np.searchsorted(cdf, 0.95)),
+        "distribution": {int(v): round(float(c / count), 5) for v, c in zip(values, histogram) if c}
+    }
+
+def summarize(scenario_data: dict, trials: int, totals: Dict[str, np.ndarray]) -> dict:
+    outcomes = totals["outcomes"] / trials
+    if scenario_data.get("type", "combat") == "chase":
+        return {
+            "trials": trials,
+            "escaped": round(float(outcomes[0]), 5),
+            "caught": round(float(outcomes[1]), 5),
+            "failures": _histogram_stats(totals["failures"])
+        }
+    return {
+        "trials": trials,
+        "investigator_wins": round(float(outcomes[0]), 5),
+        "opponent_wins": round(float(outcomes[1]), 5),
+        "unresolved": round(float(outcomes[2]), 5),
+        "rounds": _histogram_stats(totals["rounds"]),
+        "investigator_hp": _histogram_stats(totals["investigator_hp"]),
+        "opponent_hp": _histogram_stats(totals["opponent_hp"])
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of a CoC combat or chase scenario")
+    parser.add_argument("scenario", help="scenario JSON file")
+    parser.add_argument("--trials", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.scenario, "r", encoding="utf-8") as f:
+        scenario_data = json.load(f)
+    report = simulate(scenario_data, args.trials, args.seed, args.workers, args.chunk_size)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
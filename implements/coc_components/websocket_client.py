@@ -2,11 +2,27 @@ import asyncio
 import json
 import random
 import string
+import threading
+from collections import deque
+
 import websockets
 
-from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from implements.coc_components.network_service import NetworkService
+from utils.tf_protocol import TFProtocol
+
+
+class JoinRejected(Exception):
+    pass
+
+
+class WebSocketClient(QObject):
+    """
+    One room connection. All clients share NetworkService's loop and
+    thread; signals are emitted from that thread and queued to Qt.
+    """
 
-class WebSocketClient(QThread):
     connection_error = pyqtSignal(str)
     joined_room = pyqtSignal(str)
     user_joined = pyqtSignal(str, str)
@@ -16,41 +32,109 @@ class WebSocketClient(QThread):
     name_update_received = pyqtSignal(str, str, str)
     name_update_confirmed = pyqtSignal(str, str)
     dice_result_received = pyqtSignal(str)
+    roll_result_received = pyqtSignal(list, int)
+    reconnecting = pyqtSignal(int)
+    reconnected = pyqtSignal(str)
 
-    def __init__(self, room_id: str, role: str, display_name: str = "", parent=None):
+    OUTBOX_SIZE = 64
+    MAX_BATCH_SIZE = 64
+    # only the newest queued message of these types is sent
+    COALESCE_TYPES = {"typing"}
+
+    def __init__(self, room_id: str, role: str, display_name: str = "", protocol: int = TFProtocol.BINARY,
+                 heartbeat_interval: float = 5.0, heartbeat_timeout: float = 5.0,
+                 reconnect_attempts: int = 8, reconnect_base_delay: float = 0.1, reconnect_max_delay: float = 5.0,
+                 flush_interval: float = 0.01, parent=None):
         super().__init__(parent)
         self.room_id = room_id
         self.role = role
         self.display_name = display_name
         self.ws = None
         self.sid = None
+        self.resume_key = None
         self.server_url = "ws://127.0.0.1:8765"
-        self.loop = None
+        self.service = None
+        self.requested_protocol = protocol
+        self.protocol = TFProtocol.JSON
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.flush_interval = flush_interval
+        self.last_seq = 0
+        self.awaiting_replay = False
+        self.outbox = deque()
+        self.room_closed = False
+        self._stopping = False
+        self._future = None
+        self._finished = threading.Event()
+        self._outbox_ready = asyncio.Event()
 
     async def _connect_ws(self):
-        """ Connect and send 'join' message """
+        """ Connect and send 'join', resuming the previous seat when sid and resume_key are known """
+        ws = None
         try:
-            self.ws = await websockets.connect(self.server_url, ping_interval=None)  # 禁用ping来测试
+            ws = await websockets.connect(
+                self.server_url,
+                ping_interval=self.heartbeat_interval,
+                ping_timeout=self.heartbeat_timeout,
+                open_timeout=self.heartbeat_timeout
+            )
             join_payload = {
                 "type": "join",
                 "role": "admin" if self.role == "admin" else "player",
                 "token": self.room_id,
-                "display_name": self.display_name
+                "display_name": self.display_name,
+                "protocol": self.requested_protocol
             }
-            await self.ws.send(json.dumps(join_payload))
-            response = await self.ws.recv()
-            data = json.loads(response)
+            if self.sid and self.resume_key:
+                join_payload["sid"] = self.sid
+                join_payload["resume_key"] = self.resume_key
+                join_payload["last_seq"] = self.last_seq
+            await ws.send(json.dumps(join_payload))
+            response = await asyncio.wait_for(ws.recv(), self.heartbeat_timeout)
+            data = TFProtocol.decode(response)
             if data.get("type") == "error":
-                raise Exception(data.get("message", "Unknown error"))
+                raise JoinRejected(data.get("message", "Unknown error"))
             elif data.get("type") == "joined":
                 self.sid = data.get("sid")
-                self.joined_room.emit(self.sid)
+                self.resume_key = data.get("resume_key")
+                self.protocol = data.get("protocol", TFProtocol.JSON)
+                if data.get("resumed"):
+                    # the server follows up with a 'replay' marker and the missed results
+                    self.awaiting_replay = True
+                else:
+                    self.last_seq = data.get("seq", 0)
+                    self.joined_room.emit(self.sid)
+                self.ws = ws
+        except JoinRejected:
+            raise
         except Exception as e:
             raise Exception(f"WebSocket连接失败: {str(e)}")
+        finally:
+            # a socket that did not become self.ws (rejected, timed out, cancelled) is not closed by anyone else
+            if ws is not None and ws is not self.ws:
+                await ws.close()
 
-    async def _handle_message(self, message: str):
+    def _accept_sequenced(self, data: dict) -> bool:
+        """ True for the next result in order; drops duplicates and asks for a replay on a gap """
+        seq = data.get("seq")
+        if not seq:
+            return True
+        if seq <= self.last_seq:
+            return False
+        if seq > self.last_seq + 1:
+            if not self.awaiting_replay:
+                self.awaiting_replay = True
+                self.enqueue({"type": "replay", "token": self.room_id, "seq": self.last_seq})
+            return False
+        self.last_seq = seq
+        return True
+
+    async def _handle_message(self, message):
         try:
-            data = json.loads(message)
+            data = TFProtocol.decode(message)
             msg_type = data.get('type')
             
             if msg_type == 'error':
@@ -75,6 +159,7 @@ class WebSocketClient(QThread):
                     self.user_left.emit(sid, display_name)
                     
             elif msg_type == 'disconnect':
+                self.room_closed = True
                 reason = data.get('reason')
                 if reason == 'admin_closed':
                     self.admin_closed.emit()
@@ -94,29 +179,103 @@ class WebSocketClient(QThread):
                         self.name_update_received.emit(old_name, new_name, sid)
                 
             elif msg_type == "dice_result":
-                dice_text = data.get("dice_text", "")
-                self.dice_result_received.emit(dice_text)
+                if self._accept_sequenced(data):
+                    dice_text = data.get("dice_text", "")
+                    self.dice_result_received.emit(dice_text)
+
+            elif msg_type == "roll_result":
+                rolls = data.get("rolls") or []
+                if self._accept_sequenced(data) and rolls:
+                    self.roll_result_received.emit(rolls, data.get("seq") or 0)
+
+            elif msg_type == "replay":
+                self.last_seq = data.get("seq", self.last_seq)
+                self.awaiting_replay = False
                     
-        except json.JSONDecodeError:
+        except ValueError:
             self.connection_error.emit('Invalid message format')
 
     async def _listen_loop(self):
+        """ Read until the socket closes; returns True when the drop was unexpected """
+        while True:
+            try:
+                message = await self.ws.recv()
+                await self._handle_message(message)
+            except websockets.exceptions.ConnectionClosed:
+                return not (self._stopping or self.room_closed)
+            except Exception as e:
+                self.connection_error.emit(f"消息处理错误: {str(e)}")
+
+    async def _reconnect(self) -> bool:
+        """ Rejoin the same seat with exponential backoff; the first attempt is immediate """
+        self.ws = None
+        delay = self.reconnect_base_delay
+        for attempt in range(1, self.reconnect_attempts + 1):
+            if self._stopping:
+                return False
+            self.reconnecting.emit(attempt)
+            try:
+                await self._connect_ws()
+            except JoinRejected:
+                return False
+            except Exception:
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self.reconnect_max_delay)
+                continue
+            self.reconnected.emit(self.sid)
+            self._outbox_ready.set()
+            return True
+        return False
+
+    async def _session(self):
         try:
-            while True:
-                try:
-                    message = await self.ws.recv()
-                    await self._handle_message(message)
-                except websockets.exceptions.ConnectionClosedOK:
+            while await self._listen_loop():
+                if not await self._reconnect():
+                    self.connection_error.emit("连接异常关闭，重连失败")
                     break
-                except websockets.exceptions.ConnectionClosedError as e:
-                    self.connection_error.emit(f"连接异常关闭: {str(e)}")
-                    break
-                except Exception as e:
-                    self.connection_error.emit(f"消息处理错误: {str(e)}")
         except asyncio.CancelledError:
             pass
         finally:
-            self.disconnected.emit()
+            if not self._stopping:
+                self.disconnected.emit()
+
+    async def _run(self):
+        try:
+            try:
+                await self._connect_ws()
+            except Exception as e:
+                self.connection_error.emit(f"连接失败：{str(e)}")
+                return
+
+            writer = asyncio.create_task(self._writer_loop())
+            self._outbox_ready.set()
+            try:
+                await self._session()
+            finally:
+                writer.cancel()
+                await self._close_ws()
+        finally:
+            self._finished.set()
+
+    async def _writer_loop(self):
+        """ Send what queued up during each flush tick as one frame """
+        while True:
+            await self._outbox_ready.wait()
+            if self.flush_interval:
+                await asyncio.sleep(self.flush_interval)
+            self._outbox_ready.clear()
+            while self.outbox and self.ws:
+                batch = [self.outbox.popleft() for _ in range(min(len(self.outbox), self.MAX_BATCH_SIZE))]
+                if len(batch) == 1:
+                    frame = TFProtocol.encode(batch[0], self.protocol)
+                else:
+                    frame = TFProtocol.encode({"type": "batch", "messages": batch}, self.protocol)
+                try:
+                    await self.ws.send(frame)
+                except websockets.exceptions.ConnectionClosed:
+                    # kept at the head of the outbox until the seat is resumed
+                    self.outbox.extendleft(reversed(batch))
+                    break
 
     async def _close_ws(self):
         if self.ws:
@@ -126,47 +285,54 @@ class WebSocketClient(QThread):
                 pass
             self.ws = None
 
+    def start(self):
+        self.service = NetworkService.instance()
+        self._finished.clear()
+        self._future = self.service.submit(self._run())
+
     def stop(self):
-        if self.loop and self.loop.is_running():
-            self.loop.call_soon_threadsafe(self.loop.stop)
-            
+        self._stopping = True
+        if self._future is not None:
+            self._future.cancel()
+
     def close(self):
         self.stop()
 
-    def run(self):
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
+    def is_running(self) -> bool:
+        return self._future is not None and not self._finished.is_set()
 
-        try:
-            self.loop.run_until_complete(self._connect_ws())
-        except Exception as e:
-            self.connection_error.emit(f"连接失败：{str(e)}")
-            self.loop.close()
-            return
-
-        try:
-            listen_task = self.loop.create_task(self._listen_loop())
-        except Exception as e:
-            self.connection_error.emit(f"启动监听失败：{str(e)}")
-            self.loop.close()
-            return
-
-        try:
-            self.loop.run_forever()
-        finally:
-            self.loop.run_until_complete(self._close_ws())
-            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
-            self.loop.close()
+    def wait(self, timeout_ms: int = None) -> bool:
+        """ Block until the socket is closed after stop() """
+        return self._finished.wait(None if timeout_ms is None else timeout_ms / 1000)
 
     def send_message(self, data: dict):
-        if self.ws and self.loop and self.loop.is_running():
-            self.loop.call_soon_threadsafe(
-                asyncio.ensure_future, self._async_send(data)
-            )
+        """ Send from any thread; messages sent while reconnecting are held in the outbox """
+        if self._future is not None and not self._stopping:
+            self.service.post(self, data)
 
-    async def _async_send(self, data: dict):
-        if self.ws:
-            await self.ws.send(json.dumps(data))
+    def enqueue(self, data: dict):
+        """ Queue a message on the network loop """
+        if self._stopping:
+            return
+        if data.get("type") in self.COALESCE_TYPES:
+            for index, queued in enumerate(self.outbox):
+                if queued.get("type") == data["type"]:
+                    del self.outbox[index]
+                    break
+        if self.ws is None and len(self.outbox) >= self.OUTBOX_SIZE:
+            # disconnected for a while: keep the newest messages only
+            self.outbox.popleft()
+        self.outbox.append(data)
+        self._outbox_ready.set()
+
+    def request_roll(self, commands: list, info: str = ""):
+        """ Ask the server to evaluate dice commands; results arrive via roll_result_received """
+        self.send_message({
+            "type": "roll",
+            "token": self.room_id,
+            "commands": commands,
+            "info": info
+        })
 
     @staticmethod
     def generate_room_id(length=6):
@@ -117,16 +117,14 @@ class TFDiceRoller(TFDraggableWindow):
 
     def closeEvent(self, event):
         if self.page1 and hasattr(self.page1, 'ws_client') and self.page1.ws_client:
-            if self.page1.ws_client.isRunning():
+            if self.page1.ws_client.is_running():
                 self.page1.ws_client.stop()
-                self.page1.ws_client.quit()
                 self.page1.ws_client.wait()
                 self.page1.ws_client = None
 
         if self.page2 and hasattr(self.page2, 'ws_client') and self.page2.ws_client:
-            if self.page2.ws_client.isRunning():
+            if self.page2.ws_client.is_running():
                 self.page2.ws_client.stop()
-                self.page2.ws_client.quit()
                 self.page2.ws_client.wait()
                 self.page2.ws_client = None
 
@@ -4,6 +4,7 @@ import sys
 from PyQt6.QtGui import QFontDatabase
 from PyQt6.QtCore import QTranslator
 
+from core.database.tf_database import TFDatabase
 from ui.tf_application import TFApplication
 from ui.views.tf_mainwindow import TFMainWindow
 from ui.components.tf_message_bar import TFMessageBar
@@ -34,6 +35,8 @@ def main():
     db_folder = os.path.join(base_dir, 'core', 'database')
     if not os.path.exists(db_folder):
         os.makedirs(db_folder)
+    db_path = os.path.join(db_folder, 'tf_desktop.db')
+    app.database = TFDatabase(f"sqlite:///{db_path}", db_path)
 
     TFToolRegistry.auto_discover_tools()
 
@@ -0,0 +1,5 @@
+import sys
+
+from server.bench.load import main
+
+sys.exit(main())
@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import random
+import sys
+
+
+class ChaosProxy:
+    """ TCP proxy in front of the room server that resets each connection after a random lifetime """
+
+    def __init__(self, upstream_host, upstream_port, mean_lifetime):
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.mean_lifetime = mean_lifetime
+        self.accepted = 0
+        self.dropped = 0
+
+    async def _pipe(self, reader, writer):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, client_reader, client_writer):
+        self.accepted += 1
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(self.upstream_host, self.upstream_port)
+        except OSError:
+            client_writer.transport.abort()
+            return
+
+        pipes = asyncio.gather(
+            self._pipe(client_reader, upstream_writer),
+            self._pipe(upstream_reader, client_writer)
+        )
+        try:
+            await asyncio.wait_for(asyncio.shield(pipes), random.expovariate(1 / self.mean_lifetime))
+        except asyncio.TimeoutError:
+            # abort without a close handshake, like a dropped Wi-Fi link
+            self.dropped += 1
+            client_writer.transport.abort()
+            upstream_writer.transport.abort()
+            await asyncio.gather(pipes, return_exceptions=True)
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Chaos proxy on {host}:{port} -> {self.upstream_host}:{self.upstream_port}, "
+              f"mean connection lifetime {self.mean_lifetime}s")
+        async with server:
+            await server.serve_forever()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Proxy that drops room server connections on purpose")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--upstream", default="127.0.0.1:8765", help="HOST:PORT of the room server")
+    parser.add_argument("--mean-lifetime", type=float, default=3.0,
+                        help="average seconds before a proxied connection is reset")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    host, _, port = args.upstream.rpartition(":")
+    proxy = ChaosProxy(host or "127.0.0.1", int(port), args.mean_lifetime)
+    try:
+        asyncio.run(proxy.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from server import server as room_server
+from server.bench.load import percentile
+
+
+class FakeSocket:
+    """ Stands in for a websocket: the server only ever sends to it, and every frame is discarded """
+
+    async def send(self, frame):
+        pass
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+def reset_server():
+    for ws in list(room_server.senders):
+        room_server.close_sender(ws)
+    room_server.rooms.clear()
+    room_server.connections.clear()
+    room_server.dirty_rooms.clear()
+
+async def populate(room_count, players):
+    """ Join room_count admins and players per room through the real join path; returns the player sockets """
+    player_sockets = []
+    for i in range(room_count):
+        token = f"ROOM{i:06d}"
+        admin = FakeSocket()
+        room_server.open_sender(admin)
+        await room_server.process_message(admin, {"type": "join", "role": "admin", "token": token})
+        for j in range(players):
+            ws = FakeSocket()
+            room_server.open_sender(ws)
+            await room_server.process_message(ws, {"type": "join", "role": "player", "token": token,
+                                                   "display_name": f"PL{j}"})
+            player_sockets.append(ws)
+    # let the sender tasks drain the joined / user_joined frames
+    await asyncio.sleep(0)
+    return player_sockets
+
+async def disconnect_wave(sockets, detach):
+    """ Close every socket the way handler() does; returns the cost of each in microseconds """
+    costs = []
+    for ws in sockets:
+        started = time.perf_counter()
+        await room_server.remove_connection(ws, detach)
+        room_server.close_sender(ws)
+        costs.append((time.perf_counter() - started) * 1e6)
+    return costs
+
+async def measure(room_count, args):
+    reset_server()
+    player_sockets = await populate(room_count, args.players)
+    connections = len(room_server.connections)
+    wave = random.sample(player_sockets, max(1, int(len(player_sockets) * args.wave)))
+    half = len(wave) // 2
+    # half leave cleanly, half drop and keep their seat for a resume
+    costs = await disconnect_wave(wave[:half], False) + await disconnect_wave(wave[half:], True)
+    reset_server()
+    return {
+        "rooms": room_count,
+        "connections": connections,
+        "disconnects": len(costs),
+        "mean_us": round(sum(costs) / len(costs), 2),
+        "p50_us": round(percentile(costs, 50), 2),
+        "p99_us": round(percentile(costs, 99), 2)
+    }
+
+async def run_bench(args):
+    return [await measure(room_count, args) for room_count in args.rooms]
+
+def print_report(report):
+    print(f"{'rooms':>8}{'connections':>13}{'disconnects':>13}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+    for row in report:
+        print(f"{row['rooms']:>8}{row['connections']:>13}{row['disconnects']:>13}"
+              f"{row['mean_us']:>10}{row['p50_us']:>10}{row['p99_us']:>10}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cost of one disconnect as the number of rooms and connections grows")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[100, 1000, 10000], help="room counts to measure")
+    parser.add_argument("--players", type=int, default=4, help="players per room")
+    parser.add_argument("--wave", type=float, default=0.1, help="fraction of players that disconnect at once")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    report = asyncio.run(run_bench(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+
+import websockets
+
+from server.bench.load import BENCH_PREFIX, BenchClient, BenchStats, percentile, raise_open_file_limit, spawn_server
+from utils.tf_protocol import TFProtocol
+
+
+class Flooder:
+    """ An abusive admin that sends typing, name_update and dice_result frames as fast as it can and never reads """
+
+    def __init__(self, url, token):
+        self.url = url
+        self.token = token
+        self.ws = None
+        self.sent = 0
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.url, max_queue=None)
+        await self.ws.send(json.dumps({"type": "join", "role": "admin", "token": self.token, "display_name": ""}))
+        await self.ws.recv()
+
+    async def flood(self, deadline):
+        frames = itertools.cycle([
+            json.dumps({"type": "typing", "token": self.token, "content": "x" * 200}),
+            json.dumps({"type": "name_update", "token": self.token, "sid": "1", "old_name": "a", "new_name": "b"}),
+            json.dumps({"type": "dice_result", "token": self.token, "dice_text": "flood"}),
+        ])
+        while time.perf_counter() < deadline:
+            await self.ws.send(next(frames))
+            self.sent += 1
+            if self.sent % 64 == 0:
+                # let the latency probes run on this client process too
+                await asyncio.sleep(0)
+
+    async def close(self):
+        self.ws.transport.abort()
+
+
+async def probe(client, interval, deadline):
+    """ The quiet room's admin rolls every interval; its BenchClient records the round trip as fanout_ms """
+    while time.perf_counter() < deadline:
+        await client.send({"type": "dice_result", "token": client.token, "dice_text": f"{BENCH_PREFIX}{time.perf_counter()}:"})
+        await asyncio.sleep(interval)
+
+async def measure(rooms, interval, duration):
+    stats = BenchStats()
+    for room in rooms:
+        room.stats = stats
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(probe(room, interval, deadline) for room in rooms))
+    await asyncio.sleep(0.5)
+    return stats.fanout_ms
+
+def summary(latencies):
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(max(latencies, default=0.0), 3)
+    }
+
+async def run_bench(args):
+    rooms = [BenchClient(args.url, f"QUIET{i:04d}", "admin", TFProtocol.JSON, None) for i in range(args.rooms)]
+    for room in rooms:
+        await room.connect()
+
+    baseline = await measure(rooms, args.interval, args.duration)
+
+    flooders = [Flooder(args.url, f"FLOOD{i:04d}") for i in range(args.flooders)]
+    for flooder in flooders:
+        await flooder.connect()
+    started = time.perf_counter()
+    deadline = started + args.duration + 0.5
+    flooding = asyncio.gather(*(flooder.flood(deadline) for flooder in flooders))
+    flooded = await measure(rooms, args.interval, args.duration)
+    await flooding
+    flood_seconds = time.perf_counter() - started
+
+    for flooder in flooders:
+        await flooder.close()
+    for room in rooms:
+        await room.close()
+
+    return {
+        "quiet_rooms": args.rooms,
+        "flooders": args.flooders,
+        "flood_frames_per_second": round(sum(flooder.sent for flooder in flooders) / flood_seconds, 1),
+        "baseline": summary(baseline),
+        "flooded": summary(flooded)
+    }
+
+def print_report(report):
+    print(f"{report['quiet_rooms']} quiet rooms, {report['flooders']} flooding socket(s) "
+          f"at {report['flood_frames_per_second']} frames/s")
+    print(f"{'':<10}{'samples':>9}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for phase in ("baseline", "flooded"):
+        row = report[phase]
+        print(f"{phase:<10}{row['samples']:>9}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Round-trip latency of quiet rooms, before and while other sockets flood the same server")
+    parser.add_argument("--url", default="ws://127.0.0.1:8765")
+    parser.add_argument("--spawn", action="store_true", help="start python -m server.server on the --url port")
+    parser.add_argument("--server-args", default="",
+                        help="extra arguments passed to the spawned server, e.g. --no-rate-limits to compare")
+    parser.add_argument("--rooms", type=int, default=10, help="quiet rooms measured")
+    parser.add_argument("--flooders", type=int, default=1, help="abusive sockets, each in its own room")
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between rolls in each quiet room")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds measured in each phase")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p99-ratio", type=float, default=None,
+                        help="exit with status 1 when flooded p99 exceeds baseline p99 by more than this factor")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    raise_open_file_limit()
+
+    server = spawn_server(args.url, args.server_args) if args.spawn else None
+    try:
+        report = asyncio.run(run_bench(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.max_p99_ratio is not None:
+        limit = max(report["baseline"]["p99_ms"], 1.0) * args.max_p99_ratio
+        if report["flooded"]["p99_ms"] > limit:
+            print(f"FAIL: flooded p99 {report['flooded']['p99_ms']} ms > {limit:.3f} ms")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from utils.tf_protocol import TFProtocol
+
+BENCH_PREFIX = "bench:"
+DEFAULT_MIX = "dice_result=6,typing=3,name_update=1"
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("dice_result", "typing", "name_update"):
+            raise argparse.ArgumentTypeError(f"unknown message type in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def server_rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def raise_open_file_limit():
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def spawn_server(url, server_args=""):
+    """ Start python -m server.server on the port of url; the caller terminates it """
+    port = url.rsplit(":", 1)[-1].split("/")[0]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "server.server", "--port", port, *server_args.split()],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        stdout=subprocess.DEVNULL
+    )
+    time.sleep(1.0)
+    return server
+
+
+class BenchStats:
+    def __init__(self):
+        self.sent = {"dice_result": 0, "typing": 0, "name_update": 0}
+        self.delivered = 0
+        self.fanout_ms = []
+        self.name_rtt_ms = []
+        self.errors = 0
+
+
+class BenchClient:
+    """ One simulated admin or player socket """
+
+    def __init__(self, url, token, role, protocol, stats):
+        self.url = url
+        self.token = token
+        self.role = role
+        self.requested_protocol = protocol
+        self.protocol = TFProtocol.JSON
+        self.stats = stats
+        self.ws = None
+        self.sid = None
+        self.name = ""
+        self.pending_names = {}
+        self.reader = None
+
+    async def connect(self, display_name=""):
+        self.ws = await websockets.connect(self.url, max_queue=None)
+        self.name = display_name
+        await self.ws.send(json.dumps({
+            "type": "join",
+            "role": self.role,
+            "token": self.token,
+            "display_name": display_name,
+            "protocol": self.requested_protocol
+        }))
+        joined = TFProtocol.decode(await self.ws.recv())
+        if joined.get("type") != "joined":
+            raise RuntimeError(f"join failed: {joined}")
+        self.sid = joined["sid"]
+        self.protocol = joined.get("protocol", TFProtocol.JSON)
+        self.reader = asyncio.create_task(self._read_loop())
+
+    async def send(self, message):
+        await self.ws.send(TFProtocol.encode(message, self.protocol))
+
+    async def _read_loop(self):
+        try:
+            async for frame in self.ws:
+                now = time.perf_counter()
+                data = TFProtocol.decode(frame)
+                msg_type = data.get("type")
+                if msg_type == "dice_result":
+                    text = data.get("dice_text", "")
+                    if text.startswith(BENCH_PREFIX):
+                        sent_at = float(text[len(BENCH_PREFIX):].split(":", 1)[0])
+                        self.stats.fanout_ms.append((now - sent_at) * 1000)
+                        self.stats.delivered += 1
+                elif msg_type == "update":
+                    self.stats.delivered += 1
+                elif msg_type == "name_update" and self.role == "admin":
+                    await self.send({
+                        "type": "name_update_confirmed",
+                        "old_name": data.get("old_name", ""),
+                        "new_name": data.get("new_name", ""),
+                        "sid": data.get("sid", ""),
+                        "token": self.token
+                    })
+                elif msg_type == "name_update_confirmed":
+                    sent_at = self.pending_names.pop(data.get("new_name"), None)
+                    if sent_at is not None:
+                        self.stats.name_rtt_ms.append((now - sent_at) * 1000)
+                elif msg_type == "error":
+                    self.stats.errors += 1
+        except ConnectionClosed:
+            pass
+
+    async def close(self):
+        if self.ws:
+            await self.ws.close()
+        if self.reader:
+            self.reader.cancel()
+
+
+class BenchRoom:
+    def __init__(self, index, args, stats):
+        self.token = f"BENCH{index:05d}"
+        self.args = args
+        self.stats = stats
+        self.admin = BenchClient(args.url, self.token, "admin", args.protocol, stats)
+        self.players = [
+            BenchClient(args.url, self.token, "player", args.protocol, stats)
+            for _ in range(args.players)
+        ]
+        self.rename_counter = 0
+
+    async def connect(self):
+        await self.admin.connect()
+        for i, player in enumerate(self.players):
+            await player.connect(display_name=f"PL{i}")
+
+    async def drive(self, mix, deadline):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        typed = ""
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            msg_type = random.choices(names, weights)[0]
+            if msg_type == "dice_result":
+                await self.admin.send({
+                    "type": "dice_result",
+                    "token": self.token,
+                    "dice_text": f"{BENCH_PREFIX}{time.perf_counter()}:{'x' * self.args.payload}"
+                })
+            elif msg_type == "typing":
+                typed = (typed + random.choice("abcdefgh "))[-200:]
+                await self.admin.send({"type": "typing", "token": self.token, "content": typed})
+            elif self.players:
+                player = random.choice(self.players)
+                self.rename_counter += 1
+                new_name = f"{self.token}-{self.rename_counter}"
+                player.pending_names[new_name] = time.perf_counter()
+                await player.send({
+                    "type": "name_update",
+                    "old_name": player.name,
+                    "new_name": new_name,
+                    "sid": player.sid,
+                    "token": self.token
+                })
+                player.name = new_name
+            else:
+                continue
+            self.stats.sent[msg_type] += 1
+
+    async def close(self):
+        for player in self.players:
+            await player.close()
+        await self.admin.close()
+
+
+async def run_bench(args, server_pid=None):
+    stats = BenchStats()
+    mix = parse_mix(args.mix)
+    rooms = [BenchRoom(i, args, stats) for i in range(args.rooms)]
+
+    rss_before = server_rss_kb(server_pid) if server_pid else None
+    connect_started = time.perf_counter()
+    for start in range(0, len(rooms), args.connect_batch):
+        await asyncio.gather(*(room.connect() for room in rooms[start:start + args.connect_batch]))
+    connect_seconds = time.perf_counter() - connect_started
+    await asyncio.sleep(0.5)
+    rss_after = server_rss_kb(server_pid) if server_pid else None
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(room.drive(mix, deadline) for room in rooms))
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - started
+
+    for room in rooms:
+        await room.close()
+
+    report = {
+        "rooms": args.rooms,
+        "players_per_room": args.players,
+        "protocol": args.protocol,
+        "connect_seconds": round(connect_seconds, 3),
+        "duration_seconds": round(elapsed, 3),
+        "sent": stats.sent,
+        "sent_per_second": round(sum(stats.sent.values()) / elapsed, 1),
+        "delivered": stats.delivered,
+        "delivered_per_second": round(stats.delivered / elapsed, 1),
+        "fanout_p50_ms": round(percentile(stats.fanout_ms, 50), 3),
+        "fanout_p99_ms": round(percentile(stats.fanout_ms, 99), 3),
+        "fanout_max_ms": round(max(stats.fanout_ms, default=0.0), 3),
+        "name_update_rtt_p50_ms": round(percentile(stats.name_rtt_ms, 50), 3),
+        "name_update_rtt_p99_ms": round(percentile(stats.name_rtt_ms, 99), 3),
+        "errors": stats.errors
+    }
+    if rss_before is not None and rss_after is not None:
+        report["server_rss_kb"] = rss_after
+        report["server_kb_per_room"] = round((rss_after - rss_before) / max(1, args.rooms), 2)
+    return report
+
+def print_report(report):
+    print(f"rooms: {report['rooms']} x {report['players_per_room']} players, protocol {report['protocol']}")
+    print(f"connect: {report['connect_seconds']}s, run: {report['duration_seconds']}s")
+    print(f"sent: {report['sent']} ({report['sent_per_second']}/s)")
+    print(f"delivered: {report['delivered']} ({report['delivered_per_second']}/s)")
+    print(f"fan-out latency ms: p50 {report['fanout_p50_ms']}  p99 {report['fanout_p99_ms']}  max {report['fanout_max_ms']}")
+    print(f"name_update rtt ms: p50 {report['name_update_rtt_p50_ms']}  p99 {report['name_update_rtt_p99_ms']}")
+    if "server_kb_per_room" in report:
+        print(f"server memory: {report['server_rss_kb']} KB RSS, {report['server_kb_per_room']} KB/room")
+    print(f"errors: {report['errors']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for the TF dice room server")
+    parser.add_argument("--url", default="ws://127.0.0.1:8765")
+    parser.add_argument("--spawn", action="store_true",
+                        help="start python -m server.server on the --url port and measure its memory")
+    parser.add_argument("--server-args", default="",
+                        help="extra arguments passed to the spawned server")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4, help="players per room")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of traffic")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages per second per room")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"weights of dice_result, typing and name_update (default {DEFAULT_MIX})")
+    parser.add_argument("--payload", type=int, default=120, help="dice_text padding in characters")
+    parser.add_argument("--protocol", type=int, choices=(TFProtocol.JSON, TFProtocol.BINARY), default=TFProtocol.BINARY)
+    parser.add_argument("--connect-batch", type=int, default=100, help="rooms joined concurrently during ramp-up")
+    parser.add_argument("--drain", type=float, default=1.0, help="seconds to wait for in-flight messages")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p99-ms", type=float, default=None,
+                        help="exit with status 1 when fan-out p99 exceeds this")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    raise_open_file_limit()
+
+    server = spawn_server(args.url, args.server_args) if args.spawn else None
+
+    try:
+        report = asyncio.run(run_bench(args, server.pid if server else None))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if args.max_p99_ms is not None and report["fanout_p99_ms"] > args.max_p99_ms:
+        print(f"FAIL: fan-out p99 {report['fanout_p99_ms']} ms > {args.max_p99_ms} ms")
+        return 1
+    return 0
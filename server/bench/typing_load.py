@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+
+import websockets
+
+from server import server as room_server
+from server.bench.load import BenchClient, BenchStats, raise_open_file_limit
+from utils.tf_protocol import TFProtocol
+
+
+class ServerThread:
+    """
+    The room server on its own event loop in a background thread, so the
+    bench can count what that loop does: tasks created (through a task
+    factory), timers scheduled with call_at and the thread's CPU time.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.tasks = 0
+        self.timers = 0
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="room-server", daemon=True)
+
+    def _task_factory(self, loop, coro, **kwargs):
+        self.tasks += 1
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    def _count_timers(self):
+        call_at = self.loop.call_at
+
+        def counting_call_at(when, callback, *args, **kwargs):
+            self.timers += 1
+            return call_at(when, callback, *args, **kwargs)
+
+        # call_later goes through call_at as well
+        self.loop.call_at = counting_call_at
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.set_task_factory(self._task_factory)
+        self._count_timers()
+        self.loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        self.stop = asyncio.Event()
+        async with websockets.serve(room_server.handler, "127.0.0.1", self.port, max_queue=None):
+            self.started.set()
+            await self.stop.wait()
+
+    def start(self):
+        self.thread.start()
+        self.started.wait()
+
+    def sample(self):
+        """ (tasks, timers, CPU seconds) of the server loop so far """
+        future = asyncio.run_coroutine_threadsafe(self._sample(), self.loop)
+        return future.result()
+
+    async def _sample(self):
+        return self.tasks, self.timers, time.thread_time()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.stop.set)
+        self.thread.join()
+
+
+async def type_in_room(admin, rate, deadline):
+    typed = ""
+    sent = 0
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(random.expovariate(rate))
+        typed = (typed + random.choice("abcdefgh "))[-200:]
+        await admin.send({"type": "typing", "token": admin.token, "content": typed})
+        sent += 1
+    return sent
+
+async def run_bench(args, server):
+    url = f"ws://127.0.0.1:{args.port}"
+    stats = BenchStats()
+    admins = [BenchClient(url, f"TYPE{i:05d}", "admin", TFProtocol.JSON, stats) for i in range(args.admins)]
+    players = [BenchClient(url, admin.token, "player", TFProtocol.JSON, stats) for admin in admins]
+    for start in range(0, len(admins), args.connect_batch):
+        batch = range(start, min(start + args.connect_batch, len(admins)))
+        await asyncio.gather(*(admins[i].connect() for i in batch))
+        await asyncio.gather(*(players[i].connect(display_name="PL") for i in batch))
+    await asyncio.sleep(0.5)
+
+    tasks_before, timers_before, cpu_before = server.sample()
+    started = time.perf_counter()
+    keystrokes = await asyncio.gather(*(type_in_room(admin, args.rate, started + args.duration) for admin in admins))
+    elapsed = time.perf_counter() - started
+    tasks_after, timers_after, cpu_after = server.sample()
+
+    # every room flushes its last content once, a quiet period after its last keystroke
+    delivered_before = stats.delivered
+    await asyncio.sleep(room_server.TYPING_QUIET_PERIOD + 0.5)
+    updates = stats.delivered - delivered_before
+
+    for client in players + admins:
+        await client.close()
+
+    return {
+        "admins": args.admins,
+        "duration_seconds": round(elapsed, 3),
+        "keystrokes": sum(keystrokes),
+        "keystrokes_per_second": round(sum(keystrokes) / elapsed, 1),
+        "server_tasks_per_second": round((tasks_after - tasks_before) / elapsed, 1),
+        "server_timers_per_second": round((timers_after - timers_before) / elapsed, 1),
+        "server_cpu_percent": round((cpu_after - cpu_before) / elapsed * 100, 1),
+        "server_cpu_us_per_keystroke": round((cpu_after - cpu_before) / max(1, sum(keystrokes)) * 1e6, 2),
+        "updates_after_quiet_period": updates
+    }
+
+def print_report(report):
+    print(f"{report['admins']} admins typing for {report['duration_seconds']}s: "
+          f"{report['keystrokes']} keystrokes ({report['keystrokes_per_second']}/s)")
+    print(f"server tasks created: {report['server_tasks_per_second']}/s, "
+          f"timers scheduled: {report['server_timers_per_second']}/s")
+    print(f"server CPU: {report['server_cpu_percent']}% of one core, "
+          f"{report['server_cpu_us_per_keystroke']} us per keystroke")
+    print(f"updates flushed after the quiet period: {report['updates_after_quiet_period']} "
+          f"(one per room expected)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Task churn and CPU of the room server with many typing admins")
+    parser.add_argument("--port", type=int, default=8767, help="port of the in-process server")
+    parser.add_argument("--admins", type=int, default=500, help="rooms, each with one typing admin and one player")
+    parser.add_argument("--rate", type=float, default=5.0, help="keystrokes per second per admin")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of typing")
+    parser.add_argument("--connect-batch", type=int, default=100, help="rooms joined concurrently during ramp-up")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    raise_open_file_limit()
+
+    server = ServerThread(args.port)
+    server.start()
+    try:
+        report = asyncio.run(run_bench(args, server))
+    finally:
+        server.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import Opcode
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """
+    permessage-deflate that leaves small unfragmented messages uncompressed.
+
+    RFC 7692 lets the sender pick per message (RSV1 unset means raw), and
+    short frames such as typing updates or user_left gain nothing from
+    deflate but still cost a compressor call.
+    """
+
+    def __init__(self, *args, threshold: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+
+    def encode(self, frame):
+        if frame.fin and frame.opcode is not Opcode.CONT and len(frame.data) < self.threshold:
+            return frame
+        return super().encode(frame)
+
+
+class ThresholdServerPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+
+    def __init__(self, *args, threshold: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            self.compress_settings,
+            threshold=self.threshold
+        )
+
+
+def deflate_extension(window_bits=None, level=None, mem_level=None, threshold=0):
+    compress_settings = {}
+    if level is not None:
+        compress_settings["level"] = level
+    if mem_level is not None:
+        compress_settings["memLevel"] = mem_level
+    return ThresholdServerPerMessageDeflateFactory(
+        server_max_window_bits=window_bits,
+        client_max_window_bits=window_bits,
+        compress_settings=compress_settings or None,
+        threshold=threshold
+    )
@@ -0,0 +1,51 @@
+import argparse
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, now):
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now):
+        """ Seconds until the next token is available """
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def take_token(buckets, key, limits, now):
+    """ Take a token from buckets[key], creating it from limits[key]; True when unlimited """
+    bucket = buckets.get(key)
+    if bucket is None:
+        limit = limits.get(key)
+        if limit is None:
+            return True
+        bucket = buckets[key] = TokenBucket(limit[0], limit[1], now)
+    return bucket.take(now)
+
+def parse_limit(text):
+    """ Parse TYPE=RATE/BURST, e.g. typing=20/40 """
+    try:
+        msg_type, _, spec = text.partition("=")
+        rate, _, burst = spec.partition("/")
+        rate = float(rate)
+        burst = float(burst) if burst else max(1.0, rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected TYPE=RATE/BURST, got {text!r}")
+    if not msg_type or rate <= 0 or burst < 1:
+        raise argparse.ArgumentTypeError(f"expected TYPE=RATE/BURST, got {text!r}")
+    return msg_type.strip(), (rate, burst)
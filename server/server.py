@@ -1,91 +1,573 @@
+import argparse
 import asyncio
+import collections
+import contextlib
 import json
+import secrets
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import websockets
 from websockets.exceptions import ConnectionClosed
 
+from server.compression import deflate_extension
+from server.metrics import MetricsRegistry
+from server.ratelimit import TokenBucket, parse_limit, take_token
+from server.snapshot import RoomSnapshotStore
+from utils.tf_dice import TFDice
+from utils.tf_dice_expression import TFDiceExpression
+from utils.tf_protocol import TFProtocol
+
 rooms = {}
 #  rooms[token] = {
 #     "admin": websocket or None,
 #     "admin_sid": str,
-#     "clients": { "sid": websocket },
-#     "typing_timer": asyncio.Task or None,
-#     "last_content": str
+#     "admin_key": str,
+#     "clients": { "sid": {"ws": websocket or None, "display_name": str, "resume_key": str} },
+#     "typing_timer": asyncio.TimerHandle or None,
+#     "typing_deadline": float,
+#     "last_content": str,
+#     "pending_rolls": [dict],
+#     "roll_flush": asyncio.Handle or None,
+#     "buckets": { "msg_type": TokenBucket },
+#     "seq": int,
+#     "history": deque of the last HISTORY_SIZE sequenced messages,
+#     "detached_until": float or None
+# }
+#  A websocket of None marks a member that dropped without closing, or was
+#  restored from a snapshot, and has not rejoined yet; it keeps its seat
+#  until detached_until.
+connections = {}
+#  connections[websocket] = (token, sid, role)
+senders = {}
+#  senders[websocket] = {
+#     "queue": asyncio.Queue of encoded frames,
+#     "task": asyncio.Task draining the queue,
+#     "overflows": int,
+#     "protocol": TFProtocol.JSON or TFProtocol.BINARY,
+#     "inbound": TokenBucket or None,
+#     "buckets": { "msg_type": TokenBucket },
+#     "coalesced": { "msg_type": latest rate-limited message }
 # }
 global_sid_counter = 0
+SID_OFFSET = 0
+SID_STEP = 1
+
+SEND_QUEUE_SIZE = 256
+OVERFLOW_POLICY = "drop_oldest"   # "drop_oldest" or "disconnect"
+MAX_OVERFLOWS = 32
+
+TYPING_QUIET_PERIOD = 2.0
+
+MAX_BATCH_SIZE = 64
+
+MAX_ROLL_COMMANDS = 20
+MAX_COMMAND_LENGTH = 200
+MAX_ROLL_DICE = 1000
+# the only TFDice commands the server evaluates. r is bounded by MAX_ROLL_DICE per roll
+# and TFDice.MAX_REPEAT, ra/rav/rah by TFDice.MAX_ADVANTAGE, rp by the cost cap in
+# tf_dice_distribution; rh rolls nothing
+ROLL_COMMANDS = {"r", "rh", "ra", "rav", "rah", "rp"}
+# exact odds can take up to ~0.5 s, so they run on roll_executor instead of the event loop
+OFFLOADED_COMMANDS = {"rp"}
+MAX_OFFLOADED_PER_FRAME = 4
+ROLL_TIMEOUT = 2.0
+roll_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="room-roll")
+
+# (tokens per second, burst)
+CONNECTION_RATE_LIMIT = (50.0, 100.0)
+RATE_LIMITS = {
+    "join": (2.0, 5.0),
+    "typing": (20.0, 40.0),
+    "name_update": (1.0, 5.0),
+    "name_update_confirmed": (10.0, 30.0),
+    "dice_result": (10.0, 30.0),
+    "roll": (10.0, 30.0),
+    "replay": (2.0, 5.0),
+}
+ROOM_RATE_LIMITS = {
+    "typing": (40.0, 80.0),
+    "dice_result": (30.0, 90.0),
+    "roll": (30.0, 90.0),
+}
+# rate-limited messages of these types are delayed, keeping only the latest
+COALESCE_TYPES = {"typing"}
+
+SNAPSHOT_INTERVAL = 5.0
+REJOIN_GRACE_PERIOD = 120.0
+
+# dice_result and roll_result frames kept per room for resuming clients
+HISTORY_SIZE = 256
+RESUME_GRACE_PERIOD = 30.0
+# a restored room continues numbering this far past its last snapshotted seq, so frames
+# sent after that snapshot but before a crash are never numbered twice (clients journal
+# rolls by room and seq); well above what the room rate limits allow in SNAPSHOT_INTERVAL
+RESTORE_SEQ_GAP = 1000
+dirty_rooms = set()
+
+metrics = MetricsRegistry()
+metrics.gauge("tf_rooms", "Open rooms", lambda: len(rooms))
+metrics.gauge("tf_connections", "Open websocket connections", lambda: len(senders))
+metrics.gauge("tf_send_queue_depth", "Frames waiting in all send queues",
+              lambda: sum(sender["queue"].qsize() for sender in senders.values()))
+metrics.gauge("tf_send_queue_depth_max", "Frames waiting in the fullest send queue",
+              lambda: max((sender["queue"].qsize() for sender in senders.values()), default=0))
+messages_received = metrics.counter("tf_messages_received_total", "Messages received, by type", label="type")
+frames_enqueued = metrics.counter("tf_frames_enqueued_total", "Frames queued for sending")
+queue_overflows = metrics.counter("tf_send_queue_overflows_total", "Frames dropped because a send queue was full")
+slow_disconnects = metrics.counter("tf_slow_client_disconnects_total", "Connections closed by the overflow policy")
+disconnects = metrics.counter("tf_disconnects_total", "Connections closed")
+resumes = metrics.counter("tf_resumes_total", "Members that rejoined their seat, by role", label="role")
+replayed = metrics.counter("tf_replayed_frames_total", "Sequenced frames resent to resuming clients")
+rate_limited = metrics.counter("tf_rate_limited_total", "Messages dropped or coalesced by rate limits, by type", label="type")
+throttled_reads = metrics.counter("tf_throttled_reads_total", "Reads delayed by the per-connection rate limit")
+roll_timeouts = metrics.counter("tf_roll_timeouts_total", "Offloaded roll commands that missed ROLL_TIMEOUT")
+broadcast_seconds = metrics.histogram(
+    "tf_broadcast_seconds", "Time spent fanning a message out to a room",
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01)
+)
+broadcast_recipients = metrics.histogram(
+    "tf_broadcast_recipients", "Clients reached by one broadcast", (1, 2, 4, 8, 16, 32, 64)
+)
 
 def get_new_sid():
     global global_sid_counter
     global_sid_counter += 1
-    return str(global_sid_counter)
+    return str((global_sid_counter - 1) * SID_STEP + SID_OFFSET + 1)
 
-async def broadcast_to_clients(token, message):
+def get_resume_key():
+    return secrets.token_hex(8)
+
+def mark_dirty(token):
+    dirty_rooms.add(token)
+
+async def _sender_loop(ws, sender):
+    queue = sender["queue"]
+    try:
+        while True:
+            frame = await queue.get()
+            await ws.send(frame)
+            if queue.empty():
+                sender["overflows"] = 0
+    except ConnectionClosed:
+        pass
+
+def open_sender(ws):
+    sender = {
+        "queue": asyncio.Queue(maxsize=SEND_QUEUE_SIZE),
+        "task": None,
+        "overflows": 0,
+        "protocol": TFProtocol.JSON,
+        "inbound": None,
+        "buckets": {},
+        "coalesced": {}
+    }
+    if CONNECTION_RATE_LIMIT:
+        loop = asyncio.get_running_loop()
+        sender["inbound"] = TokenBucket(CONNECTION_RATE_LIMIT[0], CONNECTION_RATE_LIMIT[1], loop.time())
+    sender["task"] = asyncio.create_task(_sender_loop(ws, sender))
+    senders[ws] = sender
+
+def close_sender(ws):
+    sender = senders.pop(ws, None)
+    if sender:
+        sender["task"].cancel()
+
+def enqueue_frame(ws, frame):
+    sender = senders.get(ws)
+    if sender is None:
+        return
+
+    queue = sender["queue"]
+    if queue.full():
+        sender["overflows"] += 1
+        queue_overflows.inc()
+        if OVERFLOW_POLICY == "disconnect" and sender["overflows"] >= MAX_OVERFLOWS:
+            slow_disconnects.inc()
+            close_sender(ws)
+            asyncio.create_task(ws.close(1008, "client too slow"))
+            return
+        queue.get_nowait()
+    queue.put_nowait(frame)
+    frames_enqueued.inc()
+
+def connection_protocol(ws):
+    sender = senders.get(ws)
+    return sender["protocol"] if sender else TFProtocol.JSON
+
+def send_message(ws, message):
+    enqueue_frame(ws, TFProtocol.encode(message, connection_protocol(ws)))
+
+def broadcast_to_clients(token, message):
     room = rooms.get(token)
-    if room and room["clients"]:
-        msg = json.dumps(message)
-        tasks = []
+    if room:
+        broadcast_to_clients_of(room, message)
+
+def broadcast_to_clients_of(room, message):
+    if room["clients"]:
+        started = time.perf_counter()
+        frames = {}
         for client_info in room["clients"].values():
             ws_client = client_info["ws"]
-            tasks.append(asyncio.create_task(ws_client.send(msg)))
-        if tasks:
-            await asyncio.wait(tasks)
+            if ws_client is None:
+                continue
+            protocol = connection_protocol(ws_client)
+            frame = frames.get(protocol)
+            if frame is None:
+                frame = frames[protocol] = TFProtocol.encode(message, protocol)
+            enqueue_frame(ws_client, frame)
+        broadcast_seconds.observe(time.perf_counter() - started)
+        broadcast_recipients.observe(len(room["clients"]))
 
-async def send_to_admin(token, message):
+def send_to_admin(token, message):
     room = rooms.get(token)
     if room and room["admin"]:
-        await room["admin"].send(json.dumps(message))
+        send_message(room["admin"], message)
 
-async def handle_typing_timeout(token):
+def flush_typing(token):
     room = rooms.get(token)
-    if room and room["admin"] and room["last_content"] is not None:
+    if not room:
+        return
+
+    loop = asyncio.get_running_loop()
+    if loop.time() < room["typing_deadline"]:
+        # more keystrokes arrived since this handle was armed
+        room["typing_timer"] = loop.call_at(room["typing_deadline"], flush_typing, token)
+        return
+
+    room["typing_timer"] = None
+    if room["admin"] and room["last_content"] is not None:
         update_msg = {
             "type": "update",
             "content": room["last_content"]
         }
-        await broadcast_to_clients(token, update_msg)
+        broadcast_to_clients(token, update_msg)
+
+def command_type(command):
+    return command.split(' ', 1)[0].lower()
+
+def evaluate_roll(command):
+    if len(command) > MAX_COMMAND_LENGTH:
+        return {"success": False, "error": "指令过长"}
+    if command_type(command) not in ROLL_COMMANDS:
+        return {"success": False, "error": f"未知指令: {command_type(command)}"}
+    if command_type(command) == "r" and rolled_dice(command) > MAX_ROLL_DICE:
+        return {"success": False, "error": "骰子数量过多"}
+    try:
+        result = TFDice.command_entry(command)
+    except ValueError:
+        # a bad command must never take the roller's connection down with it
+        return {"success": False, "error": "无法解析的指令"}
+    return TFDice.serializable_result(result)
+
+def rolled_dice(command):
+    """ Most dice one roll of an r command's formula can roll; 0 when it does not parse (TFDice reports that) """
+    formula = command.split(' ', 1)[1] if ' ' in command else ""
+    try:
+        return TFDiceExpression.compile(formula.partition('#')[2] if '#' in formula else formula).max_dice
+    except ValueError:
+        return 0
+
+async def evaluate_offloaded(command):
+    """ evaluate_roll on roll_executor; a command still queued at the timeout is cancelled """
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(roll_executor, evaluate_roll, command), ROLL_TIMEOUT)
+    except asyncio.TimeoutError:
+        roll_timeouts.inc()
+        return {"success": False, "error": "计算超时"}
+
+def flush_rolls(token):
+    room = rooms.get(token)
+    if not room:
+        return
+    room["roll_flush"] = None
+    message = {"type": "roll_result", "rolls": room["pending_rolls"]}
+    room["pending_rolls"] = []
+    broadcast_sequenced(token, message)
+
+async def handle_roll(ws, token, data):
+    entry = connections.get(ws)
+    room = rooms.get(token)
+    if not room or not entry or entry[0] != token:
+        send_message(ws, {"type":"error","message":"not in this room"})
+        return
+
+    commands = data.get("commands") or []
+    if not isinstance(commands, list) or len(commands) > MAX_ROLL_COMMANDS:
+        send_message(ws, {"type":"error","message":"invalid roll commands"})
+        return
+
+    commands = [str(command).strip() for command in commands]
+    if sum(command_type(command) in OFFLOADED_COMMANDS for command in commands) > MAX_OFFLOADED_PER_FRAME:
+        send_message(ws, {"type":"error","message":"too many probability commands"})
+        return
+
+    results = []
+    for command in commands:
+        if command_type(command) in OFFLOADED_COMMANDS:
+            results.append(await evaluate_offloaded(command))
+        else:
+            results.append(evaluate_roll(command))
+    if connections.get(ws) != entry or rooms.get(token) is not room:
+        # left or was closed while the rolls were evaluated
+        return
+
+    _, sid, role = entry
+    if role == "admin":
+        name = "KP"
+    else:
+        name = room["clients"][sid]["display_name"] or sid
+
+    for command, result in zip(commands, results):
+        roll = {
+            "sid": sid,
+            "name": name,
+            "command": command,
+            "info": data.get("info", ""),
+            "ts": round(time.time(), 3),
+            "result": result
+        }
+        if roll["result"].get("type") == "hidden_roll":
+            # hidden rolls are only shown to the KP and the roller
+            hidden = {"type": "roll_result", "rolls": [roll]}
+            send_to_admin(token, hidden)
+            if role != "admin":
+                send_message(ws, hidden)
+            continue
+        room["pending_rolls"].append(roll)
+
+    if room["pending_rolls"] and room["roll_flush"] is None:
+        # rolls arriving in the same loop iteration share one frame
+        room["roll_flush"] = asyncio.get_running_loop().call_soon(flush_rolls, token)
+
+def negotiate_protocol(ws, requested):
+    protocol = TFProtocol.BINARY if requested == TFProtocol.BINARY else TFProtocol.JSON
+    sender = senders.get(ws)
+    if sender:
+        sender["protocol"] = protocol
+    return protocol
+
+def send_joined(ws, sid, resume_key, requested_protocol, seq, resumed=False):
+    # always JSON: the client only learns the negotiated protocol from this reply
+    protocol = negotiate_protocol(ws, requested_protocol)
+    enqueue_frame(ws, json.dumps({
+        "type": "joined",
+        "sid": sid,
+        "resume_key": resume_key,
+        "protocol": protocol,
+        "seq": seq,
+        "resumed": resumed
+    }))
+
+def broadcast_sequenced(token, message):
+    """ Number a dice_result or roll_result, keep it for replay and send it to the whole room """
+    room = rooms.get(token)
+    if not room:
+        return
+    room["seq"] += 1
+    message["seq"] = room["seq"]
+    mark_dirty(token)
+    room["history"].append(message)
+    send_to_admin(token, message)
+    broadcast_to_clients_of(room, message)
+
+def replay_history(ws, room, last_seq):
+    """ Resend what a client missed after last_seq, preceded by a 'replay' marker with the new base """
+    history = room["history"]
+    oldest = history[0]["seq"] if history else room["seq"] + 1
+    if not isinstance(last_seq, int) or last_seq > room["seq"]:
+        # unknown position, or the server restarted and numbering began again
+        last_seq = oldest - 1
+    base = max(last_seq, oldest - 1)
+    send_message(ws, {"type": "replay", "seq": base})
+    for message in history:
+        if message["seq"] > base:
+            send_message(ws, message)
+            replayed.inc()
+
+def evict_connection(ws):
+    """ Drop a stale socket whose seat was just resumed from a new one """
+    connections.pop(ws, None)
+    close_sender(ws)
+    asyncio.create_task(ws.close(1000, "resumed elsewhere"))
+
+def resume_member(ws, token, role, data):
+    room = rooms[token]
+    sid = data.get("sid")
+    resume_key = data.get("resume_key")
+
+    if role == "admin":
+        if sid != room["admin_sid"] or resume_key != room["admin_key"]:
+            send_message(ws, {"type":"error","message":"cannot resume admin"})
+            return
+        if room["admin"] is not None and room["admin"] != ws:
+            # the old socket has not noticed the drop yet
+            evict_connection(room["admin"])
+        room["admin"] = ws
+        connections[ws] = (token, sid, "admin")
+        resumes.inc("admin")
+        send_joined(ws, sid, resume_key, data.get("protocol"), room["seq"], resumed=True)
+        replay_history(ws, room, data.get("last_seq"))
+        for client_sid, client in room["clients"].items():
+            if client["ws"] is not None:
+                send_message(ws, {
+                    "type": "user_joined",
+                    "sid": client_sid,
+                    "display_name": client["display_name"]
+                })
+    else:
+        client = room["clients"].get(sid)
+        if client is None or resume_key != client["resume_key"]:
+            send_message(ws, {"type":"error","message":"cannot resume player"})
+            return
+        if client["ws"] is not None and client["ws"] != ws:
+            evict_connection(client["ws"])
+        client["ws"] = ws
+        connections[ws] = (token, sid, "player")
+        resumes.inc("player")
+        send_joined(ws, sid, resume_key, data.get("protocol"), room["seq"], resumed=True)
+        replay_history(ws, room, data.get("last_seq"))
+        send_to_admin(token, {
+            "type": "user_joined",
+            "sid": sid,
+            "display_name": client["display_name"]
+        })
+
+def admit_message(ws, data):
+    sender = senders.get(ws)
+    if sender is None:
+        return True
+
+    msg_type = data.get("type")
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    scopes = [(sender["buckets"], RATE_LIMITS)]
+    room = rooms.get(data.get("token"))
+    if room is not None:
+        scopes.append((room["buckets"], ROOM_RATE_LIMITS))
+
+    for buckets, limits in scopes:
+        if take_token(buckets, msg_type, limits, now):
+            continue
+        rate_limited.inc(msg_type)
+        if msg_type in COALESCE_TYPES:
+            if msg_type not in sender["coalesced"]:
+                loop.call_later(buckets[msg_type].wait_time(now), replay_coalesced, ws, msg_type)
+            sender["coalesced"][msg_type] = data
+        return False
+    return True
+
+def replay_coalesced(ws, msg_type):
+    sender = senders.get(ws)
+    if sender is None:
+        return
+    data = sender["coalesced"].pop(msg_type, None)
+    if data is not None:
+        asyncio.create_task(process_message(ws, data))
+
+async def throttle_read(ws):
+    """ Charge one message to the connection's read limit, pausing reads when it is exhausted """
+    sender = senders.get(ws)
+    inbound = sender["inbound"] if sender else None
+    if inbound is None:
+        return
+    loop = asyncio.get_running_loop()
+    if not inbound.take(loop.time()):
+        # stop reading so TCP pushes back on the flooding client
+        throttled_reads.inc()
+        await asyncio.sleep(inbound.wait_time(loop.time()))
+        inbound.take(loop.time())
 
 async def handle_message(ws, msg):
-    data = json.loads(msg)
+    try:
+        data = TFProtocol.decode(msg)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        send_message(ws, {"type":"error","message":"invalid frame"})
+        return
     msg_type = data.get("type")
+    # unknown types share one label so clients cannot grow the series set
+    messages_received.inc(msg_type if msg_type in TFProtocol.MESSAGE_TYPES else "other")
+    if msg_type != "batch":
+        await process_message(ws, data)
+        return
 
+    messages = data.get("messages")
+    if not isinstance(messages, list) or len(messages) > MAX_BATCH_SIZE:
+        send_message(ws, {"type":"error","message":"invalid batch"})
+        return
+    for index, item in enumerate(messages):
+        if not isinstance(item, dict) or item.get("type") == "batch":
+            continue
+        if index:
+            # the frame itself already paid for the first message
+            await throttle_read(ws)
+        item_type = item.get("type")
+        messages_received.inc(item_type if item_type in TFProtocol.MESSAGE_TYPES else "other")
+        await process_message(ws, item)
+
+async def process_message(ws, data):
+    if not admit_message(ws, data):
+        return
+
+    msg_type = data.get("type")
     if msg_type == "join":
         role = data.get("role")
         token = data.get("token")
         display_name = data.get("display_name", "")
         if not token:
-            await ws.send(json.dumps({"type":"error","message":"no token provided"}))
+            send_message(ws, {"type":"error","message":"no token provided"})
             return
 
-        if token not in rooms:
+        if data.get("sid") and token in rooms:
+            resume_member(ws, token, role, data)
+        elif token not in rooms:
             if role == "admin":
                 sid = get_new_sid()
                 rooms[token] = {
                     "admin": ws,
                     "admin_sid": sid,
+                    "admin_key": get_resume_key(),
                     "clients": {},
                     "typing_timer": None,
-                    "last_content": ""
+                    "typing_deadline": 0.0,
+                    "last_content": "",
+                    "pending_rolls": [],
+                    "roll_flush": None,
+                    "buckets": {},
+                    "seq": 0,
+                    "history": collections.deque(maxlen=HISTORY_SIZE),
+                    "detached_until": None
                 }
-                await ws.send(json.dumps({"type":"joined","sid":sid}))
+                connections[ws] = (token, sid, "admin")
+                mark_dirty(token)
+                send_joined(ws, sid, rooms[token]["admin_key"], data.get("protocol"), 0)
             else:
-                await ws.send(json.dumps({"type":"error","message":"no such room"}))
+                send_message(ws, {"type":"error","message":"no such room"})
         else:
             room = rooms[token]
             if role == "admin":
                 if room["admin"] is not None and room["admin"] != ws:
-                    await ws.send(json.dumps({"type":"error","message":"admin already exists"}))
+                    send_message(ws, {"type":"error","message":"admin already exists"})
                 else:
-                    await ws.send(json.dumps({"type":"error","message":"admin already set"}))
+                    send_message(ws, {"type":"error","message":"admin already set"})
             else:
                 if room["admin"] is None:
-                    await ws.send(json.dumps({"type":"error","message":"no admin in this room"}))
+                    send_message(ws, {"type":"error","message":"no admin in this room"})
                 else:
                     sid = get_new_sid()
                     room["clients"][sid] = {
                         "ws": ws, 
-                        "display_name": display_name
+                        "display_name": display_name,
+                        "resume_key": get_resume_key()
                     }
-                    await ws.send(json.dumps({"type":"joined","sid":sid}))
-                    await send_to_admin(token, {
+                    connections[ws] = (token, sid, "player")
+                    mark_dirty(token)
+                    send_joined(ws, sid, room["clients"][sid]["resume_key"], data.get("protocol"), room["seq"])
+                    send_to_admin(token, {
                         "type": "user_joined",
                         "sid": sid,
                         "display_name": display_name
@@ -98,24 +580,21 @@ async def handle_message(ws, msg):
             room = rooms[token]
             if room["admin"] == ws:
                 room["last_content"] = content
-                if room["typing_timer"] and not room["typing_timer"].done():
-                    room["typing_timer"].cancel()
-                room["typing_timer"] = asyncio.create_task(
-                    asyncio.sleep(2)
-                )
-                def done_callback(task):
-                    asyncio.create_task(handle_typing_timeout(token))
-                room["typing_timer"].add_done_callback(done_callback)
+                mark_dirty(token)
+                loop = asyncio.get_running_loop()
+                room["typing_deadline"] = loop.time() + TYPING_QUIET_PERIOD
+                if room["typing_timer"] is None:
+                    room["typing_timer"] = loop.call_at(room["typing_deadline"], flush_typing, token)
 
     elif msg_type == "name_update":
         token = data.get("token")
         if not token:
-            await ws.send(json.dumps({"type": "error", "message": "No token in name_update"}))
+            send_message(ws, {"type": "error", "message": "No token in name_update"})
             return
 
         room = rooms.get(token)
         if not room:
-            await ws.send(json.dumps({"type": "error", "message": "Room not found"}))
+            send_message(ws, {"type": "error", "message": "Room not found"})
             return
 
         old_name = data.get("old_name", "")
@@ -124,16 +603,17 @@ async def handle_message(ws, msg):
 
         if user_sid in room["clients"] and room["clients"][user_sid]["ws"] == ws: 
             room["clients"][user_sid]["display_name"] = new_name   ### ← (需要修改，更新display_name)
+            mark_dirty(token)
 
             if room["admin"]:
-                await send_to_admin(token, {
+                send_to_admin(token, {
                     "type": "name_update",
                     "old_name": old_name,
                     "new_name": new_name,
                     "sid": user_sid
                 })
         else:
-            await ws.send(json.dumps({"type": "error", "message": "Invalid sid for name_update"}))
+            send_message(ws, {"type": "error", "message": "Invalid sid for name_update"})
 
     elif msg_type == "name_update_confirmed":
         token = data.get("token")
@@ -147,48 +627,300 @@ async def handle_message(ws, msg):
 
         if sid in room["clients"]:
             ws_pl = room["clients"][sid]["ws"]
-            await ws_pl.send(json.dumps({
+            send_message(ws_pl, {
                 "type": "name_update_confirmed",
                 "old_name": old_name,
                 "new_name": new_name
-            }))
+            })
+
+    elif msg_type == "roll":
+        await handle_roll(ws, data.get("token"), data)
 
     elif msg_type == "dice_result":
         token = data.get("token")
         dice_text = data.get("dice_text", "")
         if token in rooms:
-            await broadcast_to_clients(token, {
+            broadcast_sequenced(token, {
                 "type": "dice_result",
                 "dice_text": dice_text
             })
 
-async def remove_connection(ws):
-    for token, room in list(rooms.items()):
+    elif msg_type == "replay":
+        entry = connections.get(ws)
+        room = rooms.get(data.get("token"))
+        if room and entry and entry[0] == data.get("token"):
+            replay_history(ws, room, data.get("seq"))
+
+def detach_member(room):
+    """ Keep a dropped member's seat for RESUME_GRACE_PERIOD so it can resume """
+    loop = asyncio.get_running_loop()
+    room["detached_until"] = max(room["detached_until"] or 0.0, loop.time() + RESUME_GRACE_PERIOD)
+    loop.call_at(room["detached_until"], expire_detached)
+
+async def remove_connection(ws, detach=False):
+    disconnects.inc()
+    entry = connections.pop(ws, None)
+    if entry is None:
+        return
+
+    token, sid, role = entry
+    room = rooms.get(token)
+    if not room:
+        return
+
+    if role == "admin":
         if room["admin"] == ws:
-            await broadcast_to_clients(token, {"type":"disconnect","reason":"admin closed"})
-            del rooms[token]
-            break
-        else:
-            for sid, cws_dict in list(room["clients"].items()):
-                if cws_dict["ws"] == ws:
-                    del room["clients"][sid]
-                    if room["admin"]:
-                        await send_to_admin(token, {"type":"user_left","sid":sid})
-                    break
+            if detach:
+                room["admin"] = None
+                detach_member(room)
+            else:
+                close_room(token)
+    else:
+        client = room["clients"].get(sid)
+        if client and client["ws"] == ws and detach:
+            client["ws"] = None
+            detach_member(room)
+        elif client and client["ws"] == ws:
+            del room["clients"][sid]
+            mark_dirty(token)
+            if room["admin"]:
+                send_to_admin(token, {"type":"user_left","sid":sid})
+
+def close_room(token):
+    room = rooms.pop(token)
+    broadcast_to_clients_of(room, {"type":"disconnect","reason":"admin closed"})
+    if room["typing_timer"]:
+        room["typing_timer"].cancel()
+    if room["roll_flush"]:
+        room["roll_flush"].cancel()
+    mark_dirty(token)
+
+def restore_rooms(snapshot):
+    global global_sid_counter
+    deadline = asyncio.get_running_loop().time() + REJOIN_GRACE_PERIOD
+    for token, saved in snapshot.items():
+        rooms[token] = {
+            "admin": None,
+            "admin_sid": saved["admin_sid"],
+            "admin_key": saved["admin_key"],
+            "clients": {
+                sid: {"ws": None, "display_name": display_name, "resume_key": resume_key}
+                for sid, (resume_key, display_name) in saved["members"].items()
+            },
+            "typing_timer": None,
+            "typing_deadline": 0.0,
+            "last_content": saved["last_content"],
+            "pending_rolls": [],
+            "roll_flush": None,
+            "buckets": {},
+            "seq": saved["seq"] + RESTORE_SEQ_GAP,
+            "history": collections.deque(maxlen=HISTORY_SIZE),
+            "detached_until": deadline
+        }
+        for sid in [saved["admin_sid"], *saved["members"]]:
+            if sid.isdigit():
+                global_sid_counter = max(global_sid_counter, (int(sid) - SID_OFFSET - 1) // SID_STEP + 1)
+    if snapshot:
+        asyncio.get_running_loop().call_at(deadline, expire_detached)
+
+def expire_detached():
+    now = asyncio.get_running_loop().time()
+    for token, room in list(rooms.items()):
+        if room["detached_until"] is None or room["detached_until"] > now:
+            continue
+        room["detached_until"] = None
+        if room["admin"] is None:
+            close_room(token)
+            continue
+        for sid, client in list(room["clients"].items()):
+            if client["ws"] is None:
+                del room["clients"][sid]
+                mark_dirty(token)
+                send_to_admin(token, {"type":"user_left","sid":sid})
+
+def collect_snapshot_changes():
+    changes = {}
+    for token in dirty_rooms:
+        room = rooms.get(token)
+        if room is None:
+            changes[token] = None
+            continue
+        changes[token] = {
+            "admin_sid": room["admin_sid"],
+            "admin_key": room["admin_key"],
+            "last_content": room["last_content"],
+            "seq": room["seq"],
+            "members": {
+                sid: (client["resume_key"], client["display_name"])
+                for sid, client in room["clients"].items()
+            }
+        }
+    dirty_rooms.clear()
+    return changes
+
+async def snapshot_loop(store):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        changes = collect_snapshot_changes()
+        if not changes:
+            continue
+        try:
+            await loop.run_in_executor(store.executor, store.write, changes)
+        except sqlite3.Error as e:
+            print(f"Snapshot write failed: {e}")
+            dirty_rooms.update(changes)
+
+@contextlib.asynccontextmanager
+async def room_snapshots(path):
+    if not path:
+        yield
+        return
+
+    store = RoomSnapshotStore(path)
+    restore_rooms(store.load())
+    task = asyncio.create_task(snapshot_loop(store))
+    try:
+        yield
+    finally:
+        task.cancel()
+        store.executor.submit(store.write, collect_snapshot_changes()).result()
+        store.close()
+
+@contextlib.asynccontextmanager
+async def metrics_endpoint(address):
+    """ Serve /metrics on address (host, port) for the lifetime of the block; None serves nothing """
+    if not address:
+        yield
+        return
+
+    metrics_server = await metrics.serve(*address)
+    try:
+        yield
+    finally:
+        metrics_server.close()
+        await metrics_server.wait_closed()
 
 async def handler(ws):
+    open_sender(ws)
+    # anything but a clean close keeps the seat open for a resume
+    detach = True
     try:
         async for message in ws:
+            await throttle_read(ws)
             await handle_message(ws, message)
+        detach = False
     except ConnectionClosed:
         pass
     finally:
-        await remove_connection(ws)
+        await remove_connection(ws, detach)
+        close_sender(ws)
+
+def configure(args):
+    """ Apply queue, snapshot and rate limit settings from the CLI and return websockets.serve options """
+    global SEND_QUEUE_SIZE, OVERFLOW_POLICY, SNAPSHOT_INTERVAL, REJOIN_GRACE_PERIOD, CONNECTION_RATE_LIMIT
+    global HISTORY_SIZE, RESUME_GRACE_PERIOD
+    SEND_QUEUE_SIZE = args.send_queue_size
+    OVERFLOW_POLICY = args.overflow_policy
+    SNAPSHOT_INTERVAL = args.snapshot_interval
+    REJOIN_GRACE_PERIOD = args.rejoin_grace
+    HISTORY_SIZE = args.history_size
+    RESUME_GRACE_PERIOD = args.resume_grace
+
+    if args.no_rate_limits:
+        CONNECTION_RATE_LIMIT = None
+        RATE_LIMITS.clear()
+        ROOM_RATE_LIMITS.clear()
+    else:
+        if args.connection_rate:
+            CONNECTION_RATE_LIMIT = parse_limit(f"*={args.connection_rate}")[1]
+        RATE_LIMITS.update(args.rate_limit)
+        ROOM_RATE_LIMITS.update(args.room_rate_limit)
+
+    serve_kwargs = {
+        "max_size": args.max_size,
+        "max_queue": args.max_queue,
+        "compression": None
+    }
+    if not args.no_compression:
+        serve_kwargs["extensions"] = [deflate_extension(
+            window_bits=args.deflate_window_bits,
+            level=args.deflate_level,
+            mem_level=args.deflate_mem_level,
+            threshold=args.deflate_threshold
+        )]
+    return serve_kwargs
+
+async def main(host="", port=8765, serve_kwargs=None, snapshot_path=None, metrics_address=None):
+    async with metrics_endpoint(metrics_address):
+        async with room_snapshots(snapshot_path):
+            async with websockets.serve(handler, host, port, **(serve_kwargs or {})):
+                print(f"Server started on ws://{host or '0.0.0.0'}:{port}")
+                await asyncio.Future()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="TF dice room server")
+    parser.add_argument("--host", default="")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--shards", type=int, default=0,
+                        help="run N worker processes, each owning a subset of rooms (0 = single process)")
+
+    compression = parser.add_argument_group("permessage-deflate")
+    compression.add_argument("--no-compression", action="store_true",
+                             help="disable permessage-deflate")
+    compression.add_argument("--deflate-window-bits", type=int, default=None, choices=range(9, 16),
+                             metavar="{9..15}", help="LZ77 window size (default 15)")
+    compression.add_argument("--deflate-level", type=int, default=6, choices=range(-1, 10),
+                             metavar="{-1..9}", help="zlib compression level")
+    compression.add_argument("--deflate-mem-level", type=int, default=None, choices=range(1, 10),
+                             metavar="{1..9}", help="zlib memory level (default 8)")
+    compression.add_argument("--deflate-threshold", type=int, default=0,
+                             help="send messages shorter than this many bytes uncompressed")
+
+    limits = parser.add_argument_group("limits")
+    limits.add_argument("--max-size", type=int, default=2 ** 20,
+                        help="maximum incoming message size in bytes")
+    limits.add_argument("--max-queue", type=int, default=16,
+                        help="maximum number of incoming frames buffered per connection")
+    limits.add_argument("--send-queue-size", type=int, default=SEND_QUEUE_SIZE,
+                        help="outgoing frames buffered per connection")
+    limits.add_argument("--overflow-policy", choices=("drop_oldest", "disconnect"), default=OVERFLOW_POLICY,
+                        help="what to do when a connection's send queue is full")
+    limits.add_argument("--no-rate-limits", action="store_true", help="disable all rate limits")
+    limits.add_argument("--connection-rate", default=None, metavar="RATE/BURST",
+                        help="messages read per second from one connection before reads pause "
+                             f"(default {CONNECTION_RATE_LIMIT[0]:g}/{CONNECTION_RATE_LIMIT[1]:g})")
+    limits.add_argument("--rate-limit", type=parse_limit, action="append", default=[], metavar="TYPE=RATE/BURST",
+                        help="per-connection limit for one message type, may be repeated")
+    limits.add_argument("--room-rate-limit", type=parse_limit, action="append", default=[], metavar="TYPE=RATE/BURST",
+                        help="per-room limit for one message type, may be repeated")
+
+    snapshots = parser.add_argument_group("snapshots")
+    snapshots.add_argument("--snapshot", default=None, metavar="PATH",
+                           help="SQLite file for room snapshots; rooms are restored from it on start")
+    snapshots.add_argument("--snapshot-interval", type=float, default=SNAPSHOT_INTERVAL,
+                           help="seconds between incremental snapshot writes")
+    snapshots.add_argument("--rejoin-grace", type=float, default=REJOIN_GRACE_PERIOD,
+                           help="seconds restored admins and players have to rejoin their seat")
+
+    resume = parser.add_argument_group("resume")
+    resume.add_argument("--resume-grace", type=float, default=RESUME_GRACE_PERIOD,
+                        help="seconds a member that dropped without closing keeps its seat")
+    resume.add_argument("--history-size", type=int, default=HISTORY_SIZE,
+                        help="dice results kept per room for replay to resuming clients")
 
-async def main():
-    async with websockets.serve(handler, "", 8765):
-        print("Server started on ws://0.0.0.0:8765")
-        await asyncio.Future()
+    monitoring = parser.add_argument_group("metrics")
+    monitoring.add_argument("--metrics-port", type=int, default=0,
+                            help="serve Prometheus text metrics on this port at /metrics (0 = off); "
+                                 "in sharded mode shard i uses port + i")
+    monitoring.add_argument("--metrics-host", default="127.0.0.1")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.shards > 0:
+        from server.shard import run_sharded
+        run_sharded(args)
+    else:
+        metrics_address = (args.metrics_host, args.metrics_port) if args.metrics_port else None
+        asyncio.run(main(args.host, args.port, configure(args), args.snapshot, metrics_address))
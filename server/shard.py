@@ -0,0 +1,186 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import zlib
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from server import server as room_server
+from utils.tf_protocol import TFProtocol
+
+SHARD_START_TIMEOUT = 10.0
+
+
+def shard_for_token(token, shard_count):
+    # crc32 rather than hash(): str hashes are salted per process
+    return zlib.crc32(token.encode("utf-8")) % shard_count
+
+def shard_addresses(shard_count, base_port=9765):
+    if hasattr(socket, "AF_UNIX"):
+        socket_dir = tempfile.mkdtemp(prefix="tf_shards_")
+        return [os.path.join(socket_dir, f"shard{i}.sock") for i in range(shard_count)]
+    return [("127.0.0.1", base_port + i) for i in range(shard_count)]
+
+async def _connect(address):
+    if isinstance(address, str):
+        return await websockets.unix_connect(address)
+    host, port = address
+    return await websockets.connect(f"ws://{host}:{port}")
+
+async def _serve_shard(address, serve_kwargs, snapshot_path, metrics_address):
+    if isinstance(address, str):
+        server = websockets.unix_serve(room_server.handler, address, **serve_kwargs)
+    else:
+        host, port = address
+        server = websockets.serve(room_server.handler, host, port, **serve_kwargs)
+    async with room_server.metrics_endpoint(metrics_address):
+        async with room_server.room_snapshots(snapshot_path):
+            async with server:
+                await asyncio.Future()
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def _run_shard(index, shard_count, address, args):
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    room_server.SID_OFFSET = index
+    room_server.SID_STEP = shard_count
+    serve_kwargs = room_server.configure(args)
+    # shard links never leave the machine, compression only pays off at the router
+    serve_kwargs.pop("extensions", None)
+    # rooms are placed by token hash, so each shard keeps its own snapshot file
+    snapshot_path = f"{args.snapshot}.shard{index}" if args.snapshot else None
+    metrics_address = (args.metrics_host, args.metrics_port + index) if args.metrics_port else None
+    try:
+        asyncio.run(_serve_shard(address, serve_kwargs, snapshot_path, metrics_address))
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardRouter:
+    """
+    Front router for sharded mode.
+
+    Every client connection gets one upstream link per shard it talks to,
+    opened lazily. Frames are routed by their room token, so a join always
+    lands on the shard owning that room and later messages follow it;
+    frames without a token go to the shard of the last join.
+    """
+
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.shard_count = len(addresses)
+
+    async def wait_for_shards(self, timeout=SHARD_START_TIMEOUT):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for address in self.addresses:
+            while True:
+                try:
+                    link = await _connect(address)
+                    await link.close()
+                    break
+                except OSError:
+                    if loop.time() > deadline:
+                        raise
+                    await asyncio.sleep(0.05)
+
+    def _route(self, message, primary):
+        """ (shard index, message type) for one client frame; index is None for a frame of the wrong shape """
+        try:
+            data = TFProtocol.decode(message)
+        except ValueError:
+            return None, None
+        if not isinstance(data, dict):
+            return None, None
+        msg_type, token = data.get("type"), data.get("token")
+        if msg_type == "batch" and data.get("messages"):
+            messages = data["messages"]
+            if not isinstance(messages, list) or not isinstance(messages[0], dict):
+                return None, msg_type
+            # a client only talks to one room, so its batches share one token
+            token = messages[0].get("token")
+        if token is not None and not isinstance(token, str):
+            return None, msg_type
+        if token:
+            return shard_for_token(token, self.shard_count), msg_type
+        return (primary if primary is not None else 0), msg_type
+
+    async def _pump(self, link, ws):
+        try:
+            async for frame in link:
+                await ws.send(frame)
+        except ConnectionClosed:
+            pass
+
+    async def handler(self, ws):
+        links = {}
+        pumps = []
+        primary = None
+        # pass an unclean client drop on so the shard keeps the seat for a resume
+        close_code = 1011
+        try:
+            async for message in ws:
+                index, msg_type = self._route(message, primary)
+                if index is None:
+                    protocol = TFProtocol.BINARY if isinstance(message, bytes) else TFProtocol.JSON
+                    await ws.send(TFProtocol.encode({"type": "error", "message": "invalid frame"}, protocol))
+                    continue
+                if index not in links:
+                    link = await _connect(self.addresses[index])
+                    links[index] = link
+                    pumps.append(asyncio.create_task(self._pump(link, ws)))
+                if msg_type == "join":
+                    primary = index
+                await links[index].send(message)
+            close_code = 1000
+        except ConnectionClosed:
+            pass
+        finally:
+            for link in links.values():
+                await link.close(close_code)
+            for pump in pumps:
+                pump.cancel()
+
+    async def serve(self, host, port, **serve_kwargs):
+        await self.wait_for_shards()
+        async with websockets.serve(self.handler, host, port, **serve_kwargs):
+            print(f"Sharded server started on ws://{host or '0.0.0.0'}:{port} with {self.shard_count} shards")
+            await asyncio.Future()
+
+
+def run_sharded(args):
+    shard_count = args.shards or os.cpu_count() or 1
+    addresses = shard_addresses(shard_count)
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(
+            target=_run_shard,
+            args=(i, shard_count, address, args),
+            daemon=True
+        )
+        for i, address in enumerate(addresses)
+    ]
+    for worker in workers:
+        worker.start()
+
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        serve_kwargs = room_server.configure(args)
+        asyncio.run(ShardRouter(addresses).serve(args.host, args.port, **serve_kwargs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        for address in addresses:
+            if isinstance(address, str) and os.path.exists(address):
+                os.unlink(address)
+        if addresses and isinstance(addresses[0], str):
+            os.rmdir(os.path.dirname(addresses[0]))
@@ -0,0 +1,92 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RoomSnapshotStore:
+    """
+    SQLite-backed snapshot of room metadata for warm restarts.
+
+    Only metadata is stored (admin sid, resume keys, display names, the
+    last typed content and the room's last seq); sockets are never persisted. All writes run on a
+    single dedicated thread so the event loop only hands over a batch of
+    changed rooms and never waits on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="room-snapshot")
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS rooms (
+                    token TEXT PRIMARY KEY,
+                    admin_sid TEXT NOT NULL,
+                    admin_key TEXT NOT NULL,
+                    last_content TEXT NOT NULL DEFAULT '',
+                    seq INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS members (
+                    token TEXT NOT NULL,
+                    sid TEXT NOT NULL,
+                    resume_key TEXT NOT NULL,
+                    display_name TEXT NOT NULL DEFAULT '',
+                    PRIMARY KEY (token, sid)
+                );
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(rooms)")}
+            if "seq" not in columns:
+                # snapshots written before seq was persisted
+                self._conn.execute("ALTER TABLE rooms ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+        return self._conn
+
+    def write(self, changes):
+        """
+        Persist a batch of room changes.
+
+        changes maps token to None for a deleted room, or to a dict with
+        admin_sid, admin_key, last_content, seq and members {sid: (resume_key, display_name)}.
+        """
+        conn = self._connect()
+        with conn:
+            for token, room in changes.items():
+                conn.execute("DELETE FROM members WHERE token = ?", (token,))
+                if room is None:
+                    conn.execute("DELETE FROM rooms WHERE token = ?", (token,))
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO rooms (token, admin_sid, admin_key, last_content, seq) VALUES (?, ?, ?, ?, ?)",
+                    (token, room["admin_sid"], room["admin_key"], room["last_content"], room["seq"])
+                )
+                conn.executemany(
+                    "INSERT INTO members (token, sid, resume_key, display_name) VALUES (?, ?, ?, ?)",
+                    [(token, sid, key, name) for sid, (key, name) in room["members"].items()]
+                )
+
+    def load(self):
+        conn = self._connect()
+        snapshot = {}
+        for token, admin_sid, admin_key, last_content, seq in conn.execute(
+                "SELECT token, admin_sid, admin_key, last_content, seq FROM rooms"):
+            snapshot[token] = {
+                "admin_sid": admin_sid,
+                "admin_key": admin_key,
+                "last_content": last_content,
+                "seq": seq,
+                "members": {}
+            }
+        for token, sid, resume_key, display_name in conn.execute(
+                "SELECT token, sid, resume_key, display_name FROM members"):
+            if token in snapshot:
+                snapshot[token]["members"][sid] = (resume_key, display_name)
+        return snapshot
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
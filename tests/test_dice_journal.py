@@ -0,0 +1,50 @@
+import asyncio
+import os
+
+from core.database.tf_database import TFDatabase
+from core.database.tf_dice_journal import TFDiceJournal
+from server import server as room_server
+
+
+class FakeSocket:
+    async def send(self, frame):
+        pass
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+def roll(command, total):
+    return {"sid": "1", "name": "KP", "command": command, "info": "", "ts": 1.0,
+            "result": {"success": True, "type": "normal_roll", "formula": command, "results": [total], "total": total}}
+
+def test_rolls_after_a_warm_restart_are_journaled(tmp_path):
+    db_path = os.path.join(tmp_path, "journal.db")
+    journal = TFDiceJournal(TFDatabase(f"sqlite:///{db_path}", db_path))
+    snapshot_path = os.path.join(tmp_path, "rooms.db")
+
+    async def roll_in_room(command, total, join):
+        """ One server lifetime: restore from the snapshot, roll once, journal the frame and shut down """
+        async with room_server.room_snapshots(snapshot_path):
+            if join:
+                admin = FakeSocket()
+                room_server.open_sender(admin)
+                await room_server.process_message(admin, {"type": "join", "role": "admin", "token": "ROOM"})
+            message = {"type": "roll_result", "rolls": [roll(command, total)]}
+            room_server.broadcast_sequenced("ROOM", message)
+            journal.record("ROOM", message["rolls"], message["seq"])
+            for ws in list(room_server.senders):
+                room_server.close_sender(ws)
+        room_server.rooms.clear()
+        room_server.connections.clear()
+
+    try:
+        asyncio.run(roll_in_room("1d6", 4, join=True))
+        # the restored room keeps its token; its seq must not start over
+        asyncio.run(roll_in_room("1d8", 7, join=False))
+        rows = journal.query(room="ROOM")
+    finally:
+        journal.close()
+
+    assert sorted(row["command"] for row in rows) == ["1d6", "1d8"]
+    assert len({row["seq"] for row in rows}) == 2
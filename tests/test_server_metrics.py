@@ -0,0 +1,148 @@
+import asyncio
+import json
+import re
+
+import pytest
+import websockets
+
+from server import server as room_server
+
+
+def sample(name, **labels):
+    """ Value of one series in the exported metrics text, 0 when it is not there yet """
+    selector = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    series = f"{name}{{{selector}}}" if selector else name
+    match = re.search(rf"^{re.escape(series)} (\S+)$", room_server.metrics.expose(), re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+@pytest.fixture(autouse=True)
+def fresh_rooms():
+    room_server.rooms.clear()
+    room_server.connections.clear()
+    room_server.senders.clear()
+    yield
+    room_server.rooms.clear()
+    room_server.connections.clear()
+    room_server.senders.clear()
+
+
+async def serve():
+    server = await websockets.serve(room_server.handler, "127.0.0.1", 0)
+    return server, f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+async def join(url, role, token, name=""):
+    ws = await websockets.connect(url)
+    await ws.send(json.dumps({"type": "join", "role": role, "token": token, "display_name": name}))
+    joined = json.loads(await ws.recv())
+    assert joined["type"] == "joined"
+    return ws, joined
+
+async def settle(condition, timeout=2.0):
+    """ Wait for the server side of a close to run """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_connect_and_send_counts_messages_frames_and_broadcasts():
+    async def scenario():
+        server, url = await serve()
+        joins = sample("tf_messages_received_total", type="join")
+        results = sample("tf_messages_received_total", type="dice_result")
+        frames = sample("tf_frames_enqueued_total")
+        broadcasts = sample("tf_broadcast_recipients_count")
+        single = sample("tf_broadcast_recipients_bucket", le="1")
+        timed = sample("tf_broadcast_seconds_count")
+
+        admin, _ = await join(url, "admin", "ROOM")
+        player, _ = await join(url, "player", "ROOM", "pl")
+        assert json.loads(await admin.recv())["type"] == "user_joined"
+        assert sample("tf_connections") == 2
+        assert sample("tf_rooms") == 1
+
+        await player.send(json.dumps({"type": "dice_result", "token": "ROOM", "dice_text": "1d6=4"}))
+        assert json.loads(await admin.recv())["dice_text"] == "1d6=4"
+        assert json.loads(await player.recv())["dice_text"] == "1d6=4"
+
+        assert sample("tf_messages_received_total", type="join") == joins + 2
+        assert sample("tf_messages_received_total", type="dice_result") == results + 1
+        # two joined replies, user_joined to the KP, and the dice_result to both
+        assert sample("tf_frames_enqueued_total") == frames + 5
+        assert sample("tf_broadcast_recipients_count") == broadcasts + 1
+        assert sample("tf_broadcast_recipients_bucket", le="1") == single + 1
+        assert sample("tf_broadcast_seconds_count") == timed + 1
+
+        await player.close()
+        await admin.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+
+def test_drop_and_resume_are_counted():
+    async def scenario():
+        server, url = await serve()
+        disconnects = sample("tf_disconnects_total")
+        resumes = sample("tf_resumes_total", role="player")
+        replayed = sample("tf_replayed_frames_total")
+
+        admin, _ = await join(url, "admin", "ROOM")
+        player, joined = await join(url, "player", "ROOM", "pl")
+        await admin.recv()
+
+        # an unclean drop keeps the seat
+        player.transport.abort()
+        await settle(lambda: len(room_server.connections) == 1)
+        assert sample("tf_disconnects_total") == disconnects + 1
+        assert sample("tf_connections") == 1
+
+        await admin.send(json.dumps({"type": "dice_result", "token": "ROOM", "dice_text": "missed"}))
+        await admin.recv()
+
+        player = await websockets.connect(url)
+        await player.send(json.dumps({"type": "join", "role": "player", "token": "ROOM", "sid": joined["sid"],
+                                      "resume_key": joined["resume_key"], "last_seq": 0}))
+        assert json.loads(await player.recv())["resumed"] is True
+        assert json.loads(await player.recv())["type"] == "replay"
+        assert json.loads(await player.recv())["dice_text"] == "missed"
+        assert sample("tf_resumes_total", role="player") == resumes + 1
+        assert sample("tf_replayed_frames_total") == replayed + 1
+
+        await player.close()
+        await admin.close()
+        await settle(lambda: not room_server.connections)
+        assert sample("tf_disconnects_total") == disconnects + 3
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
+
+def test_rate_limited_messages_are_counted_by_type():
+    async def scenario():
+        server, url = await serve()
+        limited = sample("tf_rate_limited_total", type="name_update")
+        _, burst = room_server.RATE_LIMITS["name_update"]
+
+        admin, _ = await join(url, "admin", "ROOM")
+        player, _ = await join(url, "player", "ROOM", "pl")
+        await admin.recv()
+
+        extra = 3
+        for i in range(int(burst) + extra):
+            await player.send(json.dumps({"type": "name_update", "token": "ROOM", "new_name": f"pl{i}"}))
+        # a message behind the flood shows the server has read all of it
+        await player.send(json.dumps({"type": "dice_result", "token": "ROOM", "dice_text": "done"}))
+        while json.loads(await player.recv()).get("dice_text") != "done":
+            pass
+        # the bucket may refill by one while the flood is read
+        assert extra - 1 <= sample("tf_rate_limited_total", type="name_update") - limited <= extra
+
+        await player.close()
+        await admin.close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
@@ -0,0 +1,17 @@
+from implements.coc_components.data_type import Damage
+
+
+def test_half_db_weapons_get_half_the_damage_bonus():
+    damage = Damage("1D6+halfDB")
+    assert damage.db_modifier == 0.5
+    assert damage.standard_text == "1D6+1/2DB"
+
+
+def test_full_db_weapons_get_the_whole_damage_bonus():
+    damage = Damage("1D4+DB")
+    assert damage.db_modifier == 1.0
+    assert damage.standard_text == "1D4+DB"
+
+
+def test_ranged_weapons_get_no_damage_bonus():
+    assert Damage("1D10/5 yards").db_modifier == 0
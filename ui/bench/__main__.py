@@ -0,0 +1,5 @@
+import sys
+
+from ui.bench.log_view import main
+
+sys.exit(main())
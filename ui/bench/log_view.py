@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from PyQt6.QtWidgets import QApplication, QTextEdit
+
+from implements.coc_components.roll_text import format_roll_text
+from ui.components.tf_log_view import TFLogView
+
+
+def sample_roll(index):
+    return {
+        "sid": "2",
+        "name": "KP",
+        "command": f".r 3d6+{index % 10}",
+        "info": "bench",
+        "ts": 1700000000 + index,
+        "result": {"success": True, "type": "normal_roll", "formula": f"3d6+{index % 10}",
+                   "results": [3, 4, 5], "total": 12 + index % 10}
+    }
+
+def legacy_append(text_edit, text):
+    """ What KPFrame._add_dice_result used to do """
+    current_text = text_edit.toHtml()
+    text_edit.setHtml(text + "<br><br>" + (current_text if current_text else ""))
+
+def measure(append, widget, count, bucket):
+    """ Mean per-append time in ms for each consecutive bucket of appends """
+    means = []
+    started = time.perf_counter()
+    for index in range(count):
+        append(widget, format_roll_text(sample_roll(index)))
+        if (index + 1) % bucket == 0:
+            now = time.perf_counter()
+            means.append((now - started) / bucket * 1000)
+            started = now
+    return means
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Per-append cost of the dice log view")
+    parser.add_argument("--rolls", type=int, default=10000)
+    parser.add_argument("--bucket", type=int, default=1000, help="appends per reported mean")
+    parser.add_argument("--max-entries", type=int, default=500)
+    parser.add_argument("--legacy-rolls", type=int, default=2000,
+                        help="rolls for the old toHtml/setHtml path, which grows quadratically (0 = skip)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        view = TFLogView(max_entries=args.max_entries, spill_path=os.path.join(spill_dir, "spill.log"))
+        view.resize(400, 250)
+        log_view = measure(TFLogView.add_entry, view, args.rolls, args.bucket)
+        started = time.perf_counter()
+        hits = len(view.search("3d6+7", limit=args.rolls))
+        search_ms = (time.perf_counter() - started) * 1000
+        view.close_spill()
+
+    report = {
+        "rolls": args.rolls,
+        "max_entries": args.max_entries,
+        "log_view_ms_per_append": [round(ms, 4) for ms in log_view],
+        "search_ms": round(search_ms, 2),
+        "search_hits": hits
+    }
+    if args.legacy_rolls:
+        legacy = QTextEdit()
+        legacy.resize(400, 250)
+        report["legacy_rolls"] = args.legacy_rolls
+        report["legacy_ms_per_append"] = [
+            round(ms, 4) for ms in measure(legacy_append, legacy, args.legacy_rolls, min(args.bucket, args.legacy_rolls))
+        ]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"TFLogView, {args.rolls} rolls, max {args.max_entries} entries, ms per append per {args.bucket}:")
+        print("  " + "  ".join(f"{ms:.3f}" for ms in report["log_view_ms_per_append"]))
+        print(f"search over spilled + retained entries: {hits} hits in {report['search_ms']} ms")
+        if args.legacy_rolls:
+            print(f"old toHtml/setHtml path, {args.legacy_rolls} rolls, ms per append:")
+            print("  " + "  ".join(f"{ms:.3f}" for ms in report["legacy_ms_per_append"]))
+    app.quit()
+    return 0
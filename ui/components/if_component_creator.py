@@ -9,6 +9,7 @@ from ui.components.tf_button_entry import TFButtonEntry
 from ui.components.tf_check_with_label import TFCheckWithLabel
 from ui.components.tf_date_entry import TFDateEntry
 from ui.components.tf_label_entry import TFLabelWithTip
+from ui.components.tf_log_view import TFLogView
 from ui.components.tf_number_receiver import TFNumberReceiver
 from ui.components.tf_option_entry import TFOptionEntry
 from ui.components.tf_radio_group import TFRadioGroup
@@ -408,6 +409,31 @@ class IComponentCreator:
         
         self._register_component(name, text_edit)
         return text_edit
+
+    def create_log_view(
+            self,
+            name: str,
+            width: int = 100,
+            height: int = 72,
+            placeholder_text: str = "",
+            max_entries: int = 500,
+            spill_path: Optional[str] = None,
+            scroll_policy: Optional[tuple[Qt.ScrollBarPolicy, Qt.ScrollBarPolicy]] = None
+    ) -> TFLogView:
+        log_view = TFLogView(max_entries=max_entries, spill_path=spill_path, parent=self)
+        log_view.setFont(NotoSerifLight)
+        log_view.setFixedWidth(width)
+        log_view.setFixedHeight(height)
+
+        if placeholder_text:
+            log_view.setPlaceholderText(placeholder_text)
+
+        if scroll_policy:
+            log_view.setHorizontalScrollBarPolicy(scroll_policy[0])
+            log_view.setVerticalScrollBarPolicy(scroll_policy[1])
+
+        self._register_component(name, log_view)
+        return log_view
     
     def create_label_with_tip(
             self,
@@ -0,0 +1,148 @@
+import itertools
+import os
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from PyQt6.QtGui import QTextBlockFormat, QTextCursor, QTextDocumentFragment
+from PyQt6.QtWidgets import QInputDialog, QTextEdit
+
+from utils.helper import app_path
+
+
+class TFLogView(QTextEdit):
+    """
+    A read-only rich text log with the newest entry at the top.
+
+    Entries are inserted at the start of the document through a cursor, so
+    adding one costs the same no matter how long the session is. At most
+    max_entries stay in the widget; older ones are removed from the bottom
+    and appended as plain text lines to spill_path, where search() and the
+    context menu's search action can still find them.
+
+    Args:
+        max_entries (int): Entries kept in the widget before eviction.
+        spill_path (str, optional): File that receives evicted entries.
+            Created on the first eviction; without it evicted entries are
+            dropped.
+        entry_spacing (int): Pixels between entries.
+    """
+
+    _spill_counter = itertools.count(1)
+
+    def __init__(self, max_entries: int = 500, spill_path: Optional[str] = None, entry_spacing: int = 12, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.max_entries = max_entries
+        self.spill_path = spill_path
+        self._spill_file = None
+        # (blocks spanned, plain text) per entry, newest first
+        self._entries = deque()
+        self._entry_format = QTextBlockFormat()
+        self._entry_format.setBottomMargin(entry_spacing)
+
+    @staticmethod
+    def default_spill_path(prefix: str, log_dir: str = "logs") -> str:
+        """ A file name unique to this process and view, e.g. logs/kp_dice_20250101_120000_1234_1.log under the app directory """
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return os.path.join(app_path(log_dir), f"{prefix}_{stamp}_{os.getpid()}_{next(TFLogView._spill_counter)}.log")
+
+    def add_entry(self, html: str) -> None:
+        document = self.document()
+        blocks_before = document.blockCount() if self._entries else 0
+
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        if self._entries:
+            cursor.insertBlock()
+            cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.insertHtml(html)
+        span = document.blockCount() - blocks_before
+        QTextCursor(document.findBlockByNumber(span - 1)).mergeBlockFormat(self._entry_format)
+        cursor.endEditBlock()
+
+        self._entries.appendleft((span, self._plain_text(html)))
+        while len(self._entries) > self.max_entries:
+            self._evict_oldest()
+
+        self.verticalScrollBar().setValue(0)
+
+    def set_max_entries(self, max_entries: int) -> None:
+        self.max_entries = max(1, max_entries)
+        while len(self._entries) > self.max_entries:
+            self._evict_oldest()
+
+    def entry_count(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        for _, text in reversed(self._entries):
+            self._spill(text)
+        self._entries.clear()
+        super().clear()
+
+    def _evict_oldest(self) -> None:
+        span, text = self._entries.pop()
+        document = self.document()
+        first_block = document.findBlockByNumber(document.blockCount() - span)
+
+        cursor = QTextCursor(document)
+        # start at the end of the previous entry so its block separator goes too
+        cursor.setPosition(first_block.position() - 1)
+        cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        self._spill(text)
+
+    def _spill(self, text: str) -> None:
+        if not self.spill_path:
+            return
+        if self._spill_file is None:
+            folder = os.path.dirname(self.spill_path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+        self._spill_file.write(text + "\n")
+
+    @staticmethod
+    def _plain_text(html: str) -> str:
+        text = QTextDocumentFragment.fromHtml(html).toPlainText()
+        return " / ".join(line for line in text.splitlines() if line.strip())
+
+    def search(self, query: str, limit: int = 100) -> List[str]:
+        """ Entries containing query, case-insensitive, newest first; spilled entries included """
+        query = query.lower()
+        matches = [text for _, text in self._entries if query in text.lower()][:limit]
+        if len(matches) >= limit or not self.spill_path or not os.path.exists(self.spill_path):
+            return matches
+
+        if self._spill_file:
+            self._spill_file.flush()
+        with open(self.spill_path, "r", encoding="utf-8") as f:
+            spilled = [line.rstrip("\n") for line in f if query in line.lower()]
+        matches.extend(reversed(spilled[-(limit - len(matches)):]))
+        return matches
+
+    def close_spill(self) -> None:
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def contextMenuEvent(self, event):
+        menu = self.createStandardContextMenu()
+        menu.addSeparator()
+        menu.addAction("搜索记录...", self._on_search)
+        menu.exec(event.globalPos())
+
+    def _on_search(self):
+        # imported here: the dialog pulls in IComponentCreator, which creates this view
+        from ui.components.tf_text_display_dialog import TextDisplayDialog
+
+        query, ok = QInputDialog.getText(self, "搜索记录", "关键字：")
+        query = query.strip()
+        if not ok or not query:
+            return
+        results = self.search(query)
+        TextDisplayDialog.show_text("搜索记录", {
+            "title": f"“{query}”的搜索结果：{len(results)}条",
+            "paragraphs": results or ["没有找到匹配的记录"]
+        }, self)
@@ -0,0 +1,5 @@
+import sys
+
+from utils.bench.dice import main
+
+sys.exit(main())
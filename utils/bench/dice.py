@@ -0,0 +1,108 @@
+import argparse
+import random
+import re
+import time
+import timeit
+
+from utils.tf_dice import TFDice
+from utils.tf_dice_distribution import distribution_of
+from utils.tf_dice_expression import TFDiceExpression
+
+FORMULAS = ["1d100", "3d6", "2d6+3", "1d20+1d4-1", "4d6+2d8+10"]
+EXTENDED_FORMULAS = ["4d6kh3", "3d6!", "(1d6+1)*2", "2d20kl1+5"]
+BATCH_FORMULAS = ["3d6*5", "100d6", "4d6kh3", "3d6!", "(2d6+6)*5"]
+ODDS_FORMULAS = ["2d6+1d4+3", "4d6kh3", "1d6!", "10d10kh3", "100d6", "1000d100", "100d6kh50"]
+
+
+def legacy_roll(dice_str):
+    """ TFDice.roll before the expression compiler, kept for comparison """
+    default_res = (False, dice_str, [], 0)
+    if not dice_str or not dice_str.strip():
+        return default_res
+
+    parts = re.findall(r'([+-]?\s*\d*d\d+|[+-]?\s*\d+)', dice_str)
+    if not parts:
+        return default_res
+
+    formatted_parts = []
+    results = []
+    total = 0
+    for part in parts:
+        part = part.strip()
+        if part.lstrip('+-').isdigit():
+            total += int(part)
+            formatted_parts.append(part)
+            continue
+
+        match = re.match(r'([+-]?\s*)?(\d*)[dD](\d+)', part)
+        if not match:
+            return default_res
+        sign = match.group(1) or ''
+        faces = int(match.group(3))
+        if faces not in TFDice.VALID_FACES:
+            return default_res
+        count = int(match.group(2)) if match.group(2) else 1
+
+        rolls_now = [random.randint(1, faces) for _ in range(count)]
+        results.extend(rolls_now)
+        total += -sum(rolls_now) if sign.strip() == '-' else sum(rolls_now)
+        formatted_parts.append(f"{sign}{count}d{faces}" if sign else f"{count}d{faces}")
+
+    formatted_str = formatted_parts[0]
+    for part in formatted_parts[1:]:
+        formatted_str += part if part[0] in '+-' else f"+{part}"
+    return True, formatted_str, results, total
+
+def rate(func, number, repeat):
+    """ Best-of-repeat calls per second """
+    return number / min(timeit.repeat(func, number=number, repeat=repeat))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Dice formula parse-and-roll throughput")
+    parser.add_argument("--number", type=int, default=20000, help="rolls per timing run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-odds", dest="odds", action="store_false", help="skip the exact distribution timings")
+    parser.add_argument("--batch", type=int, default=100000, help="evaluations for the roll_many comparison (0 = skip)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    compile_uncached = TFDiceExpression._compile_normalized.__wrapped__
+
+    print(f"{'formula':<14}{'legacy regex':>14}{'TFDice.roll':>14}{'compiled':>14}{'parse only':>14}   (calls/s)")
+    for formula in FORMULAS + EXTENDED_FORMULAS:
+        expression = TFDiceExpression.compile(formula)
+        normalized = TFDiceExpression.normalize(formula)
+        legacy = rate(lambda: legacy_roll(formula), args.number, args.repeat) if formula in FORMULAS else None
+        cached = rate(lambda: TFDice.roll(formula), args.number, args.repeat)
+        compiled = rate(expression.roll, args.number, args.repeat)
+        parse = rate(lambda: compile_uncached(normalized), args.number, args.repeat)
+        legacy_text = f"{legacy:>14,.0f}" if legacy else f"{'n/a':>14}"
+        print(f"{formula:<14}{legacy_text}{cached:>14,.0f}{compiled:>14,.0f}{parse:>14,.0f}")
+
+    if args.batch:
+        print(f"\n{args.batch:,} evaluations")
+        print(f"{'formula':<14}{'roll() loop':>14}{'roll_many':>14}{'speedup':>10}{'mean loop':>12}{'mean batch':>12}")
+        for formula in BATCH_FORMULAS:
+            expression = TFDiceExpression.compile(formula)
+            started = time.perf_counter()
+            loop_totals = [expression.roll().total for _ in range(args.batch)]
+            loop_time = time.perf_counter() - started
+            batch_time = min(timeit.repeat(lambda: expression.roll_many(args.batch, rng=1), number=1, repeat=args.repeat))
+            batch_totals = expression.roll_many(args.batch, rng=1).totals
+            print(f"{formula:<14}{loop_time * 1000:>12.1f}ms{batch_time * 1000:>12.1f}ms{loop_time / batch_time:>9.0f}x"
+                  f"{sum(loop_totals) / args.batch:>12.2f}{batch_totals.mean():>12.2f}")
+
+    if args.odds:
+        print(f"\n{'formula':<14}{'build':>12}{'at_least':>12}{'percentile':>12}{'mean':>12}{'std':>10}")
+        for formula in ODDS_FORMULAS:
+            node = TFDiceExpression.compile(formula).node
+            started = time.perf_counter()
+            dist = distribution_of(node)
+            build = time.perf_counter() - started
+            target = round(dist.mean)
+            at_least = min(timeit.repeat(lambda: dist.at_least(target), number=args.number, repeat=args.repeat)) / args.number
+            percentile = min(timeit.repeat(lambda: dist.percentile(90), number=args.number, repeat=args.repeat)) / args.number
+            print(f"{formula:<14}{build * 1000:>10.2f}ms{at_least * 1e6:>10.2f}us{percentile * 1e6:>10.2f}us"
+                  f"{dist.mean:>12.2f}{dist.std:>10.2f}")
+    return 0
@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from implements.coc_components.simulator import CheckSampler, simulate
+
+TARGET_CHECKS_PER_SECOND = 10_000_000
+CHECKS = [(50, 0), (65, 1), (30, -2), (80, 3)]
+CHASE = {
+    "type": "chase",
+    "checks": [{"skill": 50}, {"skill": 40, "bonus": 1}, {"skill": 60}, {"skill": 35, "bonus": -1}] * 5,
+    "failures_allowed": 4
+}
+COMBAT = {
+    "type": "combat",
+    "max_rounds": 10,
+    "investigator": {"name": "调查员", "hp": 12, "skill": 55, "damage": "1D10+DB", "damage_bonus": "1d4", "dodge": 40},
+    "opponent": {"name": "邪教徒", "hp": 14, "skill": 45, "damage": "1D8+1D4+DB", "damage_bonus": "1d4", "penetration": True}
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo simulator throughput")
+    parser.add_argument("--checks", type=int, default=10_000_000, help="checks per raw sampling run")
+    parser.add_argument("--trials", type=int, default=1_000_000, help="trials per scenario run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args(argv)
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sampler = CheckSampler()
+    rng = np.random.default_rng(0)
+
+    print(f"{'skill':>6}{'bonus':>7}{'checks/s':>16}   (target {TARGET_CHECKS_PER_SECOND:,})")
+    for skill, advantage in CHECKS:
+        elapsed = best_time(lambda: sampler.check(skill, advantage, args.checks, rng), args.repeat)
+        print(f"{skill:>6}{advantage:>7}{args.checks / elapsed:>16,.0f}")
+
+    chase_checks = args.trials * len(CHASE["checks"])
+    print(f"\n{'scenario':<10}{'workers':>8}{'trials/s':>14}{'checks/s':>16}")
+    for workers in sorted({1, args.workers}):
+        chunk_size = max(1, args.trials // (4 * workers))
+        elapsed = best_time(lambda: simulate(CHASE, args.trials, seed=1, workers=workers, chunk_size=chunk_size), args.repeat)
+        print(f"{'chase':<10}{workers:>8}{args.trials / elapsed:>14,.0f}{chase_checks / elapsed:>16,.0f}")
+        elapsed = best_time(lambda: simulate(COMBAT, args.trials, seed=1, workers=workers, chunk_size=chunk_size), args.repeat)
+        print(f"{'combat':<10}{workers:>8}{args.trials / elapsed:>14,.0f}{'':>16}")
+
+    report = simulate(COMBAT, args.trials, seed=1, workers=args.workers)
+    print(f"\ncombat: investigator {report['investigator_wins']:.2%}, opponent {report['opponent_wins']:.2%}, "
+          f"unresolved {report['unresolved']:.2%}, mean rounds {report['rounds']['mean']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+import time
+import timeit
+
+from implements.coc_components.data_reader import GameDataRepository, _parse_weapon_types
+from utils.helper import resource_path
+
+
+def weapon_details(weapon_type):
+    """ The rows WeaponTypeEntry shows for one weapon """
+    return [
+        ("名称", weapon_type.name),
+        ("类型", weapon_type.category.value),
+        ("技能", weapon_type.skill.standard_text),
+        ("伤害", weapon_type.damage.standard_text),
+        ("射程", weapon_type.range.standard_text),
+        ("穿透", weapon_type.penetration.value),
+        ("射速", weapon_type.rate_of_fire),
+        ("弹药", weapon_type.ammo if weapon_type.ammo else "N/A"),
+        ("故障值", weapon_type.malfunction if weapon_type.malfunction else "N/A")
+    ]
+
+def render_list(weapon_types):
+    return [weapon_details(weapon_type) for weapon_type in weapon_types]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cost of rendering the full weapon type list")
+    parser.add_argument("--number", type=int, default=200, help="renders per timing run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--qt", action="store_true", help="also build WeaponTypeListDialog offscreen")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(resource_path("implements/coc_data/weapon_types.json"), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    weapon_types = GameDataRepository.instance().weapon_types()
+
+    parse = min(timeit.repeat(lambda: _parse_weapon_types(data), number=args.number, repeat=args.repeat)) / args.number
+    render = min(timeit.repeat(lambda: render_list(weapon_types), number=args.number, repeat=args.repeat)) / args.number
+    print(f"{len(weapon_types)} weapon types")
+    print(f"{'parse list':<14}{parse * 1000:>10.3f} ms")
+    print(f"{'render list':<14}{render * 1000:>10.3f} ms   ({render / len(weapon_types) * 1e6:.2f} us per weapon)")
+
+    if args.qt:
+        from PyQt6.QtWidgets import QApplication
+        from implements.coc_components.phase3 import WeaponTypeListDialog
+
+        _ = QApplication.instance() or QApplication(sys.argv[:1])
+        started = time.perf_counter()
+        dialog = WeaponTypeListDialog(weapon_types=weapon_types)
+        print(f"{'dialog build':<14}{(time.perf_counter() - started) * 1000:>10.1f} ms")
+        dialog.deleteLater()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,15 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def app_path(relative_path):
+    # writable files (caches, logs) live next to the app, whatever the working directory;
+    # a frozen build writes beside the executable, not into the _MEIPASS bundle
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, relative_path)
+
 def format_datetime(datetime_str, 
                    show_time=False,
                    show_timezone=False,
@@ -0,0 +1,204 @@
+import os
+import threading
+from functools import lru_cache
+from typing import Dict
+
+import numpy as np
+
+from utils.helper import app_path
+from utils.tf_dice import CheckResult, TFDice
+
+
+class TFCocOdds:
+    """
+    Exact odds for TFDice.skill_check and TFDice.versus_check.
+
+    Two tables cover every skill 1-100, bonus/penalty dice -3..+3 and
+    rule_type 1-4:
+        levels[rule, advantage, skill, level]    P(each CheckResult)
+        versus[strict, rule, adv1, skill1, adv2, skill2]    P(side 1 wins)
+    They are computed once (well under a second), saved as .npy files in
+    cache_dir (relative paths are taken from the app directory) and
+    memory-mapped from then on, so a lookup is one array
+    index and the tables are shared by every process that opens them.
+
+    The d100 law is exact: with k = 1 + |advantage| tens dice and one ones
+    die, the kept result is the min (bonus) or max (penalty) of k values
+    drawn from the ten the ones die allows, where 00 + 0 reads 100.
+    Success levels come from TFDice._check_result itself, and versus ties
+    are broken exactly as versus_check breaks them.
+    """
+
+    VERSION = 1
+    SKILLS = 100
+    MAX_ADVANTAGE = TFDice.MAX_ADVANTAGE
+    RULE_TYPES = 4
+    LEVELS = list(CheckResult)
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, cache_dir: str = "cache"):
+        self.cache_dir = app_path(cache_dir)
+        self._levels = None
+        self._versus = None
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> 'TFCocOdds':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = TFCocOdds()
+            return cls._instance
+
+    def level_probabilities(self, skill: int, advantage: int = 0, rule_type: int = 1) -> Dict[CheckResult, float]:
+        row = self.levels[self._rule_index(rule_type), self._advantage_index(advantage), self._skill_index(skill)]
+        return {level: float(p) for level, p in zip(self.LEVELS, row)}
+
+    def success_chance(self, skill: int, advantage: int = 0, rule_type: int = 1) -> float:
+        """ P(SUCCESS or better) """
+        row = self.levels[self._rule_index(rule_type), self._advantage_index(advantage), self._skill_index(skill)]
+        return float(row[self.LEVELS.index(CheckResult.SUCCESS):].sum())
+
+    def versus_win_chance(
+        self,
+        skill1: int,
+        skill2: int,
+        advantage_dice1: int = 0,
+        advantage_dice2: int = 0,
+        higher_level_required: bool = False,
+        rule_type: int = 1
+    ) -> float:
+        """ P(skill1_wins) for TFDice.versus_check with the same arguments """
+        return float(self.versus[
+            int(bool(higher_level_required)), self._rule_index(rule_type),
+            self._advantage_index(advantage_dice1), self._skill_index(skill1),
+            self._advantage_index(advantage_dice2), self._skill_index(skill2)
+        ])
+
+    @property
+    def levels(self) -> np.ndarray:
+        if self._levels is None:
+            self._load()
+        return self._levels
+
+    @property
+    def versus(self) -> np.ndarray:
+        if self._versus is None:
+            self._load()
+        return self._versus
+
+    def _skill_index(self, skill: int) -> int:
+        if not 1 <= skill <= self.SKILLS:
+            raise ValueError(f"skill must be between 1 and {self.SKILLS}, got {skill}")
+        return skill - 1
+
+    def _advantage_index(self, advantage: int) -> int:
+        if not -self.MAX_ADVANTAGE <= advantage <= self.MAX_ADVANTAGE:
+            raise ValueError(f"advantage dice must be between -{self.MAX_ADVANTAGE} and {self.MAX_ADVANTAGE}, got {advantage}")
+        return advantage + self.MAX_ADVANTAGE
+
+    @staticmethod
+    def _rule_index(rule_type: int) -> int:
+        # _check_result treats unknown rule types as rule 1
+        return rule_type - 1 if rule_type in (1, 2, 3, 4) else 0
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, f"coc_odds_v{self.VERSION}_{name}.npy")
+
+    def _load(self):
+        with self._load_lock:
+            if self._levels is not None:
+                return
+            levels_path, versus_path = self._path("levels"), self._path("versus")
+            try:
+                levels = np.load(levels_path, mmap_mode='r')
+                versus = np.load(versus_path, mmap_mode='r')
+                if levels.shape != self._levels_shape() or versus.shape != self._versus_shape():
+                    raise ValueError("stale odds cache")
+            except (OSError, ValueError):
+                levels, versus = self.build_tables()
+                try:
+                    self._save(levels_path, levels)
+                    self._save(versus_path, versus)
+                    levels = np.load(levels_path, mmap_mode='r')
+                    versus = np.load(versus_path, mmap_mode='r')
+                except OSError as e:
+                    # an unwritable cache_dir still works, the tables just stay in this process
+                    print(f"Error writing odds cache: {str(e)}")
+            self._versus = versus
+            self._levels = levels
+
+    def _save(self, path: str, table: np.ndarray):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, table)
+        os.replace(temp_path, path)
+
+    def _levels_shape(self):
+        return (self.RULE_TYPES, 2 * self.MAX_ADVANTAGE + 1, self.SKILLS, len(self.LEVELS))
+
+    def _versus_shape(self):
+        advantages = 2 * self.MAX_ADVANTAGE + 1
+        return (2, self.RULE_TYPES, advantages, self.SKILLS, advantages, self.SKILLS)
+
+    @classmethod
+    def d100_pmf(cls, advantage: int) -> np.ndarray:
+        """ pmf[v - 1] = P(_roll_coc_d100(advantage) returns v) for v in 1..100 """
+        tens_count = 1 + abs(advantage)
+        pmf = np.zeros(100)
+        for ones in range(10):
+            values = sorted(100 if tens == 0 and ones == 0 else tens * 10 + ones for tens in range(10))
+            for j, value in enumerate(values):
+                if advantage >= 0:
+                    # P(min of the tens_count draws is the j-th smallest)
+                    p = ((10 - j) / 10) ** tens_count - ((9 - j) / 10) ** tens_count
+                else:
+                    p = ((j + 1) / 10) ** tens_count - (j / 10) ** tens_count
+                pmf[value - 1] += p / 10
+        return pmf
+
+    @classmethod
+    @lru_cache(maxsize=1)
+    def check_levels(cls) -> np.ndarray:
+        """ levels[rule - 1, skill - 1, value - 1]: index into LEVELS of TFDice._check_result(skill, value, rule) """
+        level_index = {level: i for i, level in enumerate(cls.LEVELS)}
+        levels = np.array([[[level_index[TFDice._check_result(skill, value, rule)]
+                             for value in range(1, 101)]
+                            for skill in range(1, cls.SKILLS + 1)]
+                           for rule in range(1, cls.RULE_TYPES + 1)], dtype=np.int8)
+        levels.setflags(write=False)
+        return levels
+
+    @classmethod
+    def build_tables(cls):
+        advantages = range(-cls.MAX_ADVANTAGE, cls.MAX_ADVANTAGE + 1)
+        dice = np.array([cls.d100_pmf(a) for a in advantages])            # (A, V)
+        level_of = cls.check_levels()                                       # (R, S, V)
+        one_hot = np.eye(len(cls.LEVELS))[level_of]                        # (R, S, V, L)
+        levels = np.einsum('av,rsvl->rasl', dice, one_hot)                 # (R, A, S, L)
+
+        rules, n_adv, skills, n_levels = levels.shape
+        flat = levels.reshape(rules, n_adv * skills, n_levels)
+        below = np.tril(np.ones((n_levels, n_levels)), -1)                 # below[i, j] = j < i
+        strict = flat @ below @ flat.transpose(0, 2, 1)                    # P(level1 > level2)
+        same_level = flat @ flat.transpose(0, 2, 1)
+        strict = strict.reshape(rules, n_adv, skills, n_adv, skills)
+        same_level = same_level.reshape(rules, n_adv, skills, n_adv, skills)
+
+        skill_values = np.arange(1, skills + 1)
+        higher_skill = skill_values[:, None] > skill_values[None, :]       # (S1, S2)
+        lenient = strict + same_level * higher_skill[None, None, :, None, :]
+
+        # equal skills and levels: the lower d100 result wins
+        lower_first = np.triu(np.ones((100, 100), dtype=bool), 1)
+        for rule in range(rules):
+            for skill in range(skills):
+                row = level_of[rule, skill]
+                tie_win = lower_first & (row[:, None] == row[None, :])
+                lenient[rule, :, skill, :, skill] += dice @ tie_win @ dice.T
+
+        versus = np.stack([lenient, strict]).astype(np.float32)
+        return levels, versus
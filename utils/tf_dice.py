@@ -3,6 +3,9 @@ import random
 from enum import Enum
 from typing import Tuple, List
 
+from utils.tf_dice_distribution import TFDistribution
+from utils.tf_dice_expression import TFBatchRoll, TFDiceExpression, TFRollResult
+
 class CheckResult(Enum):
     CRITICAL_FAILURE = -2
     FAILURE = -1
@@ -12,72 +15,42 @@ class CheckResult(Enum):
     CRITICAL_SUCCESS = 3
 
 class TFDice:
-    VALID_FACES = {2, 3, 4, 6, 8, 10, 12, 20, 100}
+    VALID_FACES = TFDiceExpression.VALID_FACES
+    MAX_REPEAT = 100
+    # bonus/penalty dice per side of a check, as in the CoC rules
+    MAX_ADVANTAGE = 3
 
     @staticmethod
-    def roll(dice_str: str) -> Tuple[bool, str, List[int], int]:
-        default_res = (False, dice_str, [], 0)
-
+    def roll(dice_str: str) -> TFRollResult:
+        """ Roll a dice formula such as '2d6+3', '4d6kh3', '(1d6+1)*2' or '3d6!'; see TFDiceExpression """
         if not dice_str or not dice_str.strip():
-            return default_res
+            return TFRollResult(False, dice_str, [], 0)
 
         try:
-            pattern = r'([+-]?\s*\d*d\d+|[+-]?\s*\d+)'
-            parts = re.findall(pattern, dice_str)
-
-            if not parts:
-                return default_res
-
-            formatted_parts = []
-            results = []
-            total = 0
-
-            for part in parts:
-                part = part.strip()
-
-                if part.lstrip('+-').isdigit():
-                    number = int(part)
-                    total += number
-                    formatted_parts.append(part)
-                    continue
-
-                match = re.match(r'([+-]?\s*)?(\d*)[dD](\d+)', part)
-                if not match:
-                    return default_res
-
-                sign = match.group(1) or ''
-                count_str = match.group(2)
-                faces = int(match.group(3))
+            expression = TFDiceExpression.compile(dice_str)
+        except ValueError:
+            return TFRollResult(False, dice_str, [], 0)
+        return expression.roll()
 
-                if faces not in TFDice.VALID_FACES:
-                    return default_res
-
-                count = int(count_str) if count_str else 1
-
-                rolls_now = [random.randint(1, faces) for _ in range(count)]
-                results.extend(rolls_now)
-                roll_sum = sum(rolls_now)
-
-                if sign.strip() == '-':
-                    total -= roll_sum
-                else:
-                    total += roll_sum
-
-                formatted_part = f"{sign}{count}d{faces}" if sign else f"{count}d{faces}"
-                formatted_parts.append(formatted_part)
-
-            formatted_str = formatted_parts[0]
-            for part in formatted_parts[1:]:
-                if part.startswith('+') or part.startswith('-'):
-                    formatted_str += f"{part}"
-                else:
-                    formatted_str += f"+{part}"
+    @staticmethod
+    def roll_many(dice_str: str, n: int, rng=None) -> TFBatchRoll:
+        """
+        Roll a dice formula n times at once with NumPy.
 
-            return True, formatted_str, results, total
+        rng may be a numpy Generator or a seed for reproducible results.
+        Raises ValueError for formulas TFDiceExpression cannot parse.
+        """
+        return TFDiceExpression.compile(dice_str).roll_many(n, rng)
 
-        except (ValueError, TypeError) as e:
-            print(f"Error parsing dice string '{dice_str}': {e}")
-            return default_res
+    @staticmethod
+    def distribution(dice_str: str) -> TFDistribution:
+        """
+        Exact distribution of a dice formula's total: mean, variance,
+        percentiles and P(total >= k). Cached with the compiled formula.
+        Raises ValueError for formulas that do not parse or are too large
+        to compute exactly.
+        """
+        return TFDiceExpression.compile(dice_str).distribution()
 
     @staticmethod
     def _roll_coc_d100(advantage_dice: int = 0) -> Tuple[int, List[int]]:
@@ -190,6 +163,18 @@ class TFDice:
 
         return CheckResult.FAILURE
 
+    @staticmethod
+    def serializable_result(result: dict) -> dict:
+        """ Convert a command_entry result to plain JSON types (enums by name, tuples as lists) """
+        def convert(value):
+            if isinstance(value, CheckResult):
+                return value.name
+            if isinstance(value, (list, tuple)):
+                return [convert(v) for v in value]
+            return value
+
+        return {key: convert(value) for key, value in result.items()}
+
     @staticmethod
     def command_entry(cmd: str):
         cmd = cmd.strip()
@@ -200,6 +185,45 @@ class TFDice:
         command_main = parts[0].lower()
         command_args = parts[1].strip() if len(parts) > 1 else ""
 
+        if command_main == 'r' and '#' in command_args:
+            times_str, _, formula = command_args.partition('#')
+            # re.ASCII: str.isdigit() also accepts characters such as '²' that int() rejects
+            if not re.fullmatch(r'\s*\d+\s*', times_str, re.ASCII) or not 1 <= int(times_str) <= TFDice.MAX_REPEAT:
+                return {"success": False, "error": f"重复次数需为1到{TFDice.MAX_REPEAT}之间的整数，请使用: r <次数>#<公式>"}
+            try:
+                batch = TFDice.roll_many(formula, int(times_str))
+            except ValueError:
+                return {"success": False, "error": f"无法解析的掷骰公式: {formula.strip()}"}
+            return {
+                "success": True,
+                "type": "multi_roll",
+                "formula": batch.formula,
+                "totals": batch.totals.tolist()
+            }
+
+        if command_main == 'rp':
+            formula, _, target_str = command_args.partition('>=')
+            target_match = re.fullmatch(r'\s*(-?\d+)\s*', target_str, re.ASCII)
+            if target_str and not target_match:
+                return {"success": False, "error": "参数格式不正确，请使用: rp <公式> [>= 目标值]"}
+            target = int(target_match.group(1)) if target_match else None
+            try:
+                dist = TFDice.distribution(formula)
+            except ValueError:
+                return {"success": False, "error": f"无法计算该公式的概率: {formula.strip()}"}
+            return {
+                "success": True,
+                "type": "probability",
+                "formula": TFDiceExpression.compile(formula).formula,
+                "mean": round(dist.mean, 2),
+                "std": round(dist.std, 2),
+                "min": dist.min,
+                "max": dist.max,
+                "percentiles": [dist.percentile(q) for q in (5, 25, 50, 75, 95)],
+                "target": target,
+                "chance": None if target is None else dist.at_least(target)
+            }
+
         if command_main == 'r':
             ok, formula, results, total = TFDice.roll(command_args)
             return {
@@ -224,6 +248,8 @@ class TFDice:
             advantage_dice = 0
 
             if adv_type and adv_count:
+                if int(adv_count) > TFDice.MAX_ADVANTAGE:
+                    return {"success": False, "error": f"奖惩骰数量需为0到{TFDice.MAX_ADVANTAGE}"}
                 if adv_type.lower() == 'b':
                     advantage_dice = int(adv_count)
                 else:
@@ -261,6 +287,9 @@ class TFDice:
             skill1 = int(skill1_str)
             skill2 = int(skill2_str)
 
+            if any(count and int(count) > TFDice.MAX_ADVANTAGE for count in (adv_count1, adv_count2)):
+                return {"success": False, "error": f"奖惩骰数量需为0到{TFDice.MAX_ADVANTAGE}"}
+
             advantage_dice1 = 0
             advantage_dice2 = 0
 
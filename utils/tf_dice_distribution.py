@@ -0,0 +1,266 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class TFDistribution:
+    """
+    Exact probability distribution of an integer-valued dice formula.
+
+    pmf[i] is the probability that the total equals offset + i. Cumulative
+    sums are built once, so every query after construction is an index
+    lookup or a binary search. Totals whose probability underflows a double
+    (the far tails of large pools) are dropped, so min and max are the
+    extremes that still have a representable probability.
+    """
+
+    def __init__(self, offset: int, pmf: np.ndarray):
+        self.offset = offset
+        self.pmf = pmf
+        self._cdf = np.cumsum(pmf)
+        # summed from the top so small tail probabilities keep their precision
+        self._sf = np.cumsum(pmf[::-1])[::-1]
+        self.values = np.arange(offset, offset + len(pmf))
+        self.mean = float(np.dot(self.values, pmf))
+        self.variance = float(np.dot((self.values - self.mean) ** 2, pmf))
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    @property
+    def min(self) -> int:
+        return self.offset
+
+    @property
+    def max(self) -> int:
+        return self.offset + len(self.pmf) - 1
+
+    def probability(self, value: int) -> float:
+        """ P(total == value) """
+        index = value - self.offset
+        return float(self.pmf[index]) if 0 <= index < len(self.pmf) else 0.0
+
+    def at_least(self, value: int) -> float:
+        """ P(total >= value) """
+        index = value - self.offset
+        if index <= 0:
+            return 1.0
+        return float(self._sf[index]) if index < len(self.pmf) else 0.0
+
+    def at_most(self, value: int) -> float:
+        """ P(total <= value) """
+        index = value - self.offset
+        if index < 0:
+            return 0.0
+        return float(self._cdf[index]) if index < len(self.pmf) else 1.0
+
+    def percentile(self, q: float) -> int:
+        """ Smallest total whose cumulative probability reaches q (0-100) """
+        index = int(np.searchsorted(self._cdf, q / 100 - 1e-12))
+        return self.offset + min(index, len(self.pmf) - 1)
+
+    def __repr__(self):
+        return f"TFDistribution(min={self.min}, max={self.max}, mean={self.mean:.3f}, std={self.std:.3f})"
+
+
+MAX_KEEP_POOL = 100
+EXPLODE_EPSILON = 1e-15
+FFT_THRESHOLD = 256
+MAX_PRODUCT_PAIRS = 4_000_000
+# every pmf along the way, a single term or a partial sum, is at most this long
+MAX_OUTCOMES = 250_000
+# estimated work of a whole formula, roughly in nanoseconds; see _estimate
+MAX_COST = 500_000_000
+# only pmfs up to this length are kept in caches
+CACHE_OUTCOMES = 4096
+
+
+def _trim(offset: int, pmf: np.ndarray) -> Tuple[int, np.ndarray]:
+    nonzero = np.flatnonzero(pmf > 0)
+    return offset + int(nonzero[0]), pmf[nonzero[0]:nonzero[-1] + 1]
+
+def _convolve(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if min(len(a), len(b)) < FFT_THRESHOLD:
+        return np.convolve(a, b)
+    size = len(a) + len(b) - 1
+    result = np.fft.irfft(np.fft.rfft(a, size) * np.fft.rfft(b, size), size)
+    # FFT round-off leaves tiny negative values where the true probability is zero
+    result[result < 1e-300] = 0.0
+    return result / result.sum()
+
+def _add(left, right):
+    if len(left[1]) + len(right[1]) - 1 > MAX_OUTCOMES:
+        raise ValueError("too many outcomes to add exactly")
+    return left[0] + right[0], _convolve(left[1], right[1])
+
+def _negate(dist):
+    offset, pmf = dist
+    return -(offset + len(pmf) - 1), pmf[::-1].copy()
+
+def _multiply(left, right):
+    """ Product of two independent totals, by tabulating every pair of outcomes """
+    if len(left[1]) * len(right[1]) > MAX_PRODUCT_PAIRS:
+        raise ValueError("too many outcomes to multiply exactly")
+    values = np.multiply.outer(np.arange(left[0], left[0] + len(left[1])),
+                               np.arange(right[0], right[0] + len(right[1]))).ravel()
+    weights = np.multiply.outer(left[1], right[1]).ravel()
+    low = int(values.min())
+    return _trim(low, np.bincount(values - low, weights=weights))
+
+@lru_cache(maxsize=256)
+def _die(faces: int, explode: bool) -> Tuple[int, np.ndarray]:
+    """ PMF of one die; an exploding die keeps adding rolls until the chance of another is below EXPLODE_EPSILON """
+    if not explode:
+        return 1, np.full(faces, 1.0 / faces)
+
+    depth = 1
+    while (1.0 / faces) ** depth > EXPLODE_EPSILON:
+        depth += 1
+    pmf = np.zeros(depth * faces)
+    chance = 1.0
+    for level in range(depth):
+        # on this level every face but the highest ends the chain
+        pmf[level * faces:level * faces + faces - 1] = chance / faces
+        chance /= faces
+    pmf[depth * faces - 1] = chance
+    return 1, pmf
+
+def dice_pmf(count: int, faces: int, explode: bool = False, keep: Optional[Tuple[str, int]] = None) -> Tuple[int, np.ndarray]:
+    """ (offset, pmf) of one dice term; small terms are cached so repeated terms across formulas are free """
+    if keep is not None and explode:
+        raise ValueError("exact odds are not available for exploding dice with keep/drop")
+    if keep is not None and count > MAX_KEEP_POOL:
+        raise ValueError(f"exact keep/drop odds support at most {MAX_KEEP_POOL} dice")
+    outcomes, cost = _term_cost(count, faces, explode, keep)
+    if outcomes > MAX_OUTCOMES or cost > MAX_COST:
+        raise ValueError("too many outcomes for exact odds")
+    if outcomes <= CACHE_OUTCOMES:
+        return _cached_dice_pmf(count, faces, explode, keep)
+    return _dice_pmf(count, faces, explode, keep)
+
+@lru_cache(maxsize=256)
+def _cached_dice_pmf(count: int, faces: int, explode: bool, keep: Optional[Tuple[str, int]]) -> Tuple[int, np.ndarray]:
+    return _dice_pmf(count, faces, explode, keep)
+
+def _dice_pmf(count: int, faces: int, explode: bool, keep: Optional[Tuple[str, int]]) -> Tuple[int, np.ndarray]:
+    if keep is not None:
+        return _keep_pmf(count, faces, *keep)
+
+    offset, single = _die(faces, explode)
+    # binary powering: log2(count) convolutions instead of count
+    result = np.ones(1)
+    power = single
+    remaining = count
+    while remaining:
+        if remaining & 1:
+            result = _convolve(result, power)
+        remaining >>= 1
+        if remaining:
+            power = _convolve(power, power)
+    return offset * count, result
+
+def _keep_pmf(count: int, faces: int, mode: str, k: int) -> Tuple[int, np.ndarray]:
+    """
+    Sum of the k highest (kh) or lowest (kl) of count dice; dh/dl drop k,
+    which is keeping the other count - k.
+
+    Walks the faces from the kept end. dp[m] is the distribution of the kept
+    sum once m dice have been assigned to the faces seen so far; choosing c
+    of the remaining dice for the current face has weight C(rest, c) / faces^c
+    and keeps min(c, k - m) of them.
+    """
+    mode, k = _kept(count, mode, k)
+
+    size = k * faces + 1
+    dp = np.zeros((count + 1, size))
+    dp[0, 0] = 1.0
+    binomial = np.array([[_choose(n, c) for c in range(count + 1)] for n in range(count + 1)])
+    face_order = range(faces, 0, -1) if mode == 'kh' else range(1, faces + 1)
+    for face in face_order:
+        new = np.zeros_like(dp)
+        for m in range(count + 1):
+            row = dp[m]
+            if not row.any():
+                continue
+            rest = count - m
+            for c in range(rest + 1):
+                kept = max(0, min(c, k - m)) * face
+                weight = binomial[rest, c] / faces ** c
+                new[m + c, kept:] += row[:size - kept] * weight
+        dp = new
+    return _trim(0, dp[count])
+
+def _kept(count: int, mode: str, k: int) -> Tuple[str, int]:
+    """ dh/dl as the equivalent kl/kh, with k clamped to the pool """
+    if mode in ('dh', 'dl'):
+        mode, k = ('kl' if mode == 'dh' else 'kh'), count - k
+    return mode, max(0, min(k, count))
+
+def _choose(n: int, c: int) -> float:
+    if c > n:
+        return 0.0
+    result = 1.0
+    for i in range(c):
+        result = result * (n - i) / (i + 1)
+    return result
+
+# rough nanoseconds per unit of work, measured with NumPy on one core
+KEEP_STEP_COST = 2500
+CONVOLVE_COST = 64
+PRODUCT_COST = 20
+
+def _term_cost(count: int, faces: int, explode: bool, keep: Optional[Tuple[str, int]]) -> Tuple[int, float]:
+    """ (pmf length, estimated cost) of dice_pmf for one term, without computing it """
+    if keep is not None:
+        _, k = _kept(count, *keep)
+        # _keep_pmf: one row update of k * faces + 1 cells per (face, m, c)
+        steps = faces * (count + 1) * (count + 2) // 2
+        return k * faces + 1, steps * (KEEP_STEP_COST + k * faces + 1)
+    outcomes = count * (len(_die(faces, explode)[1]) - 1) + 1
+    return outcomes, outcomes * max(1, count.bit_length()) * CONVOLVE_COST
+
+def _estimate(node: tuple) -> Tuple[int, float]:
+    """ (upper bound on the pmf length, estimated cost) of _evaluate(node) """
+    kind = node[0]
+    if kind == 'const':
+        return 1, 0
+    if kind == 'dice':
+        return _term_cost(*node[1:])
+    if kind == 'neg':
+        return _estimate(node[1])
+    (left, left_cost), (right, right_cost) = _estimate(node[1]), _estimate(node[2])
+    if kind in ('add', 'sub'):
+        outcomes = left + right - 1
+        return outcomes, left_cost + right_cost + outcomes * CONVOLVE_COST
+    return min(left * right, MAX_PRODUCT_PAIRS), left_cost + right_cost + left * right * PRODUCT_COST
+
+def distribution_of(node: tuple) -> TFDistribution:
+    """
+    Exact distribution of a TFDiceExpression AST.
+
+    Raises ValueError up front, before any work, when the estimated cost of
+    the formula is above MAX_COST (about half a second), so a pathological
+    formula such as 100d100kh50 or 1000d100! fails fast instead of stalling
+    the caller.
+    """
+    _, cost = _estimate(node)
+    if cost > MAX_COST:
+        raise ValueError("formula too expensive for exact odds")
+    return TFDistribution(*_trim(*_evaluate(node)))
+
+def _evaluate(node: tuple) -> Tuple[int, np.ndarray]:
+    kind = node[0]
+    if kind == 'const':
+        return node[1], np.ones(1)
+    if kind == 'dice':
+        return dice_pmf(*node[1:])
+    if kind == 'neg':
+        return _negate(_evaluate(node[1]))
+    left, right = _evaluate(node[1]), _evaluate(node[2])
+    if kind == 'add':
+        return _add(left, right)
+    if kind == 'sub':
+        return _add(left, _negate(right))
+    return _multiply(left, right)
@@ -0,0 +1,346 @@
+import operator
+import re
+import random
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from utils.tf_dice_distribution import CACHE_OUTCOMES, TFDistribution, distribution_of
+
+
+class TFRollResult(NamedTuple):
+    success: bool
+    formula: str
+    results: List[int]
+    total: int
+
+
+class TFBatchRoll(NamedTuple):
+    formula: str
+    totals: np.ndarray
+    dice: List[np.ndarray]
+
+
+class TFDiceExpression:
+    """
+    A dice formula compiled once into a tree of closures.
+
+    Grammar, whitespace and case ignored:
+        expr   := term (('+' | '-') term)*
+        term   := unary ('*' unary)*
+        unary  := ('+' | '-') unary | atom
+        atom   := NUMBER | dice | '(' expr ')'
+        dice   := [COUNT] 'd' (FACES | '%') ['!'] [('kh' | 'k' | 'kl' | 'dh' | 'dl') N]
+
+    '!' explodes: every die showing its highest face adds another die, up
+    to MAX_EXPLOSIONS extra dice per term. kh/kl keep the N highest/lowest
+    dice of the term and dh/dl drop them; 'k' is short for 'kh'. Every die
+    rolled, kept or not, is reported in results, in rolling order.
+
+    dice_count is the number of dice named in the formula; max_dice adds the
+    full MAX_EXPLOSIONS budget of every exploding term, the most one roll()
+    can ever draw.
+
+    compile() caches expressions in an LRU keyed on the normalized formula,
+    so rolling the same formula again never touches the parser.
+
+    distribution() gives the exact odds of the total (see TFDistribution).
+
+    roll_many() evaluates the formula n times at once with NumPy: each dice
+    term draws an (n, count) matrix from a numpy Generator, so the cost is
+    a handful of array operations rather than n * count Python calls.
+    """
+
+    VALID_FACES = {2, 3, 4, 6, 8, 10, 12, 20, 100}
+    MAX_EXPLOSIONS = 100
+
+    _TOKEN_PATTERN = re.compile(r'\d+|kh|kl|dh|dl|[dk%!+\-*()]')
+    _WHITESPACE_PATTERN = re.compile(r'\s+')
+
+    def __init__(self, formula: str, node: tuple, dice_count: int):
+        self.formula = formula
+        self.node = node
+        self.dice_count = dice_count
+        # worst case for one roll: every exploding term uses its whole MAX_EXPLOSIONS budget
+        self.max_dice = dice_count + self.MAX_EXPLOSIONS * _exploding_terms(node)
+        self._evaluate = _compile_scalar(node)
+        self._evaluate_batch = None
+        self._distribution = None
+
+    @staticmethod
+    def normalize(formula: str) -> str:
+        return TFDiceExpression._WHITESPACE_PATTERN.sub('', formula).lower()
+
+    @staticmethod
+    def compile(formula: str) -> 'TFDiceExpression':
+        """ Compiled expression for formula; raises ValueError when it does not parse """
+        return TFDiceExpression._compile_normalized(TFDiceExpression.normalize(formula))
+
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _compile_normalized(formula: str) -> 'TFDiceExpression':
+        tokens = TFDiceExpression._tokenize(formula)
+        parser = _Parser(tokens)
+        node, text, dice_count = parser.parse_expr()
+        if parser.pos != len(tokens):
+            raise ValueError(f"unexpected '{tokens[parser.pos]}' in '{formula}'")
+        return TFDiceExpression(text, node, dice_count)
+
+    @staticmethod
+    def _tokenize(formula: str) -> List[str]:
+        tokens = TFDiceExpression._TOKEN_PATTERN.findall(formula)
+        if not tokens or sum(map(len, tokens)) != len(formula):
+            raise ValueError(f"invalid dice formula '{formula}'")
+        return tokens
+
+    def roll(self) -> TFRollResult:
+        results = []
+        total = self._evaluate(results)
+        return TFRollResult(True, self.formula, results, total)
+
+    def roll_many(self, n: int, rng: Union[np.random.Generator, int, None] = None) -> TFBatchRoll:
+        """
+        Evaluate the formula n times.
+
+        Args:
+            n (int): Number of evaluations.
+            rng: A numpy Generator, a seed, or None for fresh OS entropy.
+
+        Returns:
+            TFBatchRoll: totals has shape (n,). dice holds one (n, k) matrix
+            per dice term in formula order; exploding terms are padded with
+            zeros to their longest row.
+        """
+        if self._evaluate_batch is None:
+            self._evaluate_batch = _compile_batch(self.node)
+        if not isinstance(rng, np.random.Generator):
+            rng = np.random.default_rng(rng)
+        dice = []
+        totals = np.broadcast_to(self._evaluate_batch(rng, n, dice), (n,)).astype(np.int64)
+        return TFBatchRoll(self.formula, totals, dice)
+
+    def distribution(self) -> TFDistribution:
+        """
+        Exact distribution of the total, computed on first use. It is kept
+        with the compiled expression only when it has at most CACHE_OUTCOMES
+        values, so the compile LRU never pins megabytes of PMFs.
+        """
+        if self._distribution is not None:
+            return self._distribution
+        distribution = distribution_of(self.node)
+        if len(distribution.pmf) <= CACHE_OUTCOMES:
+            self._distribution = distribution
+        return distribution
+
+    def __repr__(self):
+        return f"TFDiceExpression({self.formula!r})"
+
+
+class _Parser:
+    """ Recursive descent over the token list; each rule returns (AST node, formatted text, dice count) """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self) -> str:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else ''
+
+    def _next(self) -> str:
+        token = self._peek()
+        if not token:
+            raise ValueError("unexpected end of dice formula")
+        self.pos += 1
+        return token
+
+    def _number(self) -> int:
+        token = self._next()
+        if not token.isdigit():
+            raise ValueError(f"expected a number, got '{token}'")
+        return int(token)
+
+    def parse_expr(self) -> Tuple[tuple, str, int]:
+        left, text, dice_count = self.parse_term()
+        while self._peek() in ('+', '-'):
+            op = self._next()
+            right, right_text, right_count = self.parse_term()
+            left = ('add' if op == '+' else 'sub', left, right)
+            text = f"{text}{op}{right_text}"
+            dice_count += right_count
+        return left, text, dice_count
+
+    def parse_term(self) -> Tuple[tuple, str, int]:
+        left, text, dice_count = self.parse_unary()
+        while self._peek() == '*':
+            self._next()
+            right, right_text, right_count = self.parse_unary()
+            left = ('mul', left, right)
+            text = f"{text}*{right_text}"
+            dice_count += right_count
+        return left, text, dice_count
+
+    def parse_unary(self) -> Tuple[tuple, str, int]:
+        if self._peek() in ('+', '-'):
+            op = self._next()
+            operand, text, dice_count = self.parse_unary()
+            if op == '+':
+                return operand, text, dice_count
+            return ('neg', operand), f"-{text}", dice_count
+        return self.parse_atom()
+
+    def parse_atom(self) -> Tuple[tuple, str, int]:
+        token = self._peek()
+        if token == '(':
+            self._next()
+            inner, text, dice_count = self.parse_expr()
+            if self._next() != ')':
+                raise ValueError("missing ')'")
+            return inner, f"({text})", dice_count
+
+        count = 1
+        if token.isdigit():
+            count = self._number()
+            if self._peek() != 'd':
+                return ('const', count), str(count), 0
+        if self._next() != 'd':
+            raise ValueError(f"unexpected '{token}'")
+        return self._parse_dice(count)
+
+    def _parse_dice(self, count: int) -> Tuple[tuple, str, int]:
+        if self._peek() == '%':
+            self._next()
+            faces = 100
+        else:
+            faces = self._number()
+        if faces not in TFDiceExpression.VALID_FACES:
+            raise ValueError(f"unsupported die d{faces}")
+        text = f"{count}d{faces}"
+
+        explode = self._peek() == '!'
+        if explode:
+            self._next()
+            text += '!'
+
+        keep = None
+        if self._peek() in ('k', 'kh', 'kl', 'dh', 'dl'):
+            mode = self._next()
+            mode = 'kh' if mode == 'k' else mode
+            keep = (mode, self._number())
+            text += f"{mode}{keep[1]}"
+
+        return ('dice', count, faces, explode, keep), text, count
+
+
+_OPERATORS = {'add': operator.add, 'sub': operator.sub, 'mul': operator.mul}
+
+
+def _exploding_terms(node: tuple) -> int:
+    kind = node[0]
+    if kind == 'const':
+        return 0
+    if kind == 'dice':
+        return int(node[3])
+    return sum(_exploding_terms(child) for child in node[1:])
+
+
+def _compile_scalar(node: tuple) -> Callable:
+    """ Closure taking the list that collects every die rolled and returning the total """
+    kind = node[0]
+    if kind == 'const':
+        value = node[1]
+        return lambda results: value
+    if kind == 'neg':
+        operand = _compile_scalar(node[1])
+        return lambda results: -operand(results)
+    if kind == 'dice':
+        return _scalar_dice(*node[1:])
+
+    left, right = _compile_scalar(node[1]), _compile_scalar(node[2])
+    if kind == 'add':
+        return lambda results: left(results) + right(results)
+    if kind == 'sub':
+        return lambda results: left(results) - right(results)
+    return lambda results: left(results) * right(results)
+
+def _scalar_dice(count: int, faces: int, explode: bool, keep: Optional[Tuple[str, int]]) -> Callable:
+    rand = random.random
+    rolls = range(count)
+
+    def roll_plain(results):
+        dice = [int(rand() * faces) + 1 for _ in rolls]
+        results.extend(dice)
+        return sum(dice)
+
+    if not explode and keep is None:
+        return roll_plain
+
+    def roll_dice(results):
+        dice = [int(rand() * faces) + 1 for _ in rolls]
+        if explode:
+            pending = dice.count(faces)
+            extra = 0
+            while pending and extra < TFDiceExpression.MAX_EXPLOSIONS:
+                value = int(rand() * faces) + 1
+                dice.append(value)
+                extra += 1
+                pending += (value == faces) - 1
+        results.extend(dice)
+        if keep is None:
+            return sum(dice)
+
+        mode, n = keep
+        ordered = sorted(dice, reverse=(mode in ('kh', 'dh')))
+        if mode[0] == 'k':
+            return sum(ordered[:n])
+        return sum(ordered[n:])
+
+    return roll_dice
+
+def _compile_batch(node: tuple) -> Callable:
+    """ Closure taking (rng, n, matrices) and returning an int64 array of n totals (or a scalar for constants) """
+    kind = node[0]
+    if kind == 'const':
+        value = node[1]
+        return lambda rng, n, matrices: value
+    if kind == 'neg':
+        operand = _compile_batch(node[1])
+        return lambda rng, n, matrices: -operand(rng, n, matrices)
+    if kind == 'dice':
+        return _batch_dice(*node[1:])
+
+    left, right = _compile_batch(node[1]), _compile_batch(node[2])
+    op = _OPERATORS[kind]
+    return lambda rng, n, matrices: op(left(rng, n, matrices), right(rng, n, matrices))
+
+def _batch_dice(count: int, faces: int, explode: bool, keep: Optional[Tuple[str, int]]) -> Callable:
+    def roll_dice(rng, n, matrices):
+        dice = rng.integers(1, faces, size=(n, count), endpoint=True, dtype=np.int64)
+        if explode:
+            # one extra column per round, drawn only for rows that still have dice to explode
+            pending = np.count_nonzero(dice == faces, axis=1)
+            columns = [dice]
+            for _ in range(TFDiceExpression.MAX_EXPLOSIONS):
+                rows = pending > 0
+                if not rows.any():
+                    break
+                column = np.zeros(n, dtype=np.int64)
+                column[rows] = rng.integers(1, faces, size=np.count_nonzero(rows), endpoint=True)
+                pending = pending - rows + (column == faces)
+                columns.append(column[:, None])
+            dice = np.hstack(columns)
+        matrices.append(dice)
+        if keep is None:
+            return dice.sum(axis=1)
+
+        mode, k = keep
+        if mode in ('kh', 'dh'):
+            # padding zeros sort to the low end and never reach the top k
+            top = np.sort(dice, axis=1)[:, ::-1][:, :k].sum(axis=1)
+            return top if mode == 'kh' else dice.sum(axis=1) - top
+        # push padding past the real faces so it never counts as a low die
+        ordered = np.sort(np.where(dice == 0, faces + 1, dice), axis=1)[:, :k]
+        low = np.where(ordered > faces, 0, ordered).sum(axis=1)
+        return low if mode == 'kl' else dice.sum(axis=1) - low
+
+    return roll_dice
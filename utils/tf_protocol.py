@@ -0,0 +1,246 @@
+import json
+from typing import Dict, Union
+
+
+class TFProtocol:
+    """
+    Wire codec shared by WebSocketClient and the room server.
+
+    Version 1 is plain JSON text frames. Version 2 packs each message into a
+    binary frame: one byte of message-type code followed by the fields of
+    that type in a fixed order, so keys are never sent. Strings are a varint
+    byte length plus UTF-8, 'i' fields are zigzag varints and 'j' fields
+    carry nested values as compact JSON. 'r' fields hold roll lists and
+    drop their keys as well: each roll becomes a JSON array in ROLL_KEYS
+    order with its result packed by RESULT_KEYS. 'm' fields carry a batch:
+    a varint count followed by each message as a length-prefixed binary
+    frame. Messages that do not fit their schema, by key or by value type
+    (a number where a string field is expected, say), fall back to code 0
+    with a JSON body, so nothing is lost.
+
+    The version is negotiated at join time: the join itself is always JSON
+    and carries "protocol"; the server echoes the accepted version in
+    "joined" and both sides switch afterwards.
+    """
+
+    JSON = 1
+    BINARY = 2
+
+    FALLBACK_CODE = 0
+
+    MESSAGE_TYPES = {
+        "join": 1,
+        "joined": 2,
+        "error": 3,
+        "user_joined": 4,
+        "user_left": 5,
+        "typing": 6,
+        "update": 7,
+        "name_update": 8,
+        "name_update_confirmed": 9,
+        "dice_result": 10,
+        "disconnect": 11,
+        "admin_close": 12,
+        "leave": 13,
+        "roll": 14,
+        "roll_result": 15,
+        "replay": 16,
+        "batch": 17,
+    }
+
+    FIELDS = {
+        "join": (("role", "s"), ("token", "s"), ("display_name", "s")),
+        "joined": (("sid", "s"),),
+        "error": (("message", "s"),),
+        "user_joined": (("sid", "s"), ("display_name", "s")),
+        "user_left": (("sid", "s"), ("display_name", "s")),
+        "typing": (("token", "s"), ("content", "s")),
+        "update": (("content", "s"),),
+        "name_update": (("token", "s"), ("sid", "s"), ("old_name", "s"), ("new_name", "s")),
+        "name_update_confirmed": (("token", "s"), ("sid", "s"), ("old_name", "s"), ("new_name", "s")),
+        "dice_result": (("token", "s"), ("dice_text", "s"), ("seq", "i")),
+        "disconnect": (("reason", "s"),),
+        "admin_close": (("token", "s"),),
+        "leave": (("token", "s"),),
+        "roll": (("token", "s"), ("commands", "j"), ("info", "s")),
+        "roll_result": (("rolls", "r"), ("seq", "i")),
+        "replay": (("token", "s"), ("seq", "i")),
+        "batch": (("messages", "m"),),
+    }
+
+    ROLL_KEYS = ("sid", "name", "command", "info", "ts")
+    RESULT_KEYS = {
+        "normal_roll": ("formula", "results", "total"),
+        "skill_check": ("skill", "advantage_dice", "final_result", "all_results", "check_level"),
+        "versus_check": ("skills", "advantage_dice", "final_results", "all_results", "check_levels",
+                         "strict_mode", "skill1_wins"),
+        "hidden_roll": ("info",),
+        "multi_roll": ("formula", "totals"),
+        "probability": ("formula", "mean", "std", "min", "max", "percentiles", "target", "chance"),
+    }
+    RESULT_CODES = {"normal_roll": 1, "skill_check": 2, "versus_check": 3, "hidden_roll": 4, "multi_roll": 5,
+                    "probability": 6}
+
+    _TYPE_NAMES = {code: name for name, code in MESSAGE_TYPES.items()}
+    _FIELD_NAMES = {name: {field for field, _ in fields} for name, fields in FIELDS.items()}
+    _RESULT_TYPES = {code: name for name, code in RESULT_CODES.items()}
+
+    @staticmethod
+    def encode(message: Dict, protocol: int = JSON) -> Union[str, bytes]:
+        if protocol == TFProtocol.BINARY:
+            return TFProtocol.encode_binary(message)
+        return json.dumps(message)
+
+    @staticmethod
+    def decode(frame: Union[str, bytes]) -> Dict:
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            return TFProtocol.decode_binary(bytes(frame))
+        return json.loads(frame)
+
+    @staticmethod
+    def encode_binary(message: Dict) -> bytes:
+        msg_type = message.get("type")
+        code = TFProtocol.MESSAGE_TYPES.get(msg_type)
+        known = TFProtocol._FIELD_NAMES.get(msg_type)
+        if code is None or not TFProtocol._fits_schema(message, msg_type, known):
+            return bytes((TFProtocol.FALLBACK_CODE,)) + json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+        out = bytearray((code,))
+        for field, kind in TFProtocol.FIELDS[msg_type]:
+            value = message.get(field)
+            if kind == "s":
+                data = (value or "").encode("utf-8")
+                TFProtocol._write_varint(out, len(data))
+                out += data
+            elif kind == "i":
+                value = value or 0
+                TFProtocol._write_varint(out, (value << 1) ^ (value >> 63))
+            elif kind == "m":
+                TFProtocol._write_varint(out, len(value or []))
+                for item in value or []:
+                    data = TFProtocol.encode_binary(item)
+                    TFProtocol._write_varint(out, len(data))
+                    out += data
+            else:
+                if kind == "r":
+                    value = [TFProtocol._pack_roll(roll) for roll in value or []]
+                data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+                TFProtocol._write_varint(out, len(data))
+                out += data
+        return bytes(out)
+
+    @staticmethod
+    def _fits_schema(message: Dict, msg_type: str, known) -> bool:
+        """ True when every key is a field of msg_type and every value has the field's wire type """
+        if any(key != "type" and key not in known for key in message):
+            return False
+        for field, kind in TFProtocol.FIELDS[msg_type]:
+            value = message.get(field)
+            if value is None:
+                continue
+            if kind == "s" and not isinstance(value, str):
+                return False
+            if kind == "i" and (not isinstance(value, int) or not -2 ** 63 <= value < 2 ** 63):
+                return False
+            if kind == "m" and not (isinstance(value, list) and all(isinstance(item, dict) for item in value)):
+                return False
+            if kind == "r" and not (isinstance(value, list) and all(isinstance(roll, dict) for roll in value)):
+                return False
+        return True
+
+    @staticmethod
+    def decode_binary(frame: bytes) -> Dict:
+        if not frame:
+            raise ValueError("empty frame")
+
+        code = frame[0]
+        if code == TFProtocol.FALLBACK_CODE:
+            return json.loads(frame[1:].decode("utf-8"))
+
+        msg_type = TFProtocol._TYPE_NAMES.get(code)
+        if msg_type is None:
+            raise ValueError(f"unknown message code {code}")
+
+        message = {"type": msg_type}
+        pos = 1
+        for field, kind in TFProtocol.FIELDS[msg_type]:
+            value, pos = TFProtocol._read_varint(frame, pos)
+            if kind == "i":
+                message[field] = (value >> 1) ^ -(value & 1)
+                continue
+            if kind == "m":
+                items = []
+                for _ in range(value):
+                    length, pos = TFProtocol._read_varint(frame, pos)
+                    if pos + length > len(frame):
+                        raise ValueError("truncated frame")
+                    items.append(TFProtocol.decode_binary(frame[pos:pos + length]))
+                    pos += length
+                message[field] = items
+                continue
+            end = pos + value
+            if end > len(frame):
+                raise ValueError("truncated frame")
+            data = frame[pos:end].decode("utf-8")
+            if kind == "s":
+                message[field] = data
+            elif kind == "r":
+                try:
+                    message[field] = [TFProtocol._unpack_roll(packed) for packed in json.loads(data)]
+                except (LookupError, TypeError):
+                    raise ValueError("malformed roll list")
+            else:
+                message[field] = json.loads(data)
+            pos = end
+        return message
+
+    @staticmethod
+    def _pack_roll(roll: Dict):
+        result = roll.get("result") or {}
+        result_type = result.get("type")
+        if not result.get("success"):
+            packed_result = [0, result.get("error", "")]
+        elif result_type in TFProtocol.RESULT_CODES and set(result) <= {"success", "type", *TFProtocol.RESULT_KEYS[result_type]}:
+            packed_result = [TFProtocol.RESULT_CODES[result_type]] + [result.get(key) for key in TFProtocol.RESULT_KEYS[result_type]]
+        else:
+            packed_result = result
+        if set(roll) - {"result", *TFProtocol.ROLL_KEYS}:
+            return roll
+        return [roll.get(key) for key in TFProtocol.ROLL_KEYS] + [packed_result]
+
+    @staticmethod
+    def _unpack_roll(packed):
+        if isinstance(packed, dict):
+            return packed
+        roll = dict(zip(TFProtocol.ROLL_KEYS, packed))
+        packed_result = packed[len(TFProtocol.ROLL_KEYS)]
+        if isinstance(packed_result, dict):
+            roll["result"] = packed_result
+        elif packed_result[0] == 0:
+            roll["result"] = {"success": False, "error": packed_result[1]}
+        else:
+            result_type = TFProtocol._RESULT_TYPES[packed_result[0]]
+            roll["result"] = {"success": True, "type": result_type}
+            roll["result"].update(zip(TFProtocol.RESULT_KEYS[result_type], packed_result[1:]))
+        return roll
+
+    @staticmethod
+    def _write_varint(out: bytearray, value: int) -> None:
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    @staticmethod
+    def _read_varint(frame: bytes, pos: int):
+        value = 0
+        shift = 0
+        while True:
+            if pos >= len(frame):
+                raise ValueError("truncated frame")
+            byte = frame[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value, pos
+            shift += 7